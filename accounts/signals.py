@@ -1,7 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
+from notifications.services import EmailQueueService
 from .models import User
 
 @receiver(post_save, sender=User)
@@ -20,13 +20,10 @@ def send_welcome_email(sender, instance, created, **kwargs):
         С уважением,
         Команда онлайн-школы
         '''
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [instance.email],
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f"Ошибка отправки email: {e}")
\ No newline at end of file
+        EmailQueueService.queue(
+            subject,
+            message,
+            settings.DEFAULT_FROM_EMAIL,
+            [instance.email],
+            source='accounts.send_welcome_email'
+        )
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatRoom, Message, MessageReadStatus, ChatSettings
+from .models import ChatRoom, Message, MessageReadStatus, ChatReadCursor, ChatSettings
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
@@ -30,6 +30,12 @@ class MessageReadStatusAdmin(admin.ModelAdmin):
     list_filter = ['read_at']
     search_fields = ['message__content', 'user__username']
 
+@admin.register(ChatReadCursor)
+class ChatReadCursorAdmin(admin.ModelAdmin):
+    list_display = ['user', 'room', 'last_read_id', 'updated_at']
+    search_fields = ['user__username', 'room__name']
+    readonly_fields = ['updated_at']
+
 @admin.register(ChatSettings)
 class ChatSettingsAdmin(admin.ModelAdmin):
     list_display = ['user', 'notifications_enabled', 'message_notifications', 'sound_enabled']
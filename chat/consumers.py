@@ -1,8 +1,17 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import ChatRoom, Message, MessageReadStatus
+from django.core.exceptions import ValidationError
+from .models import Message
+from .events import RoomEventStream, frame_event
+from .membership import RoomMembership
+from .presence import PresenceService
+from .services import ChatDigestService, ReadCursorService
+from .typing import TypingStats, TypingThrottle
+from .write_behind import MessageWriteBehind
 from accounts.models import User
 
 User = get_user_model()
@@ -10,18 +19,19 @@ User = get_user_model()
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
+        # Комнаты, на которые подписано это подключение
+        self.subscribed_rooms = set()
+        # Схлопывание частых событий набора текста (состояние общее для всех подключений пользователя)
+        self.typing_throttle = TypingThrottle(
+            interval=getattr(settings, 'CHAT_TYPING_INTERVAL', 3),
+            ttl=getattr(settings, 'CHAT_TYPING_TTL', 6)
+        )
         if self.user.is_anonymous:
             await self.close()
         else:
-            # Присоединяемся к группам всех чатов пользователя
-            user_rooms = await self.get_user_rooms()
-            for room in user_rooms:
-                await self.channel_layer.group_add(
-                    f"chat_{room.id}",
-                    self.channel_name
-                )
-            
-            # Присоединяемся к группе пользователя для личных уведомлений
+            # Присоединяемся только к группе пользователя для личных уведомлений.
+            # Группы чатов подключаются по запросу клиента (кадр "subscribe"),
+            # поэтому стоимость подключения не зависит от количества чатов
             await self.channel_layer.group_add(
                 f"user_{self.user.id}",
                 self.channel_name
@@ -34,13 +44,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         if not self.user.is_anonymous:
-            # Покидаем все группы
-            user_rooms = await self.get_user_rooms()
-            for room in user_rooms:
+            # Покидаем только те группы, на которые подписались
+            for room_id in self.subscribed_rooms:
                 await self.channel_layer.group_discard(
-                    f"chat_{room.id}",
+                    f"chat_{room_id}",
                     self.channel_name
                 )
+            self.subscribed_rooms.clear()
             
             await self.channel_layer.group_discard(
                 f"user_{self.user.id}",
@@ -49,151 +59,292 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
             # Отправляем статус "оффлайн"
             await self.set_user_online(False)
+            
+            await sync_to_async(TypingStats.add)(self.typing_throttle.pop_stats())
 
     async def receive(self, text_data):
         data = json.loads(text_data)
         message_type = data.get('type')
         
-        if message_type == 'message':
+        if message_type == 'subscribe':
+            await self.handle_subscribe(data)
+        elif message_type == 'unsubscribe':
+            await self.handle_unsubscribe(data)
+        elif message_type == 'message':
             await self.handle_new_message(data)
         elif message_type == 'typing':
             await self.handle_typing(data)
         elif message_type == 'read':
             await self.handle_message_read(data)
+        elif message_type == 'heartbeat':
+            await self.handle_heartbeat()
+        elif message_type == 'resume':
+            await self.handle_resume(data)
+
+    async def handle_subscribe(self, data):
+        """Подписка подключения на события чата"""
+        room_id = self.parse_room_id(data)
+        if not await self.subscribe_room(room_id):
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'data': {'room_id': room_id, 'error': 'Чат не найден или у вас нет доступа'}
+            }))
+            return
+        
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'data': {'room_id': room_id}
+        }))
 
+    async def handle_unsubscribe(self, data):
+        """Отписка подключения от событий чата"""
+        room_id = self.parse_room_id(data)
+        await self.leave_room(room_id)
+        
+        await self.send(text_data=json.dumps({
+            'type': 'unsubscribed',
+            'data': {'room_id': room_id}
+        }))
+
+    @staticmethod
+    def parse_room_id(data):
+        """ID чата из кадра клиента (строки приводятся к числу)"""
+        try:
+            return int(data.get('room_id'))
+        except (TypeError, ValueError):
+            return None
+
+    async def subscribe_room(self, room_id):
+        """Проверка доступа и присоединение к группе чата, возвращает успех"""
+        if room_id is None:
+            return False
+        
+        # Доступ проверяется на каждом кадре по индексу участников в кеше, без запросов к БД:
+        # исключенный участник или закрытый чат сразу теряют подписку
+        if not await self.is_user_in_room(room_id):
+            await self.leave_room(room_id)
+            return False
+        
+        if room_id not in self.subscribed_rooms:
+            await self.channel_layer.group_add(
+                f"chat_{room_id}",
+                self.channel_name
+            )
+            self.subscribed_rooms.add(room_id)
+        return True
+
+    async def check_subscription(self, room_id):
+        """Подключение подписано на чат и пользователь все еще его участник"""
+        return room_id in self.subscribed_rooms and await self.subscribe_room(room_id)
+    
+    async def leave_room(self, room_id):
+        """Отключение от группы чата, к которому больше нет доступа"""
+        if room_id in self.subscribed_rooms:
+            self.subscribed_rooms.discard(room_id)
+            await self.channel_layer.group_discard(
+                f"chat_{room_id}",
+                self.channel_name
+            )
+    
     async def handle_new_message(self, data):
         """Обработка нового сообщения"""
-        room_id = data.get('room_id')
+        room_id = self.parse_room_id(data)
         content = data.get('content')
         message_type = data.get('message_type', 'text')
         
-        # Проверяем, что пользователь участник чата
-        room = await self.get_room(room_id)
-        if not room or not await self.is_user_in_room(room):
+        # Проверяем, что пользователь участник чата (и подписываемся на него)
+        if not await self.subscribe_room(room_id):
+            return
+        
+        # Создаем сообщение: в режиме отложенной записи оно попадает в БД пачкой,
+        # а участники получают его сразу с выданным сервером uuid
+        try:
+            payload = MessageWriteBehind.build(room_id, self.user.id, content, message_type)
+        except ValueError as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'data': {'room_id': room_id, 'error': str(e)}
+            }))
             return
+        if await self.enqueue_message(payload):
+            message_data = {
+                'id': None,
+                'uuid': payload['uuid'],
+                'content': payload['content'],
+                'created_at': payload['created_at'],
+                'message_type': message_type,
+            }
+        else:
+            message = await self.create_message(payload)
+            message_data = {
+                'id': message.id,
+                'uuid': str(message.uuid),
+                'content': message.content,
+                'created_at': message.created_at.isoformat(),
+                'message_type': message.message_type,
+            }
         
-        # Создаем сообщение
-        message = await self.create_message(room, content, message_type)
+        message_data.update({
+            'sender': {
+                'id': self.user.id,
+                'username': self.user.username,
+                'full_name': self.user.get_full_name(),
+            },
+            'room_id': room_id,
+        })
+        # Событие попадает в буфер чата для догрузки после переподключения
+        message_data['event_id'] = await self.record_event(room_id, 'message', message_data)
         
         # Отправляем сообщение всем участникам чата
-        await self.channel_layer.group_send(
-            f"chat_{room_id}",
-            {
-                'type': 'chat_message',
-                'message': {
-                    'id': message.id,
-                    'content': message.content,
-                    'sender': {
-                        'id': message.sender.id,
-                        'username': message.sender.username,
-                        'full_name': message.sender.get_full_name(),
-                    },
-                    'room_id': room_id,
-                    'created_at': message.created_at.isoformat(),
-                    'message_type': message.message_type,
-                }
-            }
-        )
+        await self.broadcast(room_id, 'message', message_data)
 
     async def handle_typing(self, data):
         """Обработка индикатора набора текста"""
-        room_id = data.get('room_id')
-        is_typing = data.get('is_typing', False)
+        room_id = self.parse_room_id(data)
+        is_typing = bool(data.get('is_typing', False))
+        
+        # События набора текста только для чатов, на которые подписано подключение
+        if not await self.check_subscription(room_id):
+            return
+        
+        # Не больше одного изменения состояния за CHAT_TYPING_INTERVAL, остальные кадры подавляются
+        if not await sync_to_async(self.typing_throttle.should_send)(room_id, self.user.id, is_typing):
+            return
+        
+        event = {
+            'user': {
+                'id': self.user.id,
+                'username': self.user.username,
+                'full_name': self.user.get_full_name(),
+            },
+            'is_typing': is_typing,
+            'room_id': room_id,
+            # Клиент сам сбрасывает индикатор, если за это время не пришло обновление
+            'expires_in': self.typing_throttle.ttl,
+        }
+        event['event_id'] = await self.record_event(room_id, 'typing', event)
         
         # Отправляем статус набора текста другим участникам
-        await self.channel_layer.group_send(
-            f"chat_{room_id}",
-            {
-                'type': 'typing_indicator',
-                'user': {
-                    'id': self.user.id,
-                    'username': self.user.username,
-                    'full_name': self.user.get_full_name(),
-                },
-                'is_typing': is_typing,
-                'room_id': room_id,
-            }
-        )
+        frame = await self.broadcast(room_id, 'typing', event, skip_self=True)
+        self.typing_throttle.record_frame(room_id, frame)
+        await sync_to_async(TypingStats.add)(self.typing_throttle.pop_stats(room_id))
 
     async def handle_message_read(self, data):
         """Обработка прочтения сообщения"""
         message_id = data.get('message_id')
-        room_id = data.get('room_id')
+        message_uuid = data.get('message_uuid')
+        room_id = self.parse_room_id(data)
+        
+        if not await self.check_subscription(room_id):
+            return
         
         # Отмечаем сообщение как прочитанное
-        await self.mark_message_as_read(message_id)
+        await self.mark_message_as_read(message_id, room_id, message_uuid)
+        
+        event = {
+            'message_id': message_id,
+            'message_uuid': message_uuid,
+            'user_id': self.user.id,
+            'room_id': room_id,
+        }
+        event['event_id'] = await self.record_event(room_id, 'read', event)
         
         # Уведомляем других участников
-        await self.channel_layer.group_send(
-            f"chat_{room_id}",
-            {
-                'type': 'message_read',
-                'message_id': message_id,
-                'user_id': self.user.id,
-                'room_id': room_id,
-            }
-        )
+        await self.broadcast(room_id, 'read', event)
 
-    async def chat_message(self, event):
-        """Отправка сообщения клиенту"""
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'data': event['message']
-        }))
+    async def handle_heartbeat(self):
+        """Продление онлайн-статуса подключения (клиент присылает раз в CHAT_PRESENCE_TTL / 2)"""
+        await sync_to_async(PresenceService.heartbeat)(self.user.id, self.channel_name)
+        # Подписки перепроверяются и без кадров клиента: исключенный участник перестает
+        # получать события чата не позже следующего heartbeat
+        for room_id in list(self.subscribed_rooms):
+            await self.subscribe_room(room_id)
+        await self.send(text_data=json.dumps({'type': 'heartbeat_ack'}))
 
-    async def typing_indicator(self, event):
-        """Отправка индикатора набора текста"""
-        # Не отправляем себе же
-        if event['user']['id'] != self.user.id:
+    async def handle_resume(self, data):
+        """Догрузка событий чата, пропущенных за время разрыва соединения"""
+        room_id = self.parse_room_id(data)
+        last_event_id = data.get('last_event_id')
+        
+        # Сначала подписываемся, затем читаем буфер: события между этими шагами
+        # придут дважды, клиент отбрасывает повторы по event_id
+        if not await self.subscribe_room(room_id):
             await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'data': event
+                'type': 'error',
+                'data': {'room_id': room_id, 'error': 'Чат не найден или у вас нет доступа'}
             }))
-
-    async def message_read(self, event):
-        """Отправка уведомления о прочтении сообщения"""
+            return
+        
+        result = await sync_to_async(RoomEventStream.read_since)(room_id, last_event_id)
+        if result is None:
+            # Часть событий вытеснена из буфера - клиент загружает историю через REST
+            await self.send(text_data=json.dumps({
+                'type': 'resume_gap',
+                'data': {'room_id': room_id, 'last_event_id': last_event_id}
+            }))
+            return
+        
+        events, has_more = result
         await self.send(text_data=json.dumps({
-            'type': 'read',
-            'data': event
+            'type': 'replay',
+            'data': {'room_id': room_id, 'events': events, 'has_more': has_more}
         }))
 
-    @database_sync_to_async
-    def get_user_rooms(self):
-        return list(ChatRoom.objects.filter(participants=self.user, is_active=True))
+    async def broadcast(self, room_id, frame_type, data, skip_self=False):
+        """Рассылка кадра в группу чата, возвращает закодированный кадр"""
+        # Кадр кодируется один раз здесь, получатели отправляют готовую строку без json.dumps
+        event = frame_event(frame_type, data, skip_user_id=self.user.id if skip_self else None)
+        await self.channel_layer.group_send(f"chat_{room_id}", event)
+        return event['frame']
 
-    @database_sync_to_async
-    def get_room(self, room_id):
-        try:
-            return ChatRoom.objects.get(id=room_id, is_active=True)
-        except ChatRoom.DoesNotExist:
-            return None
+    async def chat_frame(self, event):
+        """Отправка клиенту готового кадра (сообщение, набор текста, прочтение, редактирование)"""
+        if event.get('skip_user_id') == self.user.id:
+            return
+        await self.send(text_data=event['frame'])
 
-    @database_sync_to_async
-    def is_user_in_room(self, room):
-        return room.participants.filter(id=self.user.id).exists()
+    @sync_to_async
+    def record_event(self, room_id, event_type, data):
+        return RoomEventStream.append(room_id, event_type, data)
+
+    @sync_to_async
+    def is_user_in_room(self, room_id):
+        return RoomMembership.is_member(room_id, self.user.id)
+
+    @sync_to_async
+    def enqueue_message(self, payload):
+        if not MessageWriteBehind.enabled():
+            return False
+        return MessageWriteBehind.enqueue(payload)
 
     @database_sync_to_async
-    def create_message(self, room, content, message_type):
+    def create_message(self, payload):
         return Message.objects.create(
-            room=room,
+            uuid=payload['uuid'],
+            room_id=payload['room_id'],
             sender=self.user,
-            content=content,
-            message_type=message_type
+            content=payload['content'],
+            message_type=payload['message_type']
         )
 
     @database_sync_to_async
-    def mark_message_as_read(self, message_id):
+    def mark_message_as_read(self, message_id, room_id, message_uuid=None):
         try:
-            message = Message.objects.get(id=message_id)
-            if message.sender != self.user:
-                MessageReadStatus.objects.get_or_create(
-                    message=message,
-                    user=self.user
-                )
-        except Message.DoesNotExist:
+            # Сообщения из отложенной записи клиент знает только по uuid
+            if message_uuid:
+                message = Message.objects.get(uuid=message_uuid, room_id=room_id)
+            else:
+                message = Message.objects.get(id=message_id, room_id=room_id)
+            if message.sender_id != self.user.id:
+                # Курсор прочтения сдвигается только вперед
+                ReadCursorService.advance(self.user.id, room_id, message.id)
+                ChatDigestService.clear(self.user, message.room_id)
+        except (Message.DoesNotExist, ValidationError):
             pass
 
-    @database_sync_to_async
+    @sync_to_async
     def set_user_online(self, is_online):
-        # Здесь можно реализовать логику отслеживания онлайн-статуса
-        pass
\ No newline at end of file
+        # Учитываем каждое подключение отдельно: пользователь в сети, пока открыта хотя бы одна вкладка
+        if is_online:
+            return PresenceService.connect(self.user.id, self.channel_name)
+        return PresenceService.disconnect(self.user.id, self.channel_name)
\ No newline at end of file
@@ -0,0 +1,121 @@
+import json
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from redis import RedisError
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Кольцевой буфер последних событий чата (Redis Stream, обрезается по длине)
+ROOM_EVENTS_KEY = 'chat:room:{room_id}:events'
+
+class RoomEventStream:
+    """Буфер событий чата для догрузки пропущенного после переподключения WebSocket"""
+    
+    @staticmethod
+    def key(room_id):
+        return ROOM_EVENTS_KEY.format(room_id=room_id)
+    
+    @staticmethod
+    def append(room_id, event_type, data):
+        """Запись события в буфер, возвращает ID события (None без Redis)"""
+        client = get_redis()
+        if client is None:
+            return None
+        key = RoomEventStream.key(room_id)
+        try:
+            pipe = client.pipeline()
+            pipe.xadd(
+                key,
+                {'type': event_type, 'data': json.dumps(data, default=str)},
+                maxlen=getattr(settings, 'CHAT_EVENT_BUFFER_SIZE', 500),
+                approximate=True
+            )
+            # Буфер неактивного чата удаляется целиком
+            pipe.expire(key, getattr(settings, 'CHAT_EVENT_BUFFER_TTL', 86400))
+            return pipe.execute()[0]
+        except RedisError as e:
+            logger.warning(f"Ошибка записи события чата {room_id}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def parse_id(event_id):
+        try:
+            ms, seq = str(event_id).split('-')
+            return int(ms), int(seq)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def read_since(room_id, last_event_id, limit=None):
+        """События после last_event_id: (события, есть_еще) или None, если часть событий уже вытеснена"""
+        client = get_redis()
+        last_key = RoomEventStream.parse_id(last_event_id)
+        if client is None or last_key is None:
+            return None
+        limit = limit or getattr(settings, 'CHAT_EVENT_BUFFER_SIZE', 500)
+        key = RoomEventStream.key(room_id)
+        try:
+            oldest = client.xrange(key, count=1)
+            # Событие клиента старше начала буфера - пропущенное могло быть вытеснено
+            if not oldest or RoomEventStream.parse_id(oldest[0][0]) > last_key:
+                return None
+            entries = client.xrange(key, min=f'({last_event_id}', count=limit + 1)
+        except RedisError as e:
+            logger.warning(f"Ошибка чтения событий чата {room_id}: {str(e)}")
+            return None
+        
+        events = [
+            {
+                'event_id': event_id,
+                'type': fields['type'],
+                'data': json.loads(fields['data'])
+            }
+            for event_id, fields in entries[:limit]
+        ]
+        return events, len(entries) > limit
+
+def encode_frame(frame_type, data):
+    """Кадр для клиента WebSocket: кодируется один раз на всех получателей"""
+    return json.dumps({'type': frame_type, 'data': data}, default=str)
+
+def frame_event(frame_type, data, skip_user_id=None):
+    """Событие слоя каналов с готовым кадром (обрабатывается ChatConsumer.chat_frame)"""
+    return {
+        'type': 'chat.frame',
+        'frame': encode_frame(frame_type, data),
+        'skip_user_id': skip_user_id,
+    }
+
+def message_event(message):
+    """Данные события 'message' для сообщения из БД (тот же формат, что у WebSocket)"""
+    return {
+        'id': message.id,
+        'uuid': str(message.uuid),
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'message_type': message.message_type,
+        'sender': {
+            'id': message.sender_id,
+            'username': message.sender.username,
+            'full_name': message.sender.get_full_name(),
+        },
+        'room_id': message.room_id,
+    }
+
+def publish_room_event(room_id, event_type, data):
+    """Запись события в буфер и рассылка подписчикам чата после коммита (для синхронного кода, например REST)"""
+    def publish():
+        event = dict(data, event_id=RoomEventStream.append(room_id, event_type, data))
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(
+                f"chat_{room_id}",
+                frame_event(event_type, event)
+            )
+    
+    # Клиенты не должны получить событие об изменении, которое затем откатится
+    transaction.on_commit(publish)
\ No newline at end of file
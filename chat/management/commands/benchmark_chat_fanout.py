@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from chat.events import frame_event
+import json
+import msgpack
+import time
+
+class Command(BaseCommand):
+    help = 'Микробенчмарк рассылки кадров чата: стоимость кодирования на одного получателя'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Количество подключений в чате'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество рассылок для каждого размера чата'
+        )
+    
+    def sample_message(self):
+        return {
+            'id': 123456,
+            'uuid': '0f8fad5b-d9cb-469f-a165-70867728950e',
+            'content': 'Добрый день! Напоминаю, что домашнее задание нужно сдать до пятницы.' * 2,
+            'created_at': '2026-10-18T10:15:30.123456+00:00',
+            'message_type': 'text',
+            'sender': {'id': 42, 'username': 'teacher', 'full_name': 'Анна Петрова'},
+            'room_id': 7,
+            'event_id': '1792294725407-0',
+        }
+    
+    def legacy_fanout(self, message, sockets):
+        """Старый путь: словарь события сериализуется слоем каналов и кодируется в JSON каждым получателем"""
+        for index in range(sockets):
+            # channels-redis сериализует событие для каждого канала (худший случай - разные воркеры)
+            packed = msgpack.packb({'type': 'chat_message', 'message': message, '__asgi_channel__': [f'specific.{index}']})
+            event = msgpack.unpackb(packed)
+            json.dumps({'type': 'message', 'data': event['message']})
+    
+    def prepared_fanout(self, message, sockets):
+        """Новый путь: кадр кодируется один раз, слой каналов переносит готовую строку"""
+        event = frame_event('message', message)
+        for index in range(sockets):
+            packed = msgpack.packb(dict(event, __asgi_channel__=[f'specific.{index}']))
+            msgpack.unpackb(packed)['frame']
+    
+    def measure(self, fanout, message, sockets, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fanout(message, sockets)
+        return (time.perf_counter() - start) / (repeat * sockets) * 1_000_000
+    
+    def handle(self, *args, **options):
+        message = self.sample_message()
+        
+        self.stdout.write(f"{'Подключений':>12} {'Было, мкс':>12} {'Стало, мкс':>12} {'Ускорение':>10}")
+        for sockets in options['sizes']:
+            legacy = self.measure(self.legacy_fanout, message, sockets, options['repeat'])
+            prepared = self.measure(self.prepared_fanout, message, sockets, options['repeat'])
+            self.stdout.write(
+                f"{sockets:>12} {legacy:>12.2f} {prepared:>12.2f} {legacy / prepared:>9.1f}x"
+            )
+        
+        self.stdout.write(
+            self.style.SUCCESS('✅ Стоимость указана на одного получателя (сериализация слоя каналов + кодирование кадра)')
+        )
\ No newline at end of file
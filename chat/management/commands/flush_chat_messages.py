@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from chat.write_behind import MessageWriteBehind
+import time
+
+class Command(BaseCommand):
+    help = 'Запись сообщений чата из очереди отложенной записи в БД'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Записать накопленные сообщения и завершиться'
+        )
+    
+    def handle(self, *args, **options):
+        batch_size = settings.CHAT_WRITE_BEHIND_BATCH_SIZE
+        interval = settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000
+        
+        self.stdout.write('Запуск записи сообщений чата...')
+        
+        while True:
+            try:
+                flushed = MessageWriteBehind.flush(batch_size)
+            except DatabaseError as e:
+                # Пачка остается в Redis и будет записана повторно
+                self.stderr.write(f'Ошибка записи сообщений: {str(e)}')
+                close_old_connections()
+                flushed = 0
+                time.sleep(interval)
+            
+            if options['once'] and flushed == 0:
+                break
+            # Полная пачка - сразу пишем следующую, иначе ждем интервал
+            if flushed < batch_size:
+                time.sleep(interval)
+        
+        self.stdout.write(
+            self.style.SUCCESS('✅ Очередь сообщений записана')
+        )
\ No newline at end of file
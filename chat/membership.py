@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import ChatRoom
+
+# Запись кеша для несуществующего чата
+MISSING_ROOM = 'missing'
+
+class RoomMembership:
+    """Индекс участников чатов в кеше для проверок доступа без запросов к БД"""
+    
+    @staticmethod
+    def cache_key(room_id):
+        return f'chat:room:{room_id}:membership'
+    
+    @staticmethod
+    def get(room_id):
+        """Состояние чата из индекса: {'active', 'created_by', 'members'} или None"""
+        try:
+            room_id = int(room_id)
+        except (TypeError, ValueError):
+            return None
+        
+        key = RoomMembership.cache_key(room_id)
+        data = cache.get(key)
+        if data is None:
+            data = RoomMembership._load(room_id)
+            timeout = getattr(settings, 'CHAT_MEMBERSHIP_CACHE_TIMEOUT', 3600)
+            # Отсутствие чата кешируем ненадолго
+            cache.set(key, data, timeout=timeout if data != MISSING_ROOM else 60)
+        if data == MISSING_ROOM:
+            return None
+        return data
+    
+    @staticmethod
+    def _load(room_id):
+        room = ChatRoom.objects.filter(id=room_id).values('is_active', 'created_by_id').first()
+        if room is None:
+            return MISSING_ROOM
+        member_ids = ChatRoom.participants.through.objects.filter(
+            chatroom_id=room_id
+        ).values_list('user_id', flat=True)
+        return {
+            'active': room['is_active'],
+            'created_by': room['created_by_id'],
+            'members': frozenset(member_ids)
+        }
+    
+    @staticmethod
+    def member_ids(room_id):
+        """ID участников активного чата (пустое множество, если чат недоступен)"""
+        data = RoomMembership.get(room_id)
+        if not data or not data['active']:
+            return frozenset()
+        return data['members']
+    
+    @staticmethod
+    def is_member(room_id, user_id):
+        """Проверка, что пользователь участник активного чата"""
+        return user_id in RoomMembership.member_ids(room_id)
+    
+    @staticmethod
+    def invalidate(room_ids):
+        """Сброс индекса после изменения состава или статуса чатов"""
+        keys = [RoomMembership.cache_key(room_id) for room_id in room_ids]
+        if not keys:
+            return
+        cache.delete_many(keys)
+        # Параллельный запрос до коммита мог снова закешировать старый состав - сбрасываем повторно после коммита
+        transaction.on_commit(lambda: cache.delete_many(keys))
\ No newline at end of file
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatDigestEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_count', models.PositiveIntegerField(default=0, verbose_name='Количество сообщений')),
+                ('last_sender_name', models.CharField(blank=True, max_length=255, verbose_name='Последний отправитель')),
+                ('last_message_preview', models.CharField(blank=True, max_length=255, verbose_name='Последнее сообщение')),
+                ('first_message_at', models.DateTimeField(verbose_name='Время первого сообщения')),
+                ('last_message_at', models.DateTimeField(verbose_name='Время последнего сообщения')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_entries', to='chat.chatroom', verbose_name='Чат')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_digest_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись дайджеста чата',
+                'verbose_name_plural': 'Записи дайджеста чатов',
+                'indexes': [models.Index(fields=['first_message_at'], name='chat_chatdi_first_m_6c7aa6_idx')],
+                'unique_together': {('user', 'room')},
+            },
+        ),
+    ]
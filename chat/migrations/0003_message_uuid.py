@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:02
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+def fill_message_uuids(apps, schema_editor):
+    # У каждого существующего сообщения должен быть свой идентификатор
+    Message = apps.get_model('chat', 'Message')
+    batch = []
+    for message in Message.objects.only('id').iterator(chunk_size=2000):
+        message.uuid = uuid.uuid4()
+        batch.append(message)
+        if len(batch) >= 2000:
+            Message.objects.bulk_update(batch, ['uuid'])
+            batch = []
+    if batch:
+        Message.objects.bulk_update(batch, ['uuid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chatdigestentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Идентификатор сообщения'),
+        ),
+        migrations.RunPython(fill_message_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Идентификатор сообщения'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата отправки'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_read_cursors(apps, schema_editor):
+    # Курсор - самое позднее сообщение чата, прочитанное пользователем
+    MessageReadStatus = apps.get_model('chat', 'MessageReadStatus')
+    ChatReadCursor = apps.get_model('chat', 'ChatReadCursor')
+    rows = MessageReadStatus.objects.values('user_id', 'message__room_id').annotate(
+        last_read_id=models.Max('message_id')
+    ).order_by()
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(ChatReadCursor(
+            user_id=row['user_id'],
+            room_id=row['message__room_id'],
+            last_read_id=row['last_read_id']
+        ))
+        if len(batch) >= 2000:
+            ChatReadCursor.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        ChatReadCursor.objects.bulk_create(batch, ignore_conflicts=True)
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0003_message_uuid'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0, verbose_name='ID последнего прочитанного сообщения')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Курсор прочтения чата',
+                'verbose_name_plural': 'Курсоры прочтения чатов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'id'], name='chat_messag_room_id_12c833_idx'),
+        ),
+        migrations.AddField(
+            model_name='chatreadcursor',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.chatroom', verbose_name='Чат'),
+        ),
+        migrations.AddField(
+            model_name='chatreadcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_cursors', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatreadcursor',
+            unique_together={('user', 'room')},
+        ),
+        migrations.RunPython(backfill_read_cursors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+
+
+def link_existing_lesson_rooms(apps, schema_editor):
+    # Ранее чат занятия искался по имени "Урок: <тема>" - привязываем такие чаты, если соответствие однозначно
+    Lesson = apps.get_model('courses', 'Lesson')
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    
+    lessons = defaultdict(list)
+    for lesson_id, title, teacher_id in Lesson.objects.values_list('id', 'title', 'teacher_id').iterator():
+        lessons[(f"Урок: {title}", teacher_id)].append(lesson_id)
+    
+    rooms = defaultdict(list)
+    for room_id, name, created_by_id in ChatRoom.objects.filter(
+        chat_type='group',
+        name__startswith='Урок: '
+    ).values_list('id', 'name', 'created_by_id').iterator():
+        rooms[(name, created_by_id)].append(room_id)
+    
+    for key, room_ids in rooms.items():
+        lesson_ids = lessons.get(key, [])
+        if len(room_ids) == 1 and len(lesson_ids) == 1:
+            ChatRoom.objects.filter(id=room_ids[0]).update(lesson_id=lesson_ids[0])
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('courses', '0002_achievement_badge_homework_supportticket_and_more'),
+        ('chat', '0005_message_keyset_index'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='lesson',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chat_room', to='courses.lesson', verbose_name='Занятие'),
+        ),
+        migrations.RunPython(link_existing_lesson_rooms, migrations.RunPython.noop),
+    ]
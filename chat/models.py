@@ -1,4 +1,6 @@
+import uuid
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
@@ -33,6 +35,15 @@ class ChatRoom(models.Model):
         related_name='created_chats',
         verbose_name=_('Создатель')
     )
+    # Чат занятия создается один раз вместе с занятием
+    lesson = models.OneToOneField(
+        'courses.Lesson',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='chat_room',
+        verbose_name=_('Занятие')
+    )
     is_active = models.BooleanField(
         default=True,
         verbose_name=_('Активен')
@@ -74,6 +85,13 @@ class Message(models.Model):
         related_name='messages',
         verbose_name=_('Чат')
     )
+    # Идентификатор, который выдается сервером до записи в БД (отложенная запись из WebSocket)
+    uuid = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name=_('Идентификатор сообщения')
+    )
     sender = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -118,8 +136,10 @@ class Message(models.Model):
         related_name='replies',
         verbose_name=_('Ответ на сообщение')
     )
+    # Время назначается при приеме сообщения, а не при записи в БД
     created_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name=_('Дата отправки')
     )
     updated_at = models.DateTimeField(
@@ -132,7 +152,8 @@ class Message(models.Model):
         verbose_name_plural = _('Сообщения')
         ordering = ['created_at']
         indexes = [
-            models.Index(fields=['room', 'created_at']),
+            models.Index(fields=['room', 'created_at', 'id']),
+            models.Index(fields=['room', 'id']),
             models.Index(fields=['sender', 'is_read']),
         ]
     
@@ -165,6 +186,37 @@ class MessageReadStatus(models.Model):
     def __str__(self):
         return f"{self.user} прочитал сообщение {self.message.id}"
 
+class ChatReadCursor(models.Model):
+    """Курсор прочтения: все сообщения чата с id не больше last_read_id прочитаны пользователем"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chat_read_cursors',
+        verbose_name=_('Пользователь')
+    )
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='read_cursors',
+        verbose_name=_('Чат')
+    )
+    last_read_id = models.BigIntegerField(
+        default=0,
+        verbose_name=_('ID последнего прочитанного сообщения')
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Дата обновления')
+    )
+    
+    class Meta:
+        verbose_name = _('Курсор прочтения чата')
+        verbose_name_plural = _('Курсоры прочтения чатов')
+        unique_together = ['user', 'room']
+    
+    def __str__(self):
+        return f"{self.user} прочитал {self.room} до сообщения {self.last_read_id}"
+
 class ChatSettings(models.Model):
     user = models.OneToOneField(
         User,
@@ -206,4 +258,50 @@ class ChatSettings(models.Model):
         verbose_name_plural = _('Настройки чатов')
     
     def __str__(self):
-        return f"Настройки чата для {self.user}"
\ No newline at end of file
+        return f"Настройки чата для {self.user}"
+
+class ChatDigestEntry(models.Model):
+    """Непрочитанные сообщения пользователя в чате, ожидающие отправки в дайджесте"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chat_digest_entries',
+        verbose_name=_('Пользователь')
+    )
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='digest_entries',
+        verbose_name=_('Чат')
+    )
+    message_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Количество сообщений')
+    )
+    last_sender_name = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_('Последний отправитель')
+    )
+    last_message_preview = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_('Последнее сообщение')
+    )
+    first_message_at = models.DateTimeField(
+        verbose_name=_('Время первого сообщения')
+    )
+    last_message_at = models.DateTimeField(
+        verbose_name=_('Время последнего сообщения')
+    )
+    
+    class Meta:
+        verbose_name = _('Запись дайджеста чата')
+        verbose_name_plural = _('Записи дайджеста чатов')
+        unique_together = ['user', 'room']
+        indexes = [
+            models.Index(fields=['first_message_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} - {self.room} ({self.message_count})"
\ No newline at end of file
@@ -0,0 +1,100 @@
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class MessageKeysetPagination(BasePagination):
+    """Курсорная пагинация истории сообщений по ключу (created_at, id) без OFFSET"""
+    # Без параметров возвращается последняя страница. Якорь - ID сообщения:
+    # before - более ранние сообщения, after - более поздние, around - переход к сообщению.
+    # Каждая страница - поиск по индексу (room, created_at, id), поэтому глубокая
+    # история загружается так же быстро, как последние сообщения
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'limit'
+    anchor_query_params = ('before', 'after', 'around')
+    
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+    
+    def get_anchor(self, queryset, request):
+        """Режим и ключ (created_at, id) сообщения-якоря"""
+        for mode in self.anchor_query_params:
+            value = request.query_params.get(mode)
+            if value is None:
+                continue
+            try:
+                message_id = int(value)
+            except ValueError:
+                raise ValidationError({mode: 'Некорректный ID сообщения'})
+            anchor = queryset.filter(id=message_id).values('created_at', 'id').first()
+            if anchor is None:
+                raise NotFound('Сообщение не найдено')
+            return mode, anchor
+        return None, None
+    
+    @staticmethod
+    def older(queryset, anchor, limit, inclusive=False):
+        """Сообщения раньше якоря (по возрастанию) и признак, что есть еще более ранние"""
+        if anchor is not None:
+            queryset = queryset.filter(created_at__lte=anchor['created_at'])
+            if inclusive:
+                queryset = queryset.exclude(created_at=anchor['created_at'], id__gt=anchor['id'])
+            else:
+                queryset = queryset.exclude(created_at=anchor['created_at'], id__gte=anchor['id'])
+        items = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+        return items[:limit][::-1], len(items) > limit
+    
+    @staticmethod
+    def newer(queryset, anchor, limit):
+        """Сообщения позже якоря (по возрастанию) и признак, что есть еще более поздние"""
+        queryset = queryset.filter(created_at__gte=anchor['created_at']).exclude(
+            created_at=anchor['created_at'], id__lte=anchor['id']
+        )
+        items = list(queryset.order_by('created_at', 'id')[:limit + 1])
+        return items[:limit], len(items) > limit
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_page_size(request)
+        mode, anchor = self.get_anchor(queryset, request)
+        
+        if mode == 'before':
+            page, self.has_older = self.older(queryset, anchor, limit)
+            self.has_newer = True
+        elif mode == 'after':
+            page, self.has_newer = self.newer(queryset, anchor, limit)
+            self.has_older = True
+        elif mode == 'around':
+            # Якорь и половина страницы до него, остальное - после
+            older_limit = limit // 2 + 1
+            older, self.has_older = self.older(queryset, anchor, older_limit, inclusive=True)
+            newer, self.has_newer = self.newer(queryset, anchor, limit - len(older))
+            page = older + newer
+        else:
+            page, self.has_older = self.older(queryset, None, limit)
+            self.has_newer = False
+        
+        self.page = page
+        return page
+    
+    def get_link(self, mode, message_id):
+        url = self.request.build_absolute_uri()
+        for param in self.anchor_query_params:
+            url = remove_query_param(url, param)
+        return replace_query_param(url, mode, message_id)
+    
+    def get_paginated_response(self, data):
+        oldest_id = self.page[0].id if self.page else None
+        newest_id = self.page[-1].id if self.page else None
+        return Response({
+            'previous': self.get_link('before', oldest_id) if self.has_older and oldest_id else None,
+            'next': self.get_link('after', newest_id) if self.has_newer and newest_id else None,
+            'has_older': self.has_older,
+            'has_newer': self.has_newer,
+            'results': data
+        })
\ No newline at end of file
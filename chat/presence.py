@@ -0,0 +1,134 @@
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from redis import RedisError
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Хеш подключений пользователя: имя канала -> время последнего heartbeat
+USER_SOCKETS_KEY = 'presence:user:{user_id}'
+# Отсортированное множество пользователей в сети: score - время последнего heartbeat
+ONLINE_KEY = 'presence:online'
+
+class PresenceService:
+    """Онлайн-статус пользователей чата в Redis (без обращений к БД)"""
+    
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+    
+    @staticmethod
+    def connections_key(user_id):
+        return f'chat:online:{user_id}:connections'
+    
+    @staticmethod
+    def touch_cache(user_id):
+        """Продление флага и счетчика подключений в кеше (режим без Redis)"""
+        cache.set(f'chat:online:{user_id}', True, timeout=PresenceService.ttl())
+        cache.touch(PresenceService.connections_key(user_id), timeout=PresenceService.ttl())
+    
+    @staticmethod
+    def connect(user_id, channel_name):
+        """Регистрация подключения, возвращает количество подключений пользователя"""
+        client = get_redis()
+        if client is None:
+            # Без Redis (локальная разработка) - флаг и счетчик подключений в кеше
+            cache.add(PresenceService.connections_key(user_id), 0, timeout=PresenceService.ttl())
+            count = cache.incr(PresenceService.connections_key(user_id))
+            PresenceService.touch_cache(user_id)
+            return count
+        
+        now = time.time()
+        key = USER_SOCKETS_KEY.format(user_id=user_id)
+        try:
+            pipe = client.pipeline()
+            pipe.hset(key, channel_name, now)
+            pipe.expire(key, PresenceService.ttl())
+            pipe.zadd(ONLINE_KEY, {user_id: now})
+            pipe.hlen(key)
+            return pipe.execute()[-1]
+        except RedisError as e:
+            logger.warning(f"Ошибка обновления онлайн-статуса: {str(e)}")
+            return 0
+    
+    @staticmethod
+    def heartbeat(user_id, channel_name):
+        """Продление подключения пользователя"""
+        if get_redis() is None:
+            # Heartbeat не добавляет подключение к счетчику
+            PresenceService.touch_cache(user_id)
+            return cache.get(PresenceService.connections_key(user_id), 0)
+        return PresenceService.connect(user_id, channel_name)
+    
+    @staticmethod
+    def disconnect(user_id, channel_name):
+        """Удаление подключения, возвращает количество оставшихся подключений"""
+        client = get_redis()
+        if client is None:
+            # Пользователь выходит из сети, только когда закрыто последнее подключение
+            try:
+                remaining = cache.decr(PresenceService.connections_key(user_id))
+            except ValueError:
+                remaining = 0
+            if remaining <= 0:
+                cache.delete_many([f'chat:online:{user_id}', PresenceService.connections_key(user_id)])
+                return 0
+            return remaining
+        
+        key = USER_SOCKETS_KEY.format(user_id=user_id)
+        deadline = time.time() - PresenceService.ttl()
+        try:
+            client.hdel(key, channel_name)
+            # Подключения без heartbeat (упавший воркер) не учитываем
+            sockets = client.hgetall(key)
+            stale = [name for name, seen in sockets.items() if float(seen) < deadline]
+            if stale:
+                client.hdel(key, *stale)
+            remaining = len(sockets) - len(stale)
+            if not remaining:
+                client.zrem(ONLINE_KEY, user_id)
+            return remaining
+        except RedisError as e:
+            logger.warning(f"Ошибка обновления онлайн-статуса: {str(e)}")
+            return 0
+    
+    @staticmethod
+    def get_online_user_ids(user_ids):
+        """Пользователи из списка, которые сейчас в сети (один запрос к Redis)"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        
+        client = get_redis()
+        if client is None:
+            keys = {f'chat:online:{user_id}': user_id for user_id in user_ids}
+            return {keys[key] for key in cache.get_many(list(keys))}
+        
+        deadline = time.time() - PresenceService.ttl()
+        try:
+            scores = client.zmscore(ONLINE_KEY, user_ids)
+        except RedisError as e:
+            logger.warning(f"Ошибка чтения онлайн-статуса: {str(e)}")
+            return set()
+        return {
+            user_id for user_id, score in zip(user_ids, scores)
+            if score is not None and score >= deadline
+        }
+    
+    @staticmethod
+    def is_online(user_id):
+        return user_id in PresenceService.get_online_user_ids([user_id])
+    
+    @staticmethod
+    def cleanup():
+        """Удаление из множества пользователей, от которых давно не было heartbeat"""
+        client = get_redis()
+        if client is None:
+            return 0
+        try:
+            return client.zremrangebyscore(ONLINE_KEY, '-inf', time.time() - PresenceService.ttl())
+        except RedisError as e:
+            logger.warning(f"Ошибка очистки онлайн-статусов: {str(e)}")
+            return 0
\ No newline at end of file
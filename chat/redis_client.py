@@ -0,0 +1,28 @@
+import logging
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+def get_redis():
+    """Клиент Redis, используемый слоем каналов (None, если слой каналов не на Redis)"""
+    global _client
+    if _client is not None:
+        return _client
+    
+    layer = settings.CHANNEL_LAYERS.get('default', {})
+    if 'redis' not in layer.get('BACKEND', '').lower():
+        return None
+    
+    hosts = layer.get('CONFIG', {}).get('hosts') or ['redis://localhost:6379/0']
+    host = hosts[0]
+    if isinstance(host, dict):
+        host = host.get('address')
+    
+    if isinstance(host, str):
+        _client = redis.Redis.from_url(host, decode_responses=True)
+    else:
+        _client = redis.Redis(host=host[0], port=host[1], decode_responses=True)
+    return _client
\ No newline at end of file
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import ChatRoom, Message, MessageReadStatus, ChatSettings
+from .services import ReadCursorService, RoomSummaryService
 from accounts.models import User
 
 class ChatRoomSerializer(serializers.ModelSerializer):
@@ -24,23 +25,16 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         ]
     
     def get_unread_messages_count(self, obj):
+        # В списке чатов значение уже посчитано подзапросом (RoomSummaryService.annotate)
+        if hasattr(obj, 'unread_count'):
+            return obj.unread_count
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.filter(
-                is_read=False
-            ).exclude(sender=request.user).count()
+            return ReadCursorService.unread_counts(request.user, [obj.id]).get(obj.id, 0)
         return 0
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
-            return {
-                'id': last_msg.id,
-                'content': last_msg.content,
-                'sender': last_msg.sender.get_full_name() or last_msg.sender.username,
-                'created_at': last_msg.created_at
-            }
-        return None
+        return RoomSummaryService.last_message_data(obj)
 
 class MessageSerializer(serializers.ModelSerializer):
     sender_data = serializers.SerializerMethodField(read_only=True)
@@ -72,7 +66,13 @@ class MessageSerializer(serializers.ModelSerializer):
     def get_is_read_by_me(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.read_statuses.filter(user=request.user).exists()
+            if obj.sender_id == request.user.id:
+                return True
+            # Курсор чата загружается один раз на весь список сообщений
+            cursors = self.context.setdefault('read_cursors', {})
+            if obj.room_id not in cursors:
+                cursors[obj.room_id] = ReadCursorService.last_read_id(request.user.id, obj.room_id)
+            return obj.id <= cursors[obj.room_id]
         return False
 
 class MessageCreateSerializer(serializers.ModelSerializer):
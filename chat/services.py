@@ -0,0 +1,437 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from accounts.models import User
+from notifications.services import EmailQueueService
+from .models import ChatRoom, ChatDigestEntry, ChatReadCursor, ChatSettings, Message
+from .membership import RoomMembership
+from .presence import PresenceService
+
+logger = logging.getLogger(__name__)
+
+class ChatDigestService:
+    """Сервис дайджестов: непрочитанные сообщения копятся и отправляются одним письмом за окно"""
+    
+    @staticmethod
+    def record_message(message):
+        """Учет нового сообщения для участников чата, которые сейчас не в сети"""
+        room = message.room
+        sender = message.sender
+        
+        # Участники вместе с настройками чата одним запросом
+        participants = room.participants.exclude(id=sender.id).exclude(email='').select_related('chat_settings')
+        recipient_ids = []
+        for participant in participants:
+            chat_settings = getattr(participant, 'chat_settings', None)
+            if chat_settings and not (chat_settings.notifications_enabled and chat_settings.message_notifications):
+                continue
+            recipient_ids.append(participant.id)
+        
+        # Пользователи в сети видят сообщение сразу
+        online_ids = PresenceService.get_online_user_ids(recipient_ids)
+        recipient_ids = [user_id for user_id in recipient_ids if user_id not in online_ids]
+        if not recipient_ids:
+            return 0
+        
+        now = timezone.now()
+        sender_name = sender.get_full_name() or sender.username
+        preview = message.content[:100] + ('...' if len(message.content) > 100 else '')
+        with transaction.atomic():
+            ChatDigestEntry.objects.bulk_create(
+                [
+                    ChatDigestEntry(
+                        user_id=user_id,
+                        room=room,
+                        first_message_at=now,
+                        last_message_at=now
+                    )
+                    for user_id in recipient_ids
+                ],
+                ignore_conflicts=True
+            )
+            ChatDigestEntry.objects.filter(room=room, user_id__in=recipient_ids).update(
+                message_count=F('message_count') + 1,
+                last_sender_name=sender_name[:255],
+                last_message_preview=preview,
+                last_message_at=now
+            )
+        return len(recipient_ids)
+    
+    @staticmethod
+    def clear(user, room):
+        """Сброс дайджеста после прочтения сообщений в чате"""
+        ChatDigestEntry.objects.filter(user=user, room=room).delete()
+    
+    @staticmethod
+    def send_due_digests():
+        """Отправка дайджестов, окно накопления которых истекло"""
+        window = getattr(settings, 'CHAT_DIGEST_WINDOW_SECONDS', 900)
+        deadline = timezone.now() - timedelta(seconds=window)
+        
+        with transaction.atomic():
+            due_users = ChatDigestEntry.objects.filter(first_message_at__lte=deadline).values_list(
+                'user_id', flat=True
+            ).distinct()
+            # Отправляем сразу все накопленное по пользователю, а не только просроченные чаты
+            entries = list(
+                ChatDigestEntry.objects.select_for_update(skip_locked=True).filter(
+                    user_id__in=list(due_users)
+                ).select_related('user', 'room')
+            )
+            if not entries:
+                return 0
+            ChatDigestEntry.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        
+        by_user = defaultdict(list)
+        for entry in entries:
+            by_user[entry.user].append(entry)
+        
+        # Пользователи в сети уже видят сообщения в чате
+        online_ids = PresenceService.get_online_user_ids([user.id for user in by_user])
+        
+        datatuple = []
+        for user, user_entries in by_user.items():
+            if user.id in online_ids or not user.email:
+                continue
+            total = sum(entry.message_count for entry in user_entries)
+            lines = [
+                f'- {entry.room.name or entry.room.get_chat_type_display()}: {entry.message_count} (последнее от {entry.last_sender_name}: "{entry.last_message_preview}")'
+                for entry in user_entries
+            ]
+            subject = f'Непрочитанные сообщения в чате: {total}'
+            message = (
+                f'Здравствуйте, {user.get_full_name() or user.username}!\n\n'
+                f'У вас {total} непрочитанных сообщений:\n'
+                + '\n'.join(lines)
+                + '\n\nПерейдите в чат, чтобы ответить.\n\nС уважением,\nОнлайн-школа'
+            )
+            datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [user.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='chat.digest')
+        return len(datatuple)
+
+class ReadCursorService:
+    """Курсоры прочтения: одна запись на пользователя и чат вместо статуса на каждое сообщение"""
+    
+    @staticmethod
+    def last_read_id(user_id, room_id):
+        return ChatReadCursor.objects.filter(user_id=user_id, room_id=room_id).values_list(
+            'last_read_id', flat=True
+        ).first() or 0
+    
+    @staticmethod
+    def advance(user_id, room_id, message_id):
+        """Сдвиг курсора вперед до message_id, возвращает True, если курсор изменился"""
+        if not message_id:
+            return False
+        ChatReadCursor.objects.bulk_create(
+            [ChatReadCursor(user_id=user_id, room_id=room_id)],
+            ignore_conflicts=True
+        )
+        previous_id = ReadCursorService.last_read_id(user_id, room_id)
+        if previous_id >= message_id:
+            return False
+        # Курсор только растет: устаревший запрос не откатит его назад
+        updated = ChatReadCursor.objects.filter(
+            user_id=user_id,
+            room_id=room_id,
+            last_read_id__lt=message_id
+        ).update(last_read_id=message_id, updated_at=timezone.now())
+        if updated:
+            ReadCursorService.refresh_read_flags(room_id, previous_id, message_id)
+        return bool(updated)
+    
+    @staticmethod
+    def mark_room_read(user_id, room_id):
+        """Все сообщения чата прочитаны пользователем: ID нового курсора или None, если он не сдвинулся"""
+        last_id = Message.objects.filter(room_id=room_id).aggregate(last_id=Max('id'))['last_id']
+        if ReadCursorService.advance(user_id, room_id, last_id):
+            return last_id
+        return None
+    
+    @staticmethod
+    def refresh_read_flags(room_id, after_id, up_to_id):
+        """Устаревший флаг is_read только для сообщений между прежним и новым курсором (прочтение считается по курсорам)"""
+        # Прочитанным всеми сообщение становится, когда его пересекает курсор последнего участника
+        lagging = User.objects.filter(chat_rooms=room_id).exclude(id=OuterRef('sender_id')).exclude(
+            Exists(ChatReadCursor.objects.filter(
+                user_id=OuterRef('pk'),
+                room_id=room_id,
+                last_read_id__gte=OuterRef(OuterRef('id'))
+            ))
+        )
+        return Message.objects.filter(
+            room_id=room_id,
+            is_read=False,
+            id__gt=after_id,
+            id__lte=up_to_id
+        ).exclude(Exists(lagging)).update(is_read=True)
+    
+    @staticmethod
+    def unread_counts(user, room_ids):
+        """Количество непрочитанных сообщений по чатам одним запросом: {room_id: count}"""
+        cursor = ChatReadCursor.objects.filter(user=user, room_id=OuterRef('room_id')).values('last_read_id')[:1]
+        rows = Message.objects.filter(room_id__in=room_ids).exclude(sender=user).annotate(
+            cursor_id=Coalesce(Subquery(cursor), Value(0))
+        ).filter(id__gt=F('cursor_id')).values('room_id').annotate(unread=Count('id')).order_by()
+        return {row['room_id']: row['unread'] for row in rows}
+
+class RoomSummaryService:
+    """Сводка по чатам для боковой панели за постоянное число запросов, независимо от количества чатов"""
+    
+    PARTICIPANTS_PREVIEW_SIZE = 3
+    
+    @staticmethod
+    def annotate(queryset, user, preview=True):
+        """Непрочитанные и число участников - подзапросами, последнее сообщение и участники - срезанным prefetch"""
+        cursor = ChatReadCursor.objects.filter(user=user, room=OuterRef('pk')).values('last_read_id')[:1]
+        unread = Message.objects.filter(
+            room=OuterRef('pk'),
+            id__gt=OuterRef('read_cursor_id')
+        ).exclude(sender=user).order_by().values('room').annotate(count=Count('id')).values('count')
+        participant_count = ChatRoom.participants.through.objects.filter(
+            chatroom=OuterRef('pk')
+        ).order_by().values('chatroom').annotate(count=Count('id')).values('count')
+        
+        # Срез в Prefetch выполняется одним запросом с оконной функцией на все чаты страницы
+        participants = User.objects.order_by('id')
+        if preview:
+            participants = Prefetch(
+                'participants',
+                queryset=participants[:RoomSummaryService.PARTICIPANTS_PREVIEW_SIZE],
+                to_attr='participants_preview'
+            )
+        else:
+            participants = Prefetch('participants', queryset=participants)
+        
+        return queryset.annotate(
+            read_cursor_id=Coalesce(Subquery(cursor), Value(0)),
+            unread_count=Coalesce(Subquery(unread), Value(0)),
+            participant_count=Coalesce(Subquery(participant_count), Value(0))
+        ).prefetch_related(
+            Prefetch(
+                'messages',
+                queryset=Message.objects.select_related('sender').order_by('-id')[:1],
+                to_attr='latest_messages'
+            ),
+            participants
+        )
+    
+    @staticmethod
+    def last_message_data(room):
+        if hasattr(room, 'latest_messages'):
+            last_msg = room.latest_messages[0] if room.latest_messages else None
+        else:
+            last_msg = room.messages.select_related('sender').order_by('-id').first()
+        if last_msg:
+            return {
+                'id': last_msg.id,
+                'content': last_msg.content,
+                'sender': last_msg.sender.get_full_name() or last_msg.sender.username,
+                'created_at': last_msg.created_at
+            }
+        return None
+    
+    @staticmethod
+    def for_user(user):
+        """Сводка по активным чатам пользователя (3 запроса на любое количество чатов)"""
+        rooms = RoomSummaryService.annotate(
+            ChatRoom.objects.filter(participants=user, is_active=True),
+            user
+        )
+        return [
+            {
+                'id': room.id,
+                'name': room.name,
+                'chat_type': room.chat_type,
+                'updated_at': room.updated_at,
+                'unread_count': room.unread_count,
+                'participant_count': room.participant_count,
+                'participants_preview': [
+                    {
+                        'id': participant.id,
+                        'username': participant.username,
+                        'full_name': participant.get_full_name(),
+                        'avatar': participant.avatar.url if participant.avatar else None
+                    }
+                    for participant in room.participants_preview
+                ],
+                'last_message': RoomSummaryService.last_message_data(room),
+            }
+            for room in rooms
+        ]
+
+class LessonChatService:
+    """Чаты занятий: один чат на занятие, участники синхронизируются с группой"""
+    
+    @staticmethod
+    def roster_key(lesson):
+        """Поля занятия, от которых зависит состав его чата"""
+        return (lesson.lesson_type, lesson.teacher_id, lesson.group_id, lesson.student_id)
+    
+    @staticmethod
+    def roster(key):
+        """Преподаватель и студенты занятия по roster_key"""
+        lesson_type, teacher_id, group_id, student_id = key
+        participant_ids = {teacher_id}
+        if lesson_type == 'group' and group_id:
+            participant_ids.update(User.objects.filter(learning_groups=group_id).values_list('id', flat=True))
+        elif lesson_type == 'individual' and student_id:
+            participant_ids.add(student_id)
+        return participant_ids
+    
+    @staticmethod
+    def lesson_participant_ids(lesson):
+        """Преподаватель и студенты занятия"""
+        return LessonChatService.roster(LessonChatService.roster_key(lesson))
+    
+    @staticmethod
+    def room_name(lesson):
+        return f"Урок: {lesson.title}"[:255]
+    
+    @staticmethod
+    def add_participants(room_ids, user_ids):
+        """Добавление участников в чаты одним INSERT (уже добавленные пропускаются)"""
+        room_ids, user_ids = list(room_ids), list(user_ids)
+        if not room_ids or not user_ids:
+            return
+        Through = ChatRoom.participants.through
+        Through.objects.bulk_create(
+            [Through(chatroom_id=room_id, user_id=user_id) for room_id in room_ids for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        # Массовая вставка не вызывает m2m_changed - сбрасываем индекс участников явно
+        RoomMembership.invalidate(room_ids)
+    
+    @staticmethod
+    def remove_participants(room_ids, user_ids):
+        room_ids, user_ids = list(room_ids), list(user_ids)
+        if not room_ids or not user_ids:
+            return
+        ChatRoom.participants.through.objects.filter(chatroom_id__in=room_ids, user_id__in=user_ids).delete()
+        RoomMembership.invalidate(room_ids)
+    
+    @staticmethod
+    def create_room(lesson):
+        """Создание чата занятия (вызывается при создании занятия)"""
+        try:
+            with transaction.atomic():
+                room = ChatRoom.objects.create(
+                    lesson=lesson,
+                    name=LessonChatService.room_name(lesson),
+                    chat_type='group',
+                    created_by_id=lesson.teacher_id
+                )
+        except IntegrityError:
+            # Чат уже создан параллельным запросом
+            return ChatRoom.objects.get(lesson=lesson)
+        LessonChatService.add_participants([room.id], LessonChatService.lesson_participant_ids(lesson))
+        return room
+    
+    @staticmethod
+    def create_rooms(lessons):
+        """Чаты пачки занятий (серии): одна вставка чатов и одна вставка участников на состав"""
+        lessons = list(lessons)
+        if not lessons:
+            return
+        ChatRoom.objects.bulk_create(
+            [
+                ChatRoom(
+                    lesson=lesson,
+                    name=LessonChatService.room_name(lesson),
+                    chat_type='group',
+                    created_by_id=lesson.teacher_id
+                )
+                for lesson in lessons
+            ],
+            ignore_conflicts=True
+        )
+        # bulk_create не вызывает post_save - настройки чата создателей создаются здесь
+        for teacher_id in {lesson.teacher_id for lesson in lessons}:
+            ChatSettings.objects.get_or_create(user_id=teacher_id)
+        
+        room_ids = dict(ChatRoom.objects.filter(lesson__in=lessons).values_list('lesson_id', 'id'))
+        rooms_by_participants = defaultdict(list)
+        participants = {}
+        for lesson in lessons:
+            # У занятий серии один состав - участники выбираются один раз
+            key = LessonChatService.roster_key(lesson)
+            if key not in participants:
+                participants[key] = LessonChatService.roster(key)
+            rooms_by_participants[key].append(room_ids[lesson.id])
+        for key, key_room_ids in rooms_by_participants.items():
+            LessonChatService.add_participants(key_room_ids, participants[key])
+    
+    @staticmethod
+    def get_room(lesson):
+        """Чат занятия; для занятий, созданных до появления связи, создается при первом обращении"""
+        room = ChatRoom.objects.filter(lesson=lesson).first()
+        return room or LessonChatService.create_room(lesson)
+    
+    @staticmethod
+    def sync_lesson(lesson, previous=None):
+        """Приведение чата к занятию после его изменения (previous - roster_key до изменения)"""
+        LessonChatService.sync_lessons([lesson], {lesson.id: previous} if previous else None)
+    
+    @staticmethod
+    def sync_lessons(lessons, previous=None):
+        """Чаты занятий после изменения: состав и название следуют за занятием ({lesson_id: roster_key до изменения})"""
+        previous = previous or {}
+        lessons = list(lessons)
+        rooms = {
+            lesson_id: (room_id, name)
+            for lesson_id, room_id, name in ChatRoom.objects.filter(lesson__in=lessons).values_list('lesson_id', 'id', 'name')
+        }
+        # Чаты занятий, созданных до появления связи, создаются сразу с нужным составом
+        LessonChatService.create_rooms([lesson for lesson in lessons if lesson.id not in rooms])
+        
+        current = defaultdict(set)
+        for room_id, user_id in ChatRoom.participants.through.objects.filter(
+            chatroom_id__in=[room_id for room_id, name in rooms.values()]
+        ).values_list('chatroom_id', 'user_id'):
+            current[room_id].add(user_id)
+        
+        # У занятий серии один состав - участники выбираются один раз
+        rosters = {}
+        for key in {LessonChatService.roster_key(lesson) for lesson in lessons} | set(previous.values()):
+            rosters[key] = LessonChatService.roster(key)
+        
+        stale_rooms = defaultdict(list)
+        missing_rooms = defaultdict(list)
+        renamed_rooms = defaultdict(list)
+        for lesson in lessons:
+            if lesson.id not in rooms:
+                continue
+            room_id, name = rooms[lesson.id]
+            roster = rosters[LessonChatService.roster_key(lesson)]
+            # Удаляются только бывшие преподаватель и студенты занятия: участники, добавленные
+            # вручную (администраторы, кураторы, родители), остаются в чате
+            if lesson.id in previous:
+                stale = frozenset((rosters[previous[lesson.id]] - roster) & current[room_id])
+                if stale:
+                    stale_rooms[stale].append(room_id)
+            missing = frozenset(roster - current[room_id])
+            if missing:
+                missing_rooms[missing].append(room_id)
+            if name != LessonChatService.room_name(lesson):
+                renamed_rooms[LessonChatService.room_name(lesson)].append(room_id)
+        
+        for user_ids, stale_room_ids in stale_rooms.items():
+            LessonChatService.remove_participants(stale_room_ids, user_ids)
+        for user_ids, missing_room_ids in missing_rooms.items():
+            LessonChatService.add_participants(missing_room_ids, user_ids)
+        for name, renamed_room_ids in renamed_rooms.items():
+            ChatRoom.objects.filter(id__in=renamed_room_ids).update(name=name)
+    
+    @staticmethod
+    def group_room_ids(group_ids):
+        """Чаты групповых занятий указанных групп"""
+        return list(ChatRoom.objects.filter(
+            lesson__group_id__in=group_ids,
+            lesson__lesson_type='group'
+        ).values_list('id', flat=True))
\ No newline at end of file
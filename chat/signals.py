@@ -1,48 +1,21 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
+from .membership import RoomMembership
+from .services import ChatDigestService, LessonChatService
 from .models import Message, ChatRoom, ChatSettings
 from accounts.models import User
+from courses.models import Lesson, Group
+
+# Поля занятия, от которых зависят состав и название его чата
+LESSON_CHAT_FIELDS = {'lesson_type', 'teacher', 'group', 'student', 'title'}
 
 @receiver(post_save, sender=Message)
 def notify_new_message(sender, instance, created, **kwargs):
     """Уведомление о новом сообщении"""
     if created:
-        room = instance.room
-        sender_user = instance.sender
-        
-        # Получаем настройки чата для каждого участника
-        for participant in room.participants.exclude(id=sender_user.id):
-            # Проверяем настройки уведомлений
-            chat_settings, created = ChatSettings.objects.get_or_create(user=participant)
-            
-            if chat_settings.notifications_enabled and chat_settings.message_notifications:
-                # Отправляем email уведомление
-                if participant.email:
-                    try:
-                        subject = f'Новое сообщение в чате'
-                        message_content = f'''
-                        Здравствуйте, {participant.get_full_name() or participant.username}!
-                        
-                        {sender_user.get_full_name() or sender_user.username} отправил новое сообщение в чат:
-                        "{instance.content[:100]}{'...' if len(instance.content) > 100 else ''}"
-                        
-                        Перейдите в чат, чтобы ответить.
-                        
-                        С уважением,
-                        Онлайн-школа
-                        '''
-                        
-                        send_mail(
-                            subject,
-                            message_content,
-                            settings.DEFAULT_FROM_EMAIL,
-                            [participant.email],
-                            fail_silently=True,
-                        )
-                    except Exception as e:
-                        print(f"Ошибка отправки email: {e}")
+        # Письмо не отправляется на каждое сообщение: непрочитанные копятся
+        # в дайджесте и уходят одним письмом за окно CHAT_DIGEST_WINDOW_SECONDS
+        ChatDigestService.record_message(instance)
 
 @receiver(post_save, sender=ChatRoom)
 def create_default_chat_settings(sender, instance, created, **kwargs):
@@ -51,6 +24,85 @@ def create_default_chat_settings(sender, instance, created, **kwargs):
         # Создаем настройки чата для создателя
         ChatSettings.objects.get_or_create(user=instance.created_by)
 
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+def invalidate_room_membership(sender, instance, **kwargs):
+    """Сброс индекса участников при изменении или удалении чата"""
+    RoomMembership.invalidate([instance.id])
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def invalidate_room_membership_on_participants_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сброс индекса участников при изменении состава чата"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            RoomMembership.invalidate([instance.id])
+        return
+    
+    # Изменение со стороны пользователя (user.chat_rooms): pk_set - ID чатов
+    if action == 'pre_clear':
+        instance._cleared_chat_room_ids = list(instance.chat_rooms.values_list('id', flat=True))
+    elif action == 'post_clear':
+        RoomMembership.invalidate(getattr(instance, '_cleared_chat_room_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        RoomMembership.invalidate(pk_set or [])
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_chat_roster(sender, instance, update_fields=None, **kwargs):
+    """Состав и тема занятия до сохранения: чат синхронизируется, только если они изменились"""
+    if instance.pk and (update_fields is None or LESSON_CHAT_FIELDS & set(update_fields)):
+        previous = Lesson.objects.filter(pk=instance.pk).values_list(
+            'lesson_type', 'teacher_id', 'group_id', 'student_id', 'title'
+        ).first()
+        if previous is not None:
+            instance._previous_chat_roster, instance._previous_chat_title = previous[:4], previous[4]
+
+@receiver(post_save, sender=Lesson)
+def sync_lesson_chat_room(sender, instance, created, **kwargs):
+    """Чат занятия создается один раз вместе с занятием"""
+    if created:
+        LessonChatService.create_room(instance)
+        return
+    if not hasattr(instance, '_previous_chat_roster'):
+        return
+    previous = instance._previous_chat_roster
+    title = instance._previous_chat_title
+    del instance._previous_chat_roster, instance._previous_chat_title
+    if previous != LessonChatService.roster_key(instance) or title != instance.title:
+        # Сменились преподаватель, группа, студент или тема: прежние участники занятия
+        # покидают чат, новые добавляются, название обновляется
+        LessonChatService.sync_lesson(instance, previous)
+
+@receiver(m2m_changed, sender=Group.students.through)
+def sync_lesson_chats_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Синхронизация участников чатов групповых занятий с составом группы"""
+    if not reverse:
+        # Изменение со стороны группы: pk_set - ID студентов
+        if action == 'pre_clear':
+            instance._cleared_student_ids = list(instance.students.values_list('id', flat=True))
+        elif action == 'post_add':
+            LessonChatService.add_participants(LessonChatService.group_room_ids([instance.id]), pk_set)
+        elif action == 'post_remove':
+            LessonChatService.remove_participants(LessonChatService.group_room_ids([instance.id]), pk_set)
+        elif action == 'post_clear':
+            LessonChatService.remove_participants(
+                LessonChatService.group_room_ids([instance.id]),
+                getattr(instance, '_cleared_student_ids', [])
+            )
+        return
+    
+    # Изменение со стороны студента (user.learning_groups): pk_set - ID групп
+    if action == 'pre_clear':
+        instance._cleared_group_ids = list(instance.learning_groups.values_list('id', flat=True))
+    elif action == 'post_add':
+        LessonChatService.add_participants(LessonChatService.group_room_ids(pk_set), [instance.id])
+    elif action == 'post_remove':
+        LessonChatService.remove_participants(LessonChatService.group_room_ids(pk_set), [instance.id])
+    elif action == 'post_clear':
+        LessonChatService.remove_participants(
+            LessonChatService.group_room_ids(getattr(instance, '_cleared_group_ids', [])),
+            [instance.id]
+        )
+
 @receiver(post_delete, sender=Message)
 def cleanup_message_files(sender, instance, **kwargs):
     """Очистка файлов при удалении сообщения"""
@@ -0,0 +1,36 @@
+from celery import shared_task
+from django.db import DatabaseError
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3
+)
+def send_chat_digests():
+    """Периодическая отправка дайджестов непрочитанных сообщений"""
+    from .services import ChatDigestService
+    
+    return ChatDigestService.send_due_digests()
+
+@shared_task
+def cleanup_presence():
+    """Очистка онлайн-статусов пользователей без heartbeat"""
+    from .presence import PresenceService
+    
+    return PresenceService.cleanup()
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3
+)
+def flush_chat_messages():
+    """Страховочная запись сообщений из очереди отложенной записи (если флашер не запущен или упал)"""
+    from .write_behind import MessageWriteBehind
+    
+    total = 0
+    while True:
+        flushed = MessageWriteBehind.flush()
+        if not flushed:
+            return total
+        total += flushed
\ No newline at end of file
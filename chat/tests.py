@@ -2,7 +2,17 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import ChatRoom, Message
+from datetime import timedelta
+from django.utils import timezone
+from django.core.cache import cache
+from notifications.models import OutgoingEmail
+from .models import ChatRoom, Message, ChatDigestEntry, ChatReadCursor
+from .membership import RoomMembership
+from .presence import PresenceService
+from .services import ChatDigestService, RoomSummaryService
+from courses.models import Course, Group, Lesson
+from .typing import TypingThrottle
+from .write_behind import MessageWriteBehind
 
 User = get_user_model()
 
@@ -66,4 +76,352 @@ class ChatTestCase(APITestCase):
         response = self.client.get(f'/api/chat/messages/?room={self.chat_room.id}')
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 1)
+    
+    def test_chat_digest(self):
+        """Тест накопления сообщений в дайджест и отправки одного письма"""
+        for i in range(3):
+            Message.objects.create(
+                room=self.chat_room,
+                sender=self.user1,
+                content=f'Сообщение {i}'
+            )
+        
+        entry = ChatDigestEntry.objects.get(user=self.user2, room=self.chat_room)
+        self.assertEqual(entry.message_count, 3)
+        self.assertFalse(ChatDigestEntry.objects.filter(user=self.user1).exists())
+        
+        # Окно еще не истекло
+        self.assertEqual(ChatDigestService.send_due_digests(), 0)
+        
+        ChatDigestEntry.objects.update(first_message_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(ChatDigestService.send_due_digests(), 1)
+        self.assertEqual(OutgoingEmail.objects.filter(source='chat.digest', recipients=['user2@test.com']).count(), 1)
+        self.assertFalse(ChatDigestEntry.objects.exists())
+    
+    def test_chat_digest_cleared_on_read(self):
+        """Тест сброса дайджеста при открытии чата"""
+        Message.objects.create(
+            room=self.chat_room,
+            sender=self.user1,
+            content='Тестовое сообщение'
+        )
+        
+        self.client.force_authenticate(user=self.user2)
+        self.client.get(f'/api/chat/messages/?room={self.chat_room.id}')
+        
+        self.assertFalse(ChatDigestEntry.objects.filter(user=self.user2).exists())
+    
+    def test_online_participants(self):
+        """Тест онлайн-статуса участников чата"""
+        PresenceService.connect(self.user2.id, 'channel-1')
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(f'/api/chat/rooms/{self.chat_room.id}/online/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['online_user_ids'], [self.user2.id])
+        
+        # Закрытие одной из вкладок не выводит пользователя из сети
+        PresenceService.connect(self.user2.id, 'channel-2')
+        PresenceService.heartbeat(self.user2.id, 'channel-2')
+        self.assertEqual(PresenceService.disconnect(self.user2.id, 'channel-2'), 1)
+        self.assertTrue(PresenceService.is_online(self.user2.id))
+        
+        PresenceService.disconnect(self.user2.id, 'channel-1')
+        response = self.client.get(f'/api/chat/rooms/{self.chat_room.id}/online/')
+        self.assertEqual(response.data['online_count'], 0)
+    
+    def test_membership_index(self):
+        """Тест обновления индекса участников при изменении состава чата"""
+        user3 = User.objects.create_user(
+            username='user3',
+            email='user3@test.com',
+            password='testpass123',
+            role='student'
+        )
+        self.assertEqual(RoomMembership.member_ids(self.chat_room.id), {self.user1.id, self.user2.id})
+        
+        self.client.force_authenticate(user=user3)
+        response = self.client.get(f'/api/chat/messages/?room={self.chat_room.id}')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            f'/api/chat/rooms/{self.chat_room.id}/participants/add/',
+            {'user_id': user3.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(RoomMembership.is_member(self.chat_room.id, user3.id))
+        
+        self.client.force_authenticate(user=user3)
+        response = self.client.get(f'/api/chat/messages/?room={self.chat_room.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.chat_room.participants.remove(user3)
+        self.assertFalse(RoomMembership.is_member(self.chat_room.id, user3.id))
+        
+        # Состав, закешированный параллельным запросом до коммита, сбрасывается после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chat_room.participants.add(user3)
+            cache.set(RoomMembership.cache_key(self.chat_room.id), {
+                'active': True,
+                'created_by': self.user1.id,
+                'members': frozenset([self.user1.id, self.user2.id])
+            })
+        self.assertTrue(RoomMembership.is_member(self.chat_room.id, user3.id))
+    
+    def test_write_behind_persist(self):
+        """Тест пакетной записи сообщений из очереди (повторная запись пачки безопасна)"""
+        payloads = [
+            MessageWriteBehind.build(self.chat_room.id, self.user1.id, f'Сообщение {i}', 'text')
+            for i in range(3)
+        ]
+        saved = MessageWriteBehind.persist(payloads)
+        
+        self.assertEqual([str(message.uuid) for message in saved], [payload['uuid'] for payload in payloads])
+        self.assertEqual(saved[0].created_at.isoformat(), payloads[0]['created_at'])
+        self.assertEqual(ChatDigestEntry.objects.get(user=self.user2).message_count, 3)
+        
+        # Повторная запись после падения флашера не создает дублей
+        self.assertEqual(MessageWriteBehind.persist(payloads), [])
+        self.assertEqual(Message.objects.filter(room=self.chat_room).count(), 3)
+        
+        # Некорректные данные клиента не попадают в очередь
+        with self.assertRaises(ValueError):
+            MessageWriteBehind.build(self.chat_room.id, self.user1.id, 'Текст', 'x' * 50)
+        with self.assertRaises(ValueError):
+            MessageWriteBehind.build(self.chat_room.id, self.user1.id, {'text': 'Текст'}, 'text')
+    
+    def test_rest_room_events(self):
+        """Тест событий чата из REST: сообщения, прочтения и удаления доходят до подписчиков"""
+        import json
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'chat_{self.chat_room.id}', channel)
+        
+        def next_frame():
+            return json.loads(async_to_sync(layer.receive)(channel)['frame'])
+        
+        self.client.force_authenticate(user=self.user1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/chat/messages/', {
+                'room': self.chat_room.id,
+                'content': 'Из REST',
+                'message_type': 'text'
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        message = Message.objects.get(content='Из REST')
+        frame = next_frame()
+        self.assertEqual(frame['type'], 'message')
+        self.assertEqual(frame['data']['uuid'], str(message.uuid))
+        self.assertEqual(frame['data']['sender']['id'], self.user1.id)
+        
+        self.client.force_authenticate(user=self.user2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/chat/messages/mark-read/', {
+                'room_id': self.chat_room.id,
+                'message_ids': [message.id]
+            }, format='json')
+        frame = next_frame()
+        self.assertEqual((frame['type'], frame['data']['message_id'], frame['data']['user_id']), ('read', message.id, self.user2.id))
+        
+        self.client.force_authenticate(user=self.user1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/chat/messages/{message.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        frame = next_frame()
+        self.assertEqual((frame['type'], frame['data']['id']), ('message_deleted', message.id))
+    
+    def test_read_cursor(self):
+        """Тест непрочитанных сообщений по курсору прочтения"""
+        messages = [
+            Message.objects.create(room=self.chat_room, sender=self.user1, content=f'Сообщение {i}')
+            for i in range(3)
+        ]
+        
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get('/api/chat/unread/')
+        self.assertEqual(response.data[0]['unread_count'], 3)
+        
+        response = self.client.post('/api/chat/messages/mark-read/', {
+            'room_id': self.chat_room.id,
+            'message_ids': [messages[1].id]
+        }, format='json')
+        self.assertEqual(response.data['updated_messages'], 2)
+        self.assertEqual(ChatReadCursor.objects.get(user=self.user2).last_read_id, messages[1].id)
+        self.assertEqual(
+            list(Message.objects.filter(is_read=True).values_list('id', flat=True)),
+            [messages[0].id, messages[1].id]
+        )
+        
+        # Флаги обновляются только между прежним и новым курсором
+        Message.objects.update(is_read=False)
+        self.client.post('/api/chat/messages/mark-read/', {
+            'room_id': self.chat_room.id,
+            'message_ids': [messages[2].id]
+        }, format='json')
+        self.assertEqual(list(Message.objects.filter(is_read=True).values_list('id', flat=True)), [messages[2].id])
+        
+        response = self.client.get(f'/api/chat/messages/?room={self.chat_room.id}')
+        results = response.data.get('results', response.data)
+        self.assertTrue(all(message['is_read_by_me'] for message in results))
+        
+        response = self.client.get('/api/chat/unread/')
+        self.assertEqual(response.data, [])
+    
+    def test_rooms_summary(self):
+        """Тест сводки по чатам за постоянное число запросов"""
+        group_room = ChatRoom.objects.create(name='Группа', chat_type='group', created_by=self.user2)
+        group_room.participants.add(self.user1, self.user2)
+        Message.objects.create(room=self.chat_room, sender=self.user2, content='Первое')
+        Message.objects.create(room=self.chat_room, sender=self.user2, content='Второе')
+        
+        with self.assertNumQueries(3):
+            summary = {room['id']: room for room in RoomSummaryService.for_user(self.user1)}
+        
+        self.assertEqual(summary[self.chat_room.id]['unread_count'], 2)
+        self.assertEqual(summary[self.chat_room.id]['last_message']['content'], 'Второе')
+        self.assertEqual(summary[self.chat_room.id]['participant_count'], 2)
+        self.assertEqual(len(summary[self.chat_room.id]['participants_preview']), 2)
+        self.assertIsNone(summary[group_room.id]['last_message'])
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get('/api/chat/rooms/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        
+        response = self.client.get('/api/chat/rooms/')
+        rooms = {room['id']: room for room in response.data.get('results', response.data)}
+        self.assertEqual(rooms[self.chat_room.id]['unread_messages_count'], 2)
+        self.assertEqual(rooms[self.chat_room.id]['last_message']['content'], 'Второе')
+        self.assertEqual(len(rooms[group_room.id]['participants_data']), 2)
+    
+    def test_keyset_pagination(self):
+        """Тест курсорной пагинации истории сообщений"""
+        messages = [
+            Message.objects.create(room=self.chat_room, sender=self.user1, content=f'Сообщение {i}')
+            for i in range(7)
+        ]
+        ids = [message.id for message in messages]
+        url = f'/api/chat/messages/?room={self.chat_room.id}&limit=3'
+        self.client.force_authenticate(user=self.user2)
+        
+        response = self.client.get(url)
+        self.assertEqual([item['id'] for item in response.data['results']], ids[4:])
+        self.assertTrue(response.data['has_older'])
+        self.assertFalse(response.data['has_newer'])
+        
+        response = self.client.get(f'{url}&before={ids[4]}')
+        self.assertEqual([item['id'] for item in response.data['results']], ids[1:4])
+        
+        response = self.client.get(f'{url}&before={ids[1]}')
+        self.assertEqual([item['id'] for item in response.data['results']], ids[:1])
+        self.assertFalse(response.data['has_older'])
+        
+        response = self.client.get(f'{url}&after={ids[1]}')
+        self.assertEqual([item['id'] for item in response.data['results']], ids[2:5])
+        self.assertTrue(response.data['has_newer'])
+        
+        response = self.client.get(f'{url}&around={ids[3]}')
+        self.assertEqual([item['id'] for item in response.data['results']], ids[2:5])
+    
+    def test_edit_message(self):
+        """Тест редактирования сообщения с публикацией события чата"""
+        message = Message.objects.create(room=self.chat_room, sender=self.user1, content='Черновик')
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.patch(f'/api/chat/messages/{message.id}/', {'content': 'Исправлено'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        message.refresh_from_db()
+        self.assertTrue(message.is_edited)
+        self.assertEqual(message.content, 'Исправлено')
+    
+    def test_typing_throttle(self):
+        """Тест схлопывания событий набора текста"""
+        throttle = TypingThrottle(interval=3, ttl=6)
+        room_id = self.chat_room.id
+        user_id = self.user1.id
+        
+        self.assertTrue(throttle.should_send(room_id, user_id, True, now=0))
+        throttle.record_frame(room_id, '{"type": "typing"}')
+        # Повторные кадры в пределах интервала подавляются
+        self.assertFalse(throttle.should_send(room_id, user_id, True, now=1))
+        # Остановка и новый набор внутри интервала тоже не рассылаются
+        self.assertFalse(throttle.should_send(room_id, user_id, False, now=1.5))
+        self.assertFalse(throttle.should_send(room_id, user_id, True, now=2))
+        # Продление индикатора после интервала
+        self.assertTrue(throttle.should_send(room_id, user_id, True, now=3.5))
+        self.assertFalse(throttle.should_send(room_id, user_id, False, now=4))
+        self.assertTrue(throttle.should_send(room_id, user_id, False, now=7))
+        self.assertFalse(throttle.should_send(room_id, user_id, True, now=8))
+        
+        # Вторая вкладка пользователя делит состояние с первой
+        other_tab = TypingThrottle(interval=3, ttl=6)
+        self.assertFalse(other_tab.should_send(room_id, user_id, True, now=9))
+        self.assertTrue(other_tab.should_send(room_id, self.user2.id, True, now=9))
+        
+        stats = throttle.pop_stats(room_id)[room_id]
+        self.assertEqual(stats['received'], 8)
+        self.assertEqual(stats['broadcast'], 3)
+        self.assertEqual(stats['suppressed'], 5)
+        self.assertEqual(stats['suppressed_bytes'], 5 * len('{"type": "typing"}'))
+    
+    def test_lesson_chat_room(self):
+        """Тест чата занятия: создается вместе с занятием и следует за составом группы"""
+        teacher = User.objects.create_user(
+            username='teacher',
+            email='teacher@test.com',
+            password='testpass123',
+            role='teacher'
+        )
+        course = Course.objects.create(title='Курс', description='Описание', price=1000, duration_hours=10, level='A1')
+        group = Group.objects.create(title='Группа', course=course, teacher=teacher, start_date=timezone.now().date(), end_date=timezone.now().date() + timedelta(days=30))
+        group.students.add(self.user1)
+        lesson = Lesson.objects.create(
+            group=group,
+            teacher=teacher,
+            title='Занятие',
+            lesson_type='group',
+            start_time=timezone.now(),
+            end_time=timezone.now() + timedelta(hours=1)
+        )
+        
+        room = ChatRoom.objects.get(lesson=lesson)
+        self.assertEqual(set(room.participants.values_list('id', flat=True)), {teacher.id, self.user1.id})
+        
+        group.students.add(self.user2)
+        self.assertTrue(RoomMembership.is_member(room.id, self.user2.id))
+        group.students.remove(self.user1)
+        self.assertFalse(room.participants.filter(id=self.user1.id).exists())
+        
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(f'/api/courses/lessons/{lesson.id}/chat/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ChatRoom.objects.filter(lesson=lesson).count(), 1)
+        
+        # Переназначение индивидуального занятия убирает прежних участников
+        other_teacher = User.objects.create_user(username='other_teacher', password='testpass123', role='teacher')
+        individual = Lesson.objects.create(
+            student=self.user1,
+            teacher=teacher,
+            title='Индивидуальное',
+            lesson_type='individual',
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1)
+        )
+        # Участник, добавленный вручную, остается в чате
+        curator = User.objects.create_user(username='curator', password='testpass123', role='admin')
+        ChatRoom.objects.get(lesson=individual).participants.add(curator)
+        individual.teacher = other_teacher
+        individual.student = self.user2
+        individual.title = 'Индивидуальное (перенос)'
+        individual.save()
+        room = ChatRoom.objects.get(lesson=individual)
+        self.assertEqual(set(room.participants.values_list('id', flat=True)), {other_teacher.id, self.user2.id, curator.id})
+        self.assertFalse(RoomMembership.is_member(room.id, self.user1.id))
+        self.assertEqual(room.name, 'Урок: Индивидуальное (перенос)')
\ No newline at end of file
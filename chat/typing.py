@@ -0,0 +1,97 @@
+import logging
+import time
+from collections import Counter, defaultdict
+from django.core.cache import cache
+from redis import RedisError
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Счетчики событий набора текста по чату
+TYPING_STATS_KEY = 'chat:typing:stats:{room_id}'
+# Последнее разосланное состояние набора текста пользователя в чате
+TYPING_STATE_KEY = 'chat:typing:{room_id}:{user_id}'
+
+class TypingThrottle:
+    """Схлопывание событий набора текста: не больше одного изменения состояния за интервал на пользователя и чат"""
+    
+    def __init__(self, interval, ttl):
+        self.interval = interval
+        # Клиенты сами сбрасывают индикатор через ttl секунд без обновления
+        self.ttl = ttl
+        self.frame_sizes = {}
+        self.stats = defaultdict(Counter)
+    
+    @staticmethod
+    def cache_key(room_id, user_id):
+        return TYPING_STATE_KEY.format(room_id=room_id, user_id=user_id)
+    
+    def should_send(self, room_id, user_id, is_typing, now=None):
+        """Нужно ли рассылать событие (состояние общее для всех вкладок пользователя)"""
+        now = time.time() if now is None else now
+        stats = self.stats[room_id]
+        stats['received'] += 1
+        
+        key = self.cache_key(room_id, user_id)
+        # Запись истекает вместе с индикатором у клиентов
+        previous = cache.get(key)
+        if previous is not None and now - previous[1] < self.interval:
+            # Любое изменение чаще интервала подавляется; не разосланную остановку погасит истечение индикатора
+            send = False
+        elif is_typing:
+            send = True
+        else:
+            # Остановку рассылаем, только если индикатор у клиентов еще не истек
+            send = previous is not None and previous[0] and now - previous[1] < self.ttl
+        
+        if send:
+            cache.set(key, (is_typing, now), timeout=self.ttl)
+            stats['broadcast'] += 1
+        else:
+            stats['suppressed'] += 1
+            stats['suppressed_bytes'] += self.frame_sizes.get(room_id, 0)
+        return send
+    
+    def record_frame(self, room_id, frame):
+        self.frame_sizes[room_id] = len(frame.encode())
+    
+    def pop_stats(self, room_id=None):
+        """Накопленные счетчики для записи в Redis: {room_id: Counter}"""
+        if room_id is not None:
+            stats = self.stats.pop(room_id, None)
+            return {room_id: stats} if stats else {}
+        stats, self.stats = dict(self.stats), defaultdict(Counter)
+        return stats
+
+class TypingStats:
+    """Счетчики набора текста по чатам: сколько событий получено, разослано и подавлено"""
+    
+    @staticmethod
+    def add(stats):
+        client = get_redis()
+        if client is None or not stats:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for room_id, counters in stats.items():
+                key = TYPING_STATS_KEY.format(room_id=room_id)
+                for field, value in counters.items():
+                    pipe.hincrby(key, field, value)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Ошибка записи статистики набора текста: {str(e)}")
+    
+    @staticmethod
+    def get(room_id):
+        """Счетчики чата и сэкономленный трафик на одного получателя"""
+        client = get_redis()
+        stats = {'received': 0, 'broadcast': 0, 'suppressed': 0, 'suppressed_bytes': 0}
+        if client is None:
+            return stats
+        try:
+            values = client.hgetall(TYPING_STATS_KEY.format(room_id=room_id))
+        except RedisError as e:
+            logger.warning(f"Ошибка чтения статистики набора текста: {str(e)}")
+            return stats
+        stats.update({field: int(value) for field, value in values.items()})
+        return stats
\ No newline at end of file
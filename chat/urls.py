@@ -6,9 +6,12 @@ from .views import (
     MessageDetailView,
     ChatSettingsView,
     get_unread_messages,
+    get_rooms_summary,
     mark_messages_as_read,
     create_private_chat,
     get_chat_participants,
+    get_online_participants,
+    get_typing_stats,
     add_participant_to_chat,
     remove_participant_from_chat
 )
@@ -16,9 +19,12 @@ from .views import (
 urlpatterns = [
     # Чаты
     path('rooms/', ChatRoomListCreateView.as_view(), name='chat-room-list'),
+    path('rooms/summary/', get_rooms_summary, name='chat-rooms-summary'),
     path('rooms/<int:pk>/', ChatRoomDetailView.as_view(), name='chat-room-detail'),
     path('rooms/create-private/', create_private_chat, name='create-private-chat'),
     path('rooms/<int:room_id>/participants/', get_chat_participants, name='chat-participants'),
+    path('rooms/<int:room_id>/online/', get_online_participants, name='chat-online-participants'),
+    path('rooms/<int:room_id>/typing-stats/', get_typing_stats, name='chat-typing-stats'),
     path('rooms/<int:room_id>/participants/add/', add_participant_to_chat, name='add-participant'),
     path('rooms/<int:room_id>/participants/remove/', remove_participant_from_chat, name='remove-participant'),
     
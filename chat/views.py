@@ -2,6 +2,7 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.db.models import Q, Count, Max
@@ -17,8 +18,23 @@ from .serializers import (
     UnreadMessagesSerializer
 )
 from .permissions import IsChatParticipant
+from .events import message_event, publish_room_event
+from .membership import RoomMembership
+from .pagination import MessageKeysetPagination
+from .presence import PresenceService
+from .services import ChatDigestService, ReadCursorService, RoomSummaryService
+from .typing import TypingStats
 
 
+def publish_read_event(user_id, room_id, message_id):
+    """Событие прочтения из REST в том же формате, что и кадр 'read' WebSocket"""
+    publish_room_event(room_id, 'read', {
+        'message_id': message_id,
+        'message_uuid': str(Message.objects.filter(id=message_id).values_list('uuid', flat=True).first()),
+        'user_id': user_id,
+        'room_id': room_id,
+    })
+
 class ChatRoomListCreateView(generics.ListCreateAPIView):
     """Список чатов и создание нового чата"""
     serializer_class = ChatRoomSerializer
@@ -31,7 +47,12 @@ class ChatRoomListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        return ChatRoom.objects.filter(participants=user, is_active=True).distinct()
+        # Непрочитанные, последнее сообщение и участники - без запросов на каждый чат
+        return RoomSummaryService.annotate(
+            ChatRoom.objects.filter(participants=user, is_active=True),
+            user,
+            preview=False
+        )
     
     def perform_create(self, serializer):
         room = serializer.save(created_by=self.request.user)
@@ -54,32 +75,29 @@ class MessageListCreateView(generics.ListCreateAPIView):
     """Список сообщений и создание нового сообщения"""
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    # Порядок задает пагинация по ключу (created_at, id)
+    pagination_class = MessageKeysetPagination
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['room', 'message_type', 'is_read']
-    ordering_fields = ['created_at']
-    ordering = ['created_at']
     
     def get_queryset(self):
         user = self.request.user
         room_id = self.request.query_params.get('room', None)
         
         if room_id:
-            # Проверяем, что пользователь участник чата
-            room = get_object_or_404(ChatRoom, id=room_id, participants=user)
-            queryset = Message.objects.filter(room=room)
+            # Проверяем по индексу участников, что пользователь участник чата
+            member_ids = RoomMembership.member_ids(room_id)
+            if user.id not in member_ids:
+                raise NotFound('Чат не найден')
+            queryset = Message.objects.filter(room_id=room_id).select_related('sender', 'reply_to__sender')
             
-            # Отмечаем сообщения как прочитанные
-            unread_messages = queryset.filter(is_read=False).exclude(sender=user)
-            for message in unread_messages:
-                MessageReadStatus.objects.get_or_create(
-                    message=message,
-                    user=user,
-                    defaults={'read_at': timezone.now()}
-                )
-                # Обновляем флаг is_read если все участники прочитали
-                if message.read_statuses.count() >= room.participants.count() - 1:
-                    message.is_read = True
-                    message.save()
+            # Пользователь открыл чат - дайджест по нему больше не нужен
+            ChatDigestService.clear(user, room_id)
+            
+            # Отмечаем чат прочитанным: один курсор вместо статуса на каждое сообщение
+            last_read_id = ReadCursorService.mark_room_read(user.id, room_id)
+            if last_read_id:
+                publish_read_event(user.id, room_id, last_read_id)
             
             return queryset
         return Message.objects.none()
@@ -90,12 +108,15 @@ class MessageListCreateView(generics.ListCreateAPIView):
         return MessageSerializer
     
     def perform_create(self, serializer):
+        room = serializer.validated_data['room']
+        if not RoomMembership.is_member(room.id, self.request.user.id):
+            raise PermissionDenied('Вы не являетесь участником этого чата')
+        
         message = serializer.save(sender=self.request.user)
-        # Создаем статус прочтения для отправителя
-        MessageReadStatus.objects.create(
-            message=message,
-            user=self.request.user
-        )
+        # Отправитель прочитал чат до своего сообщения
+        ReadCursorService.advance(self.request.user.id, room.id, message.id)
+        # Сообщение из REST попадает в буфер событий и к подписчикам так же, как из WebSocket
+        publish_room_event(room.id, 'message', message_event(message))
 
 class MessageDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Детали сообщения"""
@@ -119,9 +140,20 @@ class MessageDetailView(generics.RetrieveUpdateDestroyAPIView):
                 'error': 'Только отправитель может редактировать сообщение'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        message.is_edited = True
         return super().update(request, *args, **kwargs)
     
+    def perform_update(self, serializer):
+        message = serializer.save(is_edited=True)
+        # Подписчики чата (и клиенты после переподключения) получают исправленный текст
+        publish_room_event(message.room_id, 'message_edited', {
+            'id': message.id,
+            'uuid': str(message.uuid),
+            'content': message.content,
+            'room_id': message.room_id,
+            'is_edited': True,
+            'updated_at': message.updated_at.isoformat(),
+        })
+    
     def destroy(self, request, *args, **kwargs):
         message = self.get_object()
         if message.sender != request.user and not request.user.is_admin:
@@ -130,6 +162,15 @@ class MessageDetailView(generics.RetrieveUpdateDestroyAPIView):
             }, status=status.HTTP_403_FORBIDDEN)
         
         return super().destroy(request, *args, **kwargs)
+    
+    def perform_destroy(self, instance):
+        event = {
+            'id': instance.id,
+            'uuid': str(instance.uuid),
+            'room_id': instance.room_id,
+        }
+        instance.delete()
+        publish_room_event(event['room_id'], 'message_deleted', event)
 
 class ChatSettingsView(generics.RetrieveUpdateAPIView):
     """Настройки чата пользователя"""
@@ -149,25 +190,30 @@ def get_unread_messages(request):
     user = request.user
     
     # Получаем все чаты пользователя
-    user_rooms = ChatRoom.objects.filter(participants=user, is_active=True)
+    user_rooms = ChatRoom.objects.filter(participants=user, is_active=True).values_list('id', 'name')
+    rooms = dict(user_rooms)
     
-    unread_data = []
-    for room in user_rooms:
-        unread_count = Message.objects.filter(
-            room=room,
-            is_read=False
-        ).exclude(sender=user).count()
-        
-        if unread_count > 0:
-            unread_data.append({
-                'room_id': room.id,
-                'room_name': room.name or f"Чат {room.id}",
-                'unread_count': unread_count
-            })
+    # Непрочитанные по курсорам прочтения, один запрос на все чаты
+    unread_counts = ReadCursorService.unread_counts(user, list(rooms))
+    unread_data = [
+        {
+            'room_id': room_id,
+            'room_name': rooms[room_id] or f"Чат {room_id}",
+            'unread_count': unread_count
+        }
+        for room_id, unread_count in unread_counts.items()
+        if unread_count > 0
+    ]
     
     serializer = UnreadMessagesSerializer(unread_data, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_rooms_summary(request):
+    """Сводка по чатам для боковой панели: непрочитанные, последнее сообщение, участники"""
+    return Response(RoomSummaryService.for_user(request.user))
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_messages_as_read(request):
@@ -178,37 +224,29 @@ def mark_messages_as_read(request):
     try:
         room = ChatRoom.objects.get(id=room_id, participants=request.user)
         
+        # Курсор сдвигается до самого позднего из отмеченных сообщений (или до последнего в чате)
+        messages = Message.objects.filter(room=room)
         if message_ids:
-            messages = Message.objects.filter(
-                id__in=message_ids,
-                room=room
-            ).exclude(sender=request.user)
-        else:
-            # Отмечаем все непрочитанные сообщения в чате
-            messages = Message.objects.filter(
-                room=room,
-                is_read=False
-            ).exclude(sender=request.user)
+            messages = messages.filter(id__in=message_ids)
+        last_read_id = messages.aggregate(last_id=Max('id'))['last_id']
+        previous_id = ReadCursorService.last_read_id(request.user.id, room.id)
         
-        # Создаем статусы прочтения
-        for message in messages:
-            MessageReadStatus.objects.get_or_create(
-                message=message,
-                user=request.user,
-                defaults={'read_at': timezone.now()}
-            )
+        ChatDigestService.clear(request.user, room)
+        if ReadCursorService.advance(request.user.id, room.id, last_read_id):
+            publish_read_event(request.user.id, room.id, last_read_id)
         
-        # Обновляем флаги is_read
-        updated_count = 0
-        for message in messages:
-            if message.read_statuses.count() >= room.participants.count() - 1:
-                message.is_read = True
-                message.save()
-                updated_count += 1
+        marked_count = 0
+        if last_read_id and last_read_id > previous_id:
+            marked_count = Message.objects.filter(
+                room=room,
+                id__gt=previous_id,
+                id__lte=last_read_id
+            ).exclude(sender=request.user).count()
         
         return Response({
-            'message': f'Отмечено {len(messages)} сообщений как прочитанные',
-            'updated_messages': updated_count
+            'message': f'Отмечено {marked_count} сообщений как прочитанные',
+            'updated_messages': marked_count,
+            'last_read_id': max(last_read_id or 0, previous_id)
         })
         
     except ChatRoom.DoesNotExist:
@@ -276,7 +314,8 @@ def get_chat_participants(request, room_id):
     """Получить список участников чата"""
     try:
         room = ChatRoom.objects.get(id=room_id, participants=request.user)
-        participants = room.participants.all()
+        participants = list(room.participants.all())
+        online_ids = PresenceService.get_online_user_ids([user.id for user in participants])
         
         participants_data = [
             {
@@ -285,7 +324,7 @@ def get_chat_participants(request, room_id):
                 'full_name': user.get_full_name(),
                 'email': user.email,
                 'avatar': user.avatar.url if user.avatar else None,
-                'is_online': False,  # Можно интегрировать с WebSocket для онлайн-статуса
+                'is_online': user.id in online_ids,
                 'last_seen': user.last_login
             }
             for user in participants
@@ -301,6 +340,42 @@ def get_chat_participants(request, room_id):
             'error': 'Чат не найден или у вас нет доступа'
         }, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_online_participants(request, room_id):
+    """Участники чата, которые сейчас в сети"""
+    # Состав чата из индекса участников, онлайн-статус из Redis - без запросов к БД
+    participant_ids = RoomMembership.member_ids(room_id)
+    if request.user.id not in participant_ids:
+        return Response({
+            'error': 'Чат не найден или у вас нет доступа'
+        }, status=status.HTTP_404_NOT_FOUND)
+    online_ids = PresenceService.get_online_user_ids(participant_ids)
+    
+    return Response({
+        'room_id': room_id,
+        'online_user_ids': sorted(online_ids),
+        'online_count': len(online_ids)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_typing_stats(request, room_id):
+    """Статистика индикаторов набора текста: сколько событий подавлено и трафика сэкономлено"""
+    if not request.user.is_admin:
+        return Response({
+            'error': 'Только администратор может просматривать статистику'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    stats = TypingStats.get(room_id)
+    member_count = len(RoomMembership.member_ids(room_id))
+    return Response({
+        'room_id': room_id,
+        **stats,
+        # Каждое подавленное событие не ушло ни одному из остальных участников
+        'estimated_bytes_saved': stats['suppressed_bytes'] * max(member_count - 1, 0)
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_participant_to_chat(request, room_id):
@@ -308,15 +383,18 @@ def add_participant_to_chat(request, room_id):
     user_id = request.data.get('user_id')
     
     try:
-        room = ChatRoom.objects.get(id=room_id, created_by=request.user)
+        room = RoomMembership.get(room_id)
+        if not room or room['created_by'] != request.user.id:
+            raise ChatRoom.DoesNotExist
         user = User.objects.get(id=user_id)
         
-        if user in room.participants.all():
+        if user.id in room['members']:
             return Response({
                 'message': 'Пользователь уже в чате'
             })
         
-        room.participants.add(user)
+        # Индекс участников сбрасывается сигналом m2m_changed
+        user.chat_rooms.add(room_id)
         
         return Response({
             'message': f'Пользователь {user.get_full_name() or user.username} добавлен в чат'
@@ -342,7 +420,9 @@ def remove_participant_from_chat(request, room_id):
     user_id = request.data.get('user_id')
     
     try:
-        room = ChatRoom.objects.get(id=room_id, created_by=request.user)
+        room = RoomMembership.get(room_id)
+        if not room or room['created_by'] != request.user.id:
+            raise ChatRoom.DoesNotExist
         
         if user_id == request.user.id:
             return Response({
@@ -350,7 +430,7 @@ def remove_participant_from_chat(request, room_id):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         user = User.objects.get(id=user_id)
-        room.participants.remove(user)
+        user.chat_rooms.remove(room_id)
         
         return Response({
             'message': f'Пользователь {user.get_full_name() or user.username} удален из чата'
@@ -0,0 +1,199 @@
+import json
+import logging
+import uuid
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from redis import RedisError
+from .models import ChatRoom, Message
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Очередь принятых, но еще не записанных в БД сообщений
+PENDING_KEY = 'chat:messages:pending'
+# Пачка, которую сейчас записывает флашер (остается в Redis до коммита транзакции)
+PROCESSING_KEY = 'chat:messages:processing'
+# Блокировка: пачки записывает только один флашер, поэтому порядок в чате сохраняется
+FLUSH_LOCK_KEY = 'chat:messages:flush-lock'
+# Сообщения, которые не удалось записать даже по одному (для разбора вручную)
+DEAD_LETTER_KEY = 'chat:messages:dead-letter'
+
+MESSAGE_TYPES = {choice for choice, label in Message.MESSAGE_TYPE_CHOICES}
+
+class MessageWriteBehind:
+    """Отложенная запись сообщений чата: сообщение рассылается сразу, а в БД попадает пачкой"""
+    
+    @staticmethod
+    def enabled():
+        return getattr(settings, 'CHAT_WRITE_BEHIND', False) and get_redis() is not None
+    
+    @staticmethod
+    def build(room_id, sender_id, content, message_type):
+        """Данные нового сообщения с идентификатором и временем, назначенными сервером"""
+        return MessageWriteBehind.clean({
+            'uuid': str(uuid.uuid4()),
+            'room_id': room_id,
+            'sender_id': sender_id,
+            'content': content or '',
+            'message_type': message_type,
+            'created_at': timezone.now().isoformat(),
+        })
+    
+    @staticmethod
+    def clean(payload):
+        """Проверка сообщения до постановки в очередь и перед записью (ValueError - некорректное)"""
+        try:
+            uuid.UUID(payload['uuid'])
+            if not isinstance(payload['room_id'], int) or not isinstance(payload['sender_id'], int):
+                raise ValueError('room_id и sender_id должны быть числами')
+            if not isinstance(payload['content'], str):
+                raise ValueError('content должен быть строкой')
+            if payload['message_type'] not in MESSAGE_TYPES:
+                raise ValueError(f"Неизвестный тип сообщения: {str(payload['message_type'])[:20]}")
+            if parse_datetime(payload['created_at']) is None:
+                raise ValueError('Некорректное время сообщения')
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f'Некорректное сообщение: {str(e)}')
+        return payload
+    
+    @staticmethod
+    def enqueue(payload):
+        """Постановка сообщения в очередь записи, возвращает успех"""
+        client = get_redis()
+        if client is None:
+            return False
+        try:
+            client.rpush(PENDING_KEY, json.dumps(payload))
+            return True
+        except RedisError as e:
+            logger.warning(f"Ошибка постановки сообщения в очередь записи: {str(e)}")
+            return False
+    
+    @staticmethod
+    def flush(batch_size=None):
+        """Запись очередной пачки сообщений в БД, возвращает количество обработанных"""
+        client = get_redis()
+        if client is None:
+            return 0
+        batch_size = batch_size or getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 200)
+        lock_timeout = getattr(settings, 'CHAT_WRITE_BEHIND_LOCK_SECONDS', 30)
+        
+        # Токен владельца: истекшую блокировку, взятую другим флашером, не снимаем
+        token = str(uuid.uuid4())
+        if not client.set(FLUSH_LOCK_KEY, token, nx=True, ex=lock_timeout):
+            return 0
+        try:
+            # Пачка, оставшаяся после падения флашера, записывается первой
+            items = client.lrange(PROCESSING_KEY, 0, -1)
+            if not items:
+                # Атомарный перенос пачки: сообщение всегда находится в одном из двух списков
+                pipe = client.pipeline(transaction=True)
+                for _ in range(batch_size):
+                    pipe.lmove(PENDING_KEY, PROCESSING_KEY, 'LEFT', 'RIGHT')
+                items = [item for item in pipe.execute() if item is not None]
+            if not items:
+                return 0
+            
+            payloads = []
+            for item in items:
+                try:
+                    payloads.append(MessageWriteBehind.clean(json.loads(item)))
+                except ValueError as e:
+                    MessageWriteBehind.dead_letter(client, item, e)
+            
+            try:
+                MessageWriteBehind.persist(payloads)
+            except DatabaseError as e:
+                # Одна некорректная строка не должна останавливать очередь: пишем по одному
+                logger.warning(f"Ошибка записи пачки сообщений, запись по одному: {str(e)}")
+                MessageWriteBehind.persist_each(client, payloads)
+            client.delete(PROCESSING_KEY)
+            return len(items)
+        finally:
+            MessageWriteBehind.release_lock(client, token)
+    
+    @staticmethod
+    def release_lock(client, token):
+        """Снятие блокировки только ее владельцем (сравнение и удаление в транзакции WATCH)"""
+        def _release(pipe):
+            if pipe.get(FLUSH_LOCK_KEY) == token:
+                pipe.multi()
+                pipe.delete(FLUSH_LOCK_KEY)
+        
+        try:
+            client.transaction(_release, FLUSH_LOCK_KEY)
+        except RedisError as e:
+            # Блокировка истечет сама
+            logger.warning(f"Ошибка снятия блокировки записи сообщений: {str(e)}")
+    
+    @staticmethod
+    def persist_each(client, payloads):
+        """Запись сообщений по одному; не записанные переносятся в список недоставленных"""
+        for payload in payloads:
+            try:
+                MessageWriteBehind.persist([payload])
+            except DatabaseError as e:
+                MessageWriteBehind.dead_letter(client, json.dumps(payload), e)
+    
+    @staticmethod
+    def dead_letter(client, item, error):
+        logger.error(f"Сообщение перенесено в недоставленные: {str(error)}: {str(item)[:200]}")
+        client.rpush(DEAD_LETTER_KEY, json.dumps({'item': item, 'error': str(error)}))
+    
+    @staticmethod
+    def persist(payloads):
+        """Запись сообщений в БД одним bulk_create (повторная запись той же пачки безопасна)"""
+        from .services import ChatDigestService
+        
+        if not payloads:
+            return []
+        
+        # Повторно записываемая пачка: уже сохраненные сообщения пропускаются
+        existing = set(
+            str(value) for value in Message.objects.filter(
+                uuid__in=[payload['uuid'] for payload in payloads]
+            ).values_list('uuid', flat=True)
+        )
+        # Сообщения в удаленные за время ожидания чаты не записываются
+        room_ids = set(ChatRoom.objects.filter(
+            id__in={payload['room_id'] for payload in payloads}
+        ).values_list('id', flat=True))
+        
+        messages = []
+        for payload in payloads:
+            if payload['uuid'] in existing:
+                continue
+            if payload['room_id'] not in room_ids:
+                logger.warning(f"Сообщение {payload['uuid']} пропущено: чат {payload['room_id']} не найден")
+                continue
+            messages.append(Message(
+                uuid=payload['uuid'],
+                room_id=payload['room_id'],
+                sender_id=payload['sender_id'],
+                content=payload['content'],
+                message_type=payload['message_type'],
+                created_at=parse_datetime(payload['created_at']),
+            ))
+        if not messages:
+            return []
+        
+        # Порядок вставки совпадает с порядком приема, поэтому id растут в порядке отправки
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, ignore_conflicts=True)
+        
+        # bulk_create не вызывает post_save - учитываем сообщения в дайджестах явно
+        saved = list(Message.objects.filter(
+            uuid__in=[message.uuid for message in messages]
+        ).select_related('room', 'sender').order_by('id'))
+        for message in saved:
+            ChatDigestService.record_message(message)
+        return saved
+    
+    @staticmethod
+    def pending_count():
+        client = get_redis()
+        if client is None:
+            return 0
+        return client.llen(PENDING_KEY) + client.llen(PROCESSING_KEY)
\ No newline at end of file
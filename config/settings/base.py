@@ -205,6 +205,88 @@ SERVER_EMAIL = config('SERVER_EMAIL', default='admin@localhost')
 # Celery settings
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # Страховочная обработка очереди уведомлений (ретраи, упавшие воркеры)
+    'drain-notification-outbox': {
+        'task': 'notifications.tasks.drain_notification_outbox',
+        'schedule': 30.0,
+    },
+    'send-queued-emails': {
+        'task': 'notifications.tasks.send_queued_emails',
+        'schedule': 30.0,
+    },
+    'send-chat-digests': {
+        'task': 'chat.tasks.send_chat_digests',
+        'schedule': 60.0,
+    },
+    'cleanup-chat-presence': {
+        'task': 'chat.tasks.cleanup_presence',
+        'schedule': 300.0,
+    },
+    # Основную запись выполняет команда flush_chat_messages, задача - страховка
+    'flush-chat-messages': {
+        'task': 'chat.tasks.flush_chat_messages',
+        'schedule': 10.0,
+    },
+    # Создание занятий регулярных серий на скользящий горизонт
+    'extend-lesson-series': {
+        'task': 'courses.tasks.extend_lesson_series',
+        'schedule': 3600.0,
+    },
+    # Счетчики дашбордов обновляются при изменениях, сверка исправляет расхождения
+    'reconcile-student-dashboards': {
+        'task': 'courses.tasks.reconcile_student_dashboards',
+        'schedule': 86400.0,
+    },
+}
+
+# Notification outbox settings
+NOTIFICATION_OUTBOX_BATCH_SIZE = config('NOTIFICATION_OUTBOX_BATCH_SIZE', default=200, cast=int)
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = config('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+NOTIFICATION_OUTBOX_RETRY_DELAY = config('NOTIFICATION_OUTBOX_RETRY_DELAY', default=60, cast=int)
+NOTIFICATION_OUTBOX_LEASE_SECONDS = config('NOTIFICATION_OUTBOX_LEASE_SECONDS', default=300, cast=int)
+NOTIFICATION_BULK_CHUNK_SIZE = config('NOTIFICATION_BULK_CHUNK_SIZE', default=1000, cast=int)
+
+# Chat settings
+CHAT_DIGEST_WINDOW_SECONDS = config('CHAT_DIGEST_WINDOW_SECONDS', default=900, cast=int)
+CHAT_PRESENCE_TTL = config('CHAT_PRESENCE_TTL', default=60, cast=int)
+CHAT_MEMBERSHIP_CACHE_TIMEOUT = config('CHAT_MEMBERSHIP_CACHE_TIMEOUT', default=3600, cast=int)
+# Отложенная запись сообщений из WebSocket: пачка пишется каждые N мс или по M сообщений
+CHAT_WRITE_BEHIND = config('CHAT_WRITE_BEHIND', default=False, cast=bool)
+CHAT_WRITE_BEHIND_BATCH_SIZE = config('CHAT_WRITE_BEHIND_BATCH_SIZE', default=200, cast=int)
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS = config('CHAT_WRITE_BEHIND_FLUSH_INTERVAL_MS', default=250, cast=int)
+CHAT_WRITE_BEHIND_LOCK_SECONDS = config('CHAT_WRITE_BEHIND_LOCK_SECONDS', default=30, cast=int)
+# Буфер последних событий чата для догрузки после переподключения
+CHAT_EVENT_BUFFER_SIZE = config('CHAT_EVENT_BUFFER_SIZE', default=500, cast=int)
+CHAT_EVENT_BUFFER_TTL = config('CHAT_EVENT_BUFFER_TTL', default=86400, cast=int)
+# Индикатор набора текста: не чаще одного события за интервал, у клиентов истекает через TTL
+CHAT_TYPING_INTERVAL = config('CHAT_TYPING_INTERVAL', default=3, cast=int)
+CHAT_TYPING_TTL = config('CHAT_TYPING_TTL', default=6, cast=int)
+
+# Лента расписания (iCalendar/JSON): прошедшие дни в ленте и время хранения готовой ленты
+SCHEDULE_FEED_PAST_DAYS = config('SCHEDULE_FEED_PAST_DAYS', default=7, cast=int)
+SCHEDULE_FEED_CACHE_TIMEOUT = config('SCHEDULE_FEED_CACHE_TIMEOUT', default=3600, cast=int)
+# Планирование занятий: предельная длительность (окно поиска пересечений) и рабочие часы для свободных окон
+LESSON_MAX_DURATION_HOURS = config('LESSON_MAX_DURATION_HOURS', default=12, cast=int)
+SCHEDULE_WORKDAY_START_HOUR = config('SCHEDULE_WORKDAY_START_HOUR', default=9, cast=int)
+SCHEDULE_WORKDAY_END_HOUR = config('SCHEDULE_WORKDAY_END_HOUR', default=21, cast=int)
+# Регулярные занятия создаются на столько дней вперед
+LESSON_SERIES_HORIZON_DAYS = config('LESSON_SERIES_HORIZON_DAYS', default=56, cast=int)
+
+# Cache settings
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': config('CACHE_URL', default='redis://localhost:6379/2'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+}
 
 # Channels settings
 CHANNEL_LAYERS = {
@@ -163,6 +163,9 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Celery settings for development (задачи выполняются синхронно, без брокера)
+CELERY_TASK_ALWAYS_EAGER = True
+
 # Stripe settings for development (тестовые ключи)
 STRIPE_SECRET_KEY = 'sk_test_1234567890abcdef1234567890abcdef'
 STRIPE_PUBLISHABLE_KEY = 'pk_test_1234567890abcdef1234567890abcdef'
\ No newline at end of file
@@ -0,0 +1,169 @@
+import json
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import ScheduleEntry
+
+# Версия расписания пользователя: меняется при любом изменении его занятий
+SCHEDULE_VERSION_KEY = 'courses:schedule:version:{user_id}'
+# Готовая лента для версии расписания
+SCHEDULE_FEED_KEY = 'courses:schedule:feed:{user_id}:{role}:{fmt}:{since}:{version}'
+
+FEED_CONTENT_TYPES = {
+    'ics': 'text/calendar; charset=utf-8',
+    'json': 'application/json',
+}
+
+class ScheduleFeed:
+    """Лента расписания пользователя (iCalendar и JSON) с версией для условных запросов"""
+    
+    @staticmethod
+    def version(user_id):
+        """Текущая версия расписания (без запросов к БД)"""
+        key = SCHEDULE_VERSION_KEY.format(user_id=user_id)
+        version = cache.get(key)
+        if version is None:
+            # Версия вытеснена из кеша - начинаем с новой, старые ETag становятся недействительными
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        return version
+    
+    @staticmethod
+    def bump(user_ids):
+        """Смена версии расписания пользователей после коммита транзакции"""
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        
+        def _bump():
+            for user_id in user_ids:
+                key = SCHEDULE_VERSION_KEY.format(user_id=user_id)
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.add(key, time.time_ns(), timeout=None)
+        
+        transaction.on_commit(_bump)
+    
+    @staticmethod
+    def window_start():
+        """Начало ленты: прошедшие занятия за последние дни тоже попадают в календарь"""
+        days = getattr(settings, 'SCHEDULE_FEED_PAST_DAYS', 7)
+        today = timezone.localdate()
+        return timezone.make_aware(datetime.combine(today - timedelta(days=days), dt_time.min))
+    
+    @staticmethod
+    def etag(user_id, role, fmt, since, version):
+        return f'"{user_id}-{role}-{fmt}-{since:%Y%m%d}-{version}"'
+    
+    @staticmethod
+    def cache_key(user_id, role, fmt, since, version):
+        return SCHEDULE_FEED_KEY.format(user_id=user_id, role=role, fmt=fmt, since=f'{since:%Y%m%d}', version=version)
+    
+    @staticmethod
+    def rows(user_id, role, since):
+        """Занятия ленты одним проходом по индексу расписания, без загрузки моделей"""
+        return ScheduleEntry.objects.filter(
+            user_id=user_id,
+            role=role,
+            start_time__gte=since
+        ).order_by('start_time', 'lesson_id').values(
+            'lesson_id',
+            'lesson__title',
+            'lesson__description',
+            'lesson__lesson_type',
+            'lesson__start_time',
+            'lesson__end_time',
+            'lesson__zoom_link',
+            'lesson__is_completed',
+            'lesson__updated_at',
+        ).iterator(chunk_size=500)
+    
+    @staticmethod
+    def stream(user_id, role, fmt, since, version):
+        """Выдача ленты по частям с сохранением в кеш после последней части"""
+        parts = []
+        for chunk in ScheduleFeed.render(fmt, ScheduleFeed.rows(user_id, role, since)):
+            parts.append(chunk)
+            yield chunk
+        cache.set(
+            ScheduleFeed.cache_key(user_id, role, fmt, since, version),
+            ''.join(parts),
+            timeout=getattr(settings, 'SCHEDULE_FEED_CACHE_TIMEOUT', 3600)
+        )
+    
+    @staticmethod
+    def render(fmt, rows):
+        """Лента по частям: строки выдаются по мере чтения курсора"""
+        if fmt == 'ics':
+            return ScheduleFeed.render_ics(rows)
+        return ScheduleFeed.render_json(rows)
+    
+    @staticmethod
+    def render_json(rows):
+        yield '{"lessons":['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps({
+                'id': row['lesson_id'],
+                'title': row['lesson__title'],
+                'lesson_type': row['lesson__lesson_type'],
+                'start_time': row['lesson__start_time'].isoformat(),
+                'end_time': row['lesson__end_time'].isoformat(),
+                'zoom_link': row['lesson__zoom_link'],
+                'is_completed': row['lesson__is_completed'],
+            }, ensure_ascii=False, separators=(',', ':'))
+            separator = ','
+        yield ']}'
+    
+    @staticmethod
+    def render_ics(rows):
+        yield ical_lines([
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//Online School//Schedule//RU',
+            'CALSCALE:GREGORIAN',
+            'X-WR-CALNAME:Расписание занятий',
+        ])
+        for row in rows:
+            lines = [
+                'BEGIN:VEVENT',
+                f"UID:lesson-{row['lesson_id']}@online-school",
+                f"DTSTAMP:{ical_datetime(row['lesson__updated_at'])}",
+                f"DTSTART:{ical_datetime(row['lesson__start_time'])}",
+                f"DTEND:{ical_datetime(row['lesson__end_time'])}",
+                f"SUMMARY:{ical_text(row['lesson__title'])}",
+            ]
+            if row['lesson__description']:
+                lines.append(f"DESCRIPTION:{ical_text(row['lesson__description'])}")
+            if row['lesson__zoom_link']:
+                lines.append(f"URL:{row['lesson__zoom_link']}")
+            lines.append('END:VEVENT')
+            yield ical_lines(lines)
+        yield ical_lines(['END:VCALENDAR'])
+
+def ical_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def ical_text(value):
+    """Экранирование текста по RFC 5545"""
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+def ical_lines(lines):
+    """Строки iCalendar с переносом длинных строк (не длиннее 75 байт)"""
+    folded = []
+    for line in lines:
+        chunk = ''
+        for char in line:
+            if len((chunk + char).encode()) > 75:
+                folded.append(chunk)
+                chunk = ' '
+            chunk += char
+        folded.append(chunk)
+    return ''.join(f'{line}\r\n' for line in folded)
\ No newline at end of file
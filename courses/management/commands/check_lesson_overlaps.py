@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.scheduling import RESOURCE_LABELS, find_overlaps
+
+class Command(BaseCommand):
+    help = 'Поиск пересекающихся занятий (запускается перед миграцией courses 0004 на PostgreSQL)'
+    
+    def handle(self, *args, **options):
+        overlaps = 0
+        for overlap in find_overlaps():
+            overlaps += 1
+            self.stdout.write(
+                f"{RESOURCE_LABELS[overlap['resource']]}: {overlap['resource']} #{overlap['resource_id']}, "
+                f"занятия #{overlap['lesson_id']} и #{overlap['other_lesson_id']}"
+            )
+        
+        if overlaps:
+            # Ограничения БД не создаются, пока пересечения не устранены (перенос или удаление занятий)
+            raise CommandError(f'Найдено пересечений занятий: {overlaps}')
+        self.stdout.write(self.style.SUCCESS('✅ Пересечений занятий нет'))
\ No newline at end of file
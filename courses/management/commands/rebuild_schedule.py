@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from courses.models import Lesson, ScheduleEntry
+from courses.services import ScheduleService
+
+class Command(BaseCommand):
+    help = 'Полный пересчет материализованного расписания пользователей'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Количество занятий в одной пачке'
+        )
+    
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        lesson_ids = list(Lesson.objects.order_by('id').values_list('id', flat=True))
+        
+        self.stdout.write(f'Пересчет расписания для {len(lesson_ids)} занятий...')
+        
+        # Строки сверяются с ожидаемыми пачками, поэтому расписание доступно во время пересчета
+        for start in range(0, len(lesson_ids), chunk_size):
+            ScheduleService.sync_lessons(lesson_ids[start:start + chunk_size])
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Расписание пересчитано: {ScheduleEntry.objects.count()} строк')
+        )
\ No newline at end of file
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+
+
+def fill_schedule_entries(apps, schema_editor):
+    # Начальное заполнение расписания (далее поддерживается сигналами, пересчет - rebuild_schedule)
+    Lesson = apps.get_model('courses', 'Lesson')
+    Group = apps.get_model('courses', 'Group')
+    ScheduleEntry = apps.get_model('courses', 'ScheduleEntry')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    
+    group_students = defaultdict(list)
+    for group_id, user_id in Group.students.through.objects.values_list('group_id', 'user_id').iterator():
+        group_students[group_id].append(user_id)
+    parents = dict(User.objects.filter(parent__isnull=False).values_list('id', 'parent_id'))
+    
+    batch = []
+    for lesson in Lesson.objects.values(
+        'id', 'lesson_type', 'group_id', 'student_id', 'teacher_id', 'start_time'
+    ).iterator(chunk_size=2000):
+        if lesson['lesson_type'] == 'group':
+            students = group_students.get(lesson['group_id'], [])
+        else:
+            students = [lesson['student_id']] if lesson['student_id'] else []
+        
+        entries = {(lesson['teacher_id'], 'teacher')}
+        for student_id in students:
+            entries.add((student_id, 'student'))
+            if student_id in parents:
+                entries.add((parents[student_id], 'parent'))
+        batch.extend(
+            ScheduleEntry(user_id=user_id, lesson_id=lesson['id'], role=role, start_time=lesson['start_time'])
+            for user_id, role in entries
+        )
+        if len(batch) >= 2000:
+            ScheduleEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        ScheduleEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0002_achievement_badge_homework_supportticket_and_more'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('teacher', 'Преподаватель'), ('student', 'Студент'), ('parent', 'Родитель')], max_length=20, verbose_name='Роль')),
+                ('start_time', models.DateTimeField(verbose_name='Время начала')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_entries', to='courses.lesson', verbose_name='Занятие')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Строка расписания',
+                'verbose_name_plural': 'Расписание пользователей',
+                'indexes': [models.Index(fields=['user', 'role', 'start_time'], name='courses_sch_user_id_e723a1_idx')],
+                'unique_together': {('user', 'lesson', 'role')},
+            },
+        ),
+        migrations.RunPython(fill_schedule_entries, migrations.RunPython.noop),
+    ]
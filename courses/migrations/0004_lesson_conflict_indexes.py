@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:56
+
+from django.db import migrations, models
+
+
+# Исключающие ограничения PostgreSQL: пересечение интервалов занятий одного ресурса
+# отклоняется самой БД (GiST-индекс по tstzrange также ускоряет поиск пересечений)
+EXCLUSION_CONSTRAINTS = {
+    'courses_lesson_teacher_no_overlap': ('teacher_id', None),
+    'courses_lesson_group_no_overlap': ('group_id', "{t}lesson_type = 'group' AND {t}group_id IS NOT NULL"),
+    'courses_lesson_student_no_overlap': ('student_id', "{t}lesson_type = 'individual' AND {t}student_id IS NOT NULL"),
+}
+
+
+def find_existing_overlaps(schema_editor, limit=50):
+    """Пары уже пересекающихся занятий, из-за которых ограничение не создать"""
+    overlaps = []
+    with schema_editor.connection.cursor() as cursor:
+        for name, (column, condition) in EXCLUSION_CONSTRAINTS.items():
+            where = f" AND ({condition.format(t='a.')}) AND ({condition.format(t='b.')})" if condition else ''
+            cursor.execute(
+                f"SELECT a.id, b.id FROM courses_lesson a JOIN courses_lesson b "
+                f"ON a.{column} = b.{column} AND a.id < b.id "
+                f"AND a.start_time < b.end_time AND b.start_time < a.end_time{where} "
+                f"ORDER BY a.id, b.id LIMIT %s",
+                [limit]
+            )
+            overlaps.extend((name, first_id, second_id) for first_id, second_id in cursor.fetchall())
+    return overlaps
+
+
+def add_exclusion_constraints(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Раньше пересечения ничем не запрещались: вместо ошибки ALTER TABLE - список занятий для исправления
+    overlaps = find_existing_overlaps(schema_editor)
+    if overlaps:
+        raise RuntimeError(
+            'Существующие занятия пересекаются, ограничения не могут быть созданы. '
+            'Перенесите или удалите занятия (полный список: manage.py check_lesson_overlaps):\n'
+            + '\n'.join(f'{name}: занятия #{first_id} и #{second_id}' for name, first_id, second_id in overlaps)
+        )
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, (column, condition) in EXCLUSION_CONSTRAINTS.items():
+        schema_editor.execute(
+            f"ALTER TABLE courses_lesson ADD CONSTRAINT {name} EXCLUDE USING gist "
+            f"({column} WITH =, tstzrange(start_time, end_time, '[)') WITH &&)"
+            + (f" WHERE ({condition.format(t='')})" if condition else '')
+        )
+
+
+def remove_exclusion_constraints(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in EXCLUSION_CONSTRAINTS:
+        schema_editor.execute(f'ALTER TABLE courses_lesson DROP CONSTRAINT IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('courses', '0003_scheduleentry'),
+    ]
+    
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['teacher', 'start_time'], name='courses_les_teacher_bca3b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['group', 'start_time'], name='courses_les_group_i_b4a3d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student', 'start_time'], name='courses_les_student_24d931_idx'),
+        ),
+        migrations.RunPython(add_exclusion_constraints, remove_exclusion_constraints),
+    ]
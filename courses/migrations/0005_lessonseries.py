@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0004_lesson_conflict_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Тема занятий')),
+                ('description', models.TextField(blank=True, verbose_name='Описание занятий')),
+                ('weekdays', models.JSONField(default=list, help_text='Номера дней недели: 0 - понедельник, 6 - воскресенье', verbose_name='Дни недели')),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, verbose_name='Периодичность (недель)')),
+                ('start_time', models.TimeField(verbose_name='Время начала')),
+                ('duration_minutes', models.PositiveIntegerField(verbose_name='Длительность (минуты)')),
+                ('starts_on', models.DateField(verbose_name='Дата начала')),
+                ('ends_on', models.DateField(blank=True, null=True, verbose_name='Дата окончания')),
+                ('materialized_until', models.DateField(blank=True, null=True, verbose_name='Занятия созданы по')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Серия занятий',
+                'verbose_name_plural': 'Серии занятий',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='series_date',
+            field=models.DateField(blank=True, help_text='Исходная дата занятия по расписанию серии (не меняется при переносе)', null=True, verbose_name='Дата в серии'),
+        ),
+        migrations.AddField(
+            model_name='lessonseries',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_series', to='courses.group', verbose_name='Группа'),
+        ),
+        migrations.AddField(
+            model_name='lessonseries',
+            name='teacher',
+            field=models.ForeignKey(limit_choices_to={'role': 'teacher'}, on_delete=django.db.models.deletion.CASCADE, related_name='lesson_series', to=settings.AUTH_USER_MODEL, verbose_name='Преподаватель'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lessons', to='courses.lessonseries', verbose_name='Серия занятий'),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('series', 'series_date'), name='courses_lesson_series_date_uniq'),
+        ),
+    ]
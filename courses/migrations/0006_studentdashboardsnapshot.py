@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0005_lessonseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentDashboardSnapshot',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_snapshot', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Студент')),
+                ('total_courses', models.PositiveIntegerField(default=0, verbose_name='Курсов')),
+                ('total_lessons', models.PositiveIntegerField(default=0, verbose_name='Занятий')),
+                ('completed_lessons', models.PositiveIntegerField(default=0, verbose_name='Посещено занятий')),
+                ('total_homework', models.PositiveIntegerField(default=0, verbose_name='Сдано домашних заданий')),
+                ('submitted_homework', models.PositiveIntegerField(default=0, verbose_name='Оценено домашних заданий')),
+                ('total_badges', models.PositiveIntegerField(default=0, verbose_name='Бейджей')),
+                ('total_achievements', models.PositiveIntegerField(default=0, verbose_name='Достижений')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Дашборд студента',
+                'verbose_name_plural': 'Дашборды студентов',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_studentdashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonseries',
+            name='parent',
+            field=models.ForeignKey(blank=True, help_text='Серия, от которой отделена при изменении «это и следующие»', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='continuations', to='courses.lessonseries', verbose_name='Исходная серия'),
+        ),
+    ]
@@ -118,6 +118,93 @@ class Group(models.Model):
     def available_spots(self):
         return self.max_students - self.student_count
 
+class LessonSeries(models.Model):
+    """Регулярное расписание группы: занятия по дням недели, создаются на скользящий горизонт"""
+    WEEKDAY_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+    
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='lesson_series',
+        verbose_name=_('Группа')
+    )
+    teacher = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='lesson_series',
+        limit_choices_to={'role': 'teacher'},
+        verbose_name=_('Преподаватель')
+    )
+    title = models.CharField(
+        max_length=255,
+        verbose_name=_('Тема занятий')
+    )
+    description = models.TextField(
+        blank=True,
+        verbose_name=_('Описание занятий')
+    )
+    weekdays = models.JSONField(
+        default=list,
+        verbose_name=_('Дни недели'),
+        help_text=_('Номера дней недели: 0 - понедельник, 6 - воскресенье')
+    )
+    interval_weeks = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name=_('Периодичность (недель)')
+    )
+    start_time = models.TimeField(
+        verbose_name=_('Время начала')
+    )
+    duration_minutes = models.PositiveIntegerField(
+        verbose_name=_('Длительность (минуты)')
+    )
+    starts_on = models.DateField(
+        verbose_name=_('Дата начала')
+    )
+    ends_on = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата окончания')
+    )
+    materialized_until = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name=_('Занятия созданы по')
+    )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='continuations',
+        verbose_name=_('Исходная серия'),
+        help_text=_('Серия, от которой отделена при изменении «это и следующие»')
+    )
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name=_('Активна')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Дата обновления')
+    )
+    
+    class Meta:
+        verbose_name = _('Серия занятий')
+        verbose_name_plural = _('Серии занятий')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.title} - {self.group} ({self.weekdays_display})"
+    
+    @property
+    def weekdays_display(self):
+        return ', '.join(self.WEEKDAY_NAMES[day] for day in sorted(self.weekdays))
+
 class Lesson(models.Model):
     LESSON_TYPE_CHOICES = [
         ('group', _('Групповое занятие')),
@@ -186,6 +273,20 @@ class Lesson(models.Model):
         default=False,
         verbose_name=_('Завершено')
     )
+    series = models.ForeignKey(
+        LessonSeries,
+        on_delete=models.SET_NULL,
+        related_name='lessons',
+        null=True,
+        blank=True,
+        verbose_name=_('Серия занятий')
+    )
+    series_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата в серии'),
+        help_text=_('Исходная дата занятия по расписанию серии (не меняется при переносе)')
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name=_('Дата создания')
@@ -199,6 +300,16 @@ class Lesson(models.Model):
         verbose_name = _('Занятие')
         verbose_name_plural = _('Занятия')
         ordering = ['start_time']
+        indexes = [
+            # Поиск пересечений и свободных окон - диапазон по времени начала для каждого ресурса
+            models.Index(fields=['teacher', 'start_time']),
+            models.Index(fields=['group', 'start_time']),
+            models.Index(fields=['student', 'start_time']),
+        ]
+        constraints = [
+            # Повторное создание занятий серии не дублирует уже созданные
+            models.UniqueConstraint(fields=['series', 'series_date'], name='courses_lesson_series_date_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.start_time.strftime('%d.%m.%Y %H:%M')}"
@@ -277,6 +388,96 @@ class Attendance(models.Model):
     def __str__(self):
         return f"{self.student} - {self.lesson} - {self.get_status_display()}"
 
+class ScheduleEntry(models.Model):
+    """Строка расписания пользователя (денормализация занятий групп, индивидуальных занятий и детей)"""
+    ROLE_CHOICES = [
+        ('teacher', _('Преподаватель')),
+        ('student', _('Студент')),
+        ('parent', _('Родитель')),
+    ]
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='schedule_entries',
+        verbose_name=_('Пользователь')
+    )
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        related_name='schedule_entries',
+        verbose_name=_('Занятие')
+    )
+    role = models.CharField(
+        max_length=20,
+        choices=ROLE_CHOICES,
+        verbose_name=_('Роль')
+    )
+    start_time = models.DateTimeField(
+        verbose_name=_('Время начала')
+    )
+    
+    class Meta:
+        verbose_name = _('Строка расписания')
+        verbose_name_plural = _('Расписание пользователей')
+        unique_together = ['user', 'lesson', 'role']
+        indexes = [
+            # Расписание пользователя - один проход по диапазону индекса
+            models.Index(fields=['user', 'role', 'start_time']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} - {self.lesson} ({self.get_role_display()})"
+
+class StudentDashboardSnapshot(models.Model):
+    """Счетчики дашборда студента: обновляются при изменении данных, дашборд читается по ключу"""
+    student = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='dashboard_snapshot',
+        verbose_name=_('Студент')
+    )
+    total_courses = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Курсов')
+    )
+    total_lessons = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Занятий')
+    )
+    completed_lessons = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Посещено занятий')
+    )
+    total_homework = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Сдано домашних заданий')
+    )
+    submitted_homework = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Оценено домашних заданий')
+    )
+    total_badges = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Бейджей')
+    )
+    total_achievements = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Достижений')
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Дата обновления')
+    )
+    
+    class Meta:
+        verbose_name = _('Дашборд студента')
+        verbose_name_plural = _('Дашборды студентов')
+    
+    def __str__(self):
+        return f"Дашборд: {self.student}"
+
 # === НОВЫЕ МОДЕЛИ ДЛЯ ПРЕПОДАВАТЕЛЯ ===
 
 # 1. Модель бейджей
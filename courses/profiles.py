@@ -0,0 +1,123 @@
+from django.db.models import Prefetch
+from accounts.models import User
+from .models import StudentBadge, StudentProgress, TestResult
+
+class StudentProfileLoader:
+    """Профиль студента с разделами: один запрос на студентов и по одному на каждый выбранный раздел"""
+    
+    SECTIONS = ('progress', 'badges', 'test_results')
+    
+    def __init__(self, sections=None):
+        sections = self.SECTIONS if sections is None else tuple(sections)
+        unknown = set(sections) - set(self.SECTIONS)
+        if unknown:
+            raise ValueError(f"Неизвестные разделы профиля: {', '.join(sorted(unknown))}")
+        self.sections = [section for section in self.SECTIONS if section in sections]
+    
+    @classmethod
+    def from_param(cls, value):
+        """Загрузчик по параметру запроса вида 'progress,badges' (пустой - все разделы)"""
+        if not value:
+            return cls()
+        return cls(section.strip() for section in value.split(',') if section.strip())
+    
+    def prefetches(self):
+        """Раздел - отдельный запрос со связанными курсами, бейджами и преподавателями через JOIN"""
+        prefetches = {
+            'progress': Prefetch(
+                'progress',
+                queryset=StudentProgress.objects.select_related('course').only(
+                    'student_id', 'completed_topics', 'current_level', 'overall_progress', 'last_activity',
+                    'course__id', 'course__title'
+                ).order_by('id'),
+                to_attr='profile_progress'
+            ),
+            'badges': Prefetch(
+                'badges_received',
+                queryset=StudentBadge.objects.select_related('badge', 'awarded_by').order_by('id'),
+                to_attr='profile_badges'
+            ),
+            'test_results': Prefetch(
+                'test_results',
+                queryset=TestResult.objects.select_related('course').only(
+                    'student_id', 'test_name', 'score', 'max_score', 'date_taken',
+                    'course__id', 'course__title'
+                ).order_by('id'),
+                to_attr='profile_test_results'
+            ),
+        }
+        return [prefetches[section] for section in self.sections]
+    
+    def queryset(self):
+        return User.objects.filter(role='student').prefetch_related(*self.prefetches())
+    
+    def load(self, student_id):
+        """Студент с выбранными разделами (User.DoesNotExist, если студента нет)"""
+        return self.queryset().get(id=student_id)
+    
+    def load_many(self, student_ids):
+        """Профили нескольких студентов за то же число запросов, что и одного"""
+        return list(self.queryset().filter(id__in=student_ids))
+    
+    def serialize(self, student):
+        data = {
+            'student': {
+                'id': student.id,
+                'username': student.username,
+                'full_name': student.get_full_name(),
+                'email': student.email,
+                'birth_date': student.birth_date,
+                'phone': student.phone,
+                'avatar': student.avatar.url if student.avatar else None,
+            }
+        }
+        
+        if 'progress' in self.sections:
+            data['progress'] = [
+                {
+                    'course': {
+                        'id': progress.course.id,
+                        'title': progress.course.title,
+                    },
+                    'completed_topics': progress.completed_topics,
+                    'current_level': progress.current_level,
+                    'overall_progress': progress.overall_progress,
+                    'last_activity': progress.last_activity,
+                }
+                for progress in student.profile_progress
+            ]
+        
+        if 'badges' in self.sections:
+            data['badges'] = [
+                {
+                    'id': badge.id,
+                    'badge': {
+                        'id': badge.badge.id,
+                        'name': badge.badge.name,
+                        'description': badge.badge.description,
+                        'badge_type': badge.badge.badge_type,
+                        'icon': badge.badge.icon.url if badge.badge.icon else None,
+                    },
+                    'awarded_at': badge.awarded_at,
+                    'awarded_by': badge.awarded_by.get_full_name(),
+                    'comment': badge.comment,
+                }
+                for badge in student.profile_badges
+            ]
+        
+        if 'test_results' in self.sections:
+            data['test_results'] = [
+                {
+                    'test_name': test_result.test_name,
+                    'score': test_result.score,
+                    'max_score': test_result.max_score,
+                    'date_taken': test_result.date_taken,
+                    'course': {
+                        'id': test_result.course.id,
+                        'title': test_result.course.title,
+                    },
+                }
+                for test_result in student.profile_test_results
+            ]
+        
+        return data
\ No newline at end of file
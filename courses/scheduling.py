@@ -0,0 +1,221 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import Group, Lesson
+
+# Описание ресурса в сообщении о пересечении
+RESOURCE_LABELS = {
+    'teacher': 'Преподаватель уже занят в это время',
+    'group': 'У группы уже есть занятие в это время',
+    'student': 'У студента уже есть занятие в это время',
+}
+
+def max_lesson_duration():
+    """Предельная длительность занятия: ограничивает окно поиска пересечений по индексу"""
+    return timedelta(hours=getattr(settings, 'LESSON_MAX_DURATION_HOURS', 12))
+
+# Ресурсы, пересечения которых запрещают ограничения БД: (колонка, условие выборки)
+OVERLAP_CONSTRAINT_RESOURCES = {
+    'teacher': ('teacher_id', {}),
+    'group': ('group_id', {'lesson_type': 'group', 'group__isnull': False}),
+    'student': ('student_id', {'lesson_type': 'individual', 'student__isnull': False}),
+}
+
+def find_overlaps():
+    """Уже существующие пересечения занятий (один проход по индексу на ресурс, без загрузки всех занятий)"""
+    for resource, (column, filters) in OVERLAP_CONSTRAINT_RESOURCES.items():
+        current_id = last_lesson_id = last_end = None
+        for lesson_id, resource_id, start_time, end_time in Lesson.objects.filter(**filters).order_by(
+            column, 'start_time', 'id'
+        ).values_list('id', column, 'start_time', 'end_time').iterator(chunk_size=2000):
+            if resource_id != current_id:
+                current_id, last_lesson_id, last_end = resource_id, lesson_id, end_time
+                continue
+            if start_time < last_end:
+                yield {
+                    'resource': resource,
+                    'resource_id': resource_id,
+                    'lesson_id': last_lesson_id,
+                    'other_lesson_id': lesson_id,
+                }
+            if end_time > last_end:
+                last_lesson_id, last_end = lesson_id, end_time
+
+class IntervalIndex:
+    """Занятые интервалы одного ресурса: непересекающиеся и отсортированные по началу"""
+    
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        # Ссылка на занятие для сообщения о пересечении: {'lesson_id': ...} или {'position': ...}
+        self.refs = []
+    
+    def find(self, start, end):
+        """Ссылка на занятие, пересекающееся с [start, end), или None (бинарный поиск)"""
+        # Интервалы не пересекаются, поэтому концы тоже отсортированы и достаточно
+        # проверить последний интервал, начинающийся раньше конца искомого
+        i = bisect_left(self.starts, end)
+        if i and self.ends[i - 1] > start:
+            return self.refs[i - 1]
+        return None
+    
+    def add(self, start, end, ref):
+        """Добавление интервала; пересекающиеся (старые данные) сливаются в один"""
+        i = bisect_left(self.starts, end)
+        j = i
+        while j and self.ends[j - 1] > start:
+            j -= 1
+            start = min(start, self.starts[j])
+            end = max(end, self.ends[j])
+        if j < i:
+            ref = self.refs[j]
+        self.starts[j:i] = [start]
+        self.ends[j:i] = [end]
+        self.refs[j:i] = [ref]
+    
+    def busy(self, start, end):
+        """Занятые интервалы, пересекающиеся с [start, end)"""
+        i = bisect_right(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            yield self.starts[i], self.ends[i]
+            i += 1
+
+class ConflictEngine:
+    """Проверка пересечений занятий преподавателя, группы и студентов"""
+    
+    def __init__(self):
+        self.indexes = defaultdict(IntervalIndex)
+        self.group_students = {}
+    
+    def resource_keys(self, lesson):
+        """Ресурсы, которые занимает занятие"""
+        keys = [('teacher', lesson.teacher_id)]
+        if lesson.lesson_type == 'group' and lesson.group_id:
+            keys.append(('group', lesson.group_id))
+            keys.extend(('student', student_id) for student_id in self.group_students.get(lesson.group_id, ()))
+        elif lesson.lesson_type == 'individual' and lesson.student_id:
+            keys.append(('student', lesson.student_id))
+        return keys
+    
+    def load_group_students(self, group_ids):
+        group_ids = set(group_ids) - set(self.group_students)
+        if not group_ids:
+            return
+        for group_id in group_ids:
+            self.group_students[group_id] = []
+        for group_id, user_id in Group.students.through.objects.filter(
+            group_id__in=group_ids
+        ).values_list('group_id', 'user_id'):
+            self.group_students[group_id].append(user_id)
+    
+    def load(self, lessons):
+        """Загрузка существующих занятий, с которыми могут пересечься проверяемые (три запроса)"""
+        lessons = [lesson for lesson in lessons if lesson.start_time and lesson.end_time]
+        if not lessons:
+            return
+        self.load_group_students(lesson.group_id for lesson in lessons if lesson.lesson_type == 'group' and lesson.group_id)
+        
+        resource_ids = defaultdict(set)
+        for lesson in lessons:
+            for resource, resource_id in self.resource_keys(lesson):
+                resource_ids[resource].add(resource_id)
+        
+        # Окно ограничено с обеих сторон, поэтому выборка - проход по диапазонам индексов
+        window_start = min(lesson.start_time for lesson in lessons)
+        window_end = max(lesson.end_time for lesson in lessons)
+        existing = Lesson.objects.filter(
+            Q(teacher_id__in=resource_ids['teacher']) |
+            Q(group_id__in=resource_ids['group'], lesson_type='group') |
+            Q(student_id__in=resource_ids['student'], lesson_type='individual') |
+            Q(group__students__in=resource_ids['student'], lesson_type='group'),
+            start_time__gte=window_start - max_lesson_duration(),
+            start_time__lt=window_end,
+            end_time__gt=window_start
+        ).exclude(
+            id__in=[lesson.pk for lesson in lessons if lesson.pk]
+        ).values_list('id', 'teacher_id', 'group_id', 'student_id', 'lesson_type', 'start_time', 'end_time')
+        
+        rows = {row[0]: row for row in existing}
+        self.load_group_students(row[2] for row in rows.values() if row[4] == 'group' and row[2])
+        for lesson_id, teacher_id, group_id, student_id, lesson_type, start_time, end_time in rows.values():
+            self.add(Lesson(
+                id=lesson_id,
+                teacher_id=teacher_id,
+                group_id=group_id,
+                student_id=student_id,
+                lesson_type=lesson_type,
+                start_time=start_time,
+                end_time=end_time
+            ))
+    
+    def check(self, lesson):
+        """Пересечения занятия: список {'resource', 'resource_id', 'error'} со ссылкой на занятие"""
+        conflicts = []
+        for resource, resource_id in self.resource_keys(lesson):
+            if (resource, resource_id) not in self.indexes:
+                continue
+            ref = self.indexes[(resource, resource_id)].find(lesson.start_time, lesson.end_time)
+            if ref is not None:
+                conflicts.append(dict(
+                    ref,
+                    resource=resource,
+                    resource_id=resource_id,
+                    error=RESOURCE_LABELS[resource]
+                ))
+        return conflicts
+    
+    def add(self, lesson, ref=None):
+        ref = ref or {'lesson_id': lesson.pk}
+        for key in self.resource_keys(lesson):
+            self.indexes[key].add(lesson.start_time, lesson.end_time, ref)
+    
+    @classmethod
+    def validate(cls, lessons):
+        """Проверка набора занятий с БД и между собой: {индекс занятия: пересечения}"""
+        lessons = list(lessons)
+        engine = cls()
+        engine.load(lessons)
+        errors = {}
+        for position, lesson in enumerate(lessons):
+            conflicts = engine.check(lesson)
+            if conflicts:
+                errors[position] = conflicts
+            else:
+                # Следующие занятия набора проверяются и с уже принятыми
+                engine.add(lesson, {'lesson_id': lesson.pk} if lesson.pk else {'position': position})
+        return errors
+    
+    @staticmethod
+    def free_slots(teacher_id, date_from, date_to, duration):
+        """Свободные окна преподавателя в рабочие часы с date_from по date_to включительно"""
+        day_start = dt_time(getattr(settings, 'SCHEDULE_WORKDAY_START_HOUR', 9))
+        day_end = dt_time(getattr(settings, 'SCHEDULE_WORKDAY_END_HOUR', 21))
+        range_start = timezone.make_aware(datetime.combine(date_from, day_start))
+        range_end = timezone.make_aware(datetime.combine(date_to, day_end))
+        
+        index = IntervalIndex()
+        for lesson_id, start_time, end_time in Lesson.objects.filter(
+            teacher_id=teacher_id,
+            start_time__gte=range_start - max_lesson_duration(),
+            start_time__lt=range_end,
+            end_time__gt=range_start
+        ).values_list('id', 'start_time', 'end_time'):
+            index.add(start_time, end_time, {'lesson_id': lesson_id})
+        
+        now = timezone.now()
+        slots = []
+        day = date_from
+        while day <= date_to:
+            cursor = max(timezone.make_aware(datetime.combine(day, day_start)), now)
+            window_end = timezone.make_aware(datetime.combine(day, day_end))
+            for busy_start, busy_end in index.busy(cursor, window_end):
+                if busy_start - cursor >= duration:
+                    slots.append({'start': timezone.localtime(cursor), 'end': timezone.localtime(busy_start)})
+                cursor = max(cursor, busy_end)
+            if window_end - cursor >= duration:
+                slots.append({'start': timezone.localtime(cursor), 'end': window_end})
+            day += timedelta(days=1)
+        return slots
\ No newline at end of file
@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from .models import Course, Group, Lesson, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage
+from .models import Course, Group, Lesson, LessonSeries, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage
 from accounts.models import User
-from payments.models import Payment
+from payments.entitlements import PaymentEntitlements
+from .scheduling import ConflictEngine, max_lesson_duration
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,7 +32,79 @@ class GroupSerializer(serializers.ModelSerializer):
             for student in obj.students.all()
         ]
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonPaymentStatusMixin:
+    """Статус оплаты студентов занятия без запросов на каждого студента"""
+    
+    @staticmethod
+    def load_lesson_payments(lessons):
+        """Составы групп и оплаченные курсы для набора занятий (три запроса на набор)"""
+        lessons = list(lessons)
+        groups = {
+            group.id: group
+            for group in Group.objects.filter(
+                id__in={lesson.group_id for lesson in lessons if lesson.group_id}
+            ).prefetch_related('students')
+        }
+        student_ids = {lesson.student_id for lesson in lessons}
+        course_ids = {group.course_id for group in groups.values()}
+        for group in groups.values():
+            student_ids.update(student.id for student in group.students.all())
+        if any(lesson.student_id and not lesson.group_id for lesson in lessons):
+            course_ids.add(None)
+        return {
+            'groups': groups,
+            'entitlements': PaymentEntitlements.load(student_ids, course_ids),
+        }
+    
+    def get_lesson_payments(self, obj):
+        """Данные об оплатах, загруженные один раз на всю выдачу (кешируются в контексте)"""
+        payments = self.context.get('lesson_payments')
+        if payments is None:
+            # В списке загружаем сразу всю страницу, для одного занятия - только его
+            if isinstance(self.parent, serializers.ListSerializer) and self.parent.instance is not None:
+                lessons = self.parent.instance
+            else:
+                lessons = [obj]
+            payments = self.context['lesson_payments'] = self.load_lesson_payments(lessons)
+        elif obj.group_id and obj.group_id not in payments['groups']:
+            loaded = self.load_lesson_payments([obj])
+            payments['groups'].update(loaded['groups'])
+            payments['entitlements'].update(loaded['entitlements'])
+        return payments
+    
+    def get_lesson_course_id(self, obj):
+        group = self.get_lesson_payments(obj)['groups'].get(obj.group_id)
+        return group.course_id if group else None
+    
+    def get_group_payment_status(self, obj):
+        """Оплата курса группы каждым студентом группового занятия"""
+        if obj.lesson_type != 'group' or not obj.group_id:
+            return []
+        payments = self.get_lesson_payments(obj)
+        group = payments['groups'].get(obj.group_id)
+        if group is None:
+            return []
+        return [
+            {
+                'student_id': student.id,
+                'student_name': student.get_full_name(),
+                'has_payment': payments['entitlements'].has_payment(student.id, group.course_id)
+            }
+            for student in group.students.all()
+        ]
+    
+    def get_individual_payment_status(self, obj):
+        """Оплата студента индивидуального занятия"""
+        if obj.lesson_type != 'individual' or not obj.student_id:
+            return None
+        payments = self.get_lesson_payments(obj)
+        return {
+            'student_id': obj.student_id,
+            'student_name': obj.student.get_full_name(),
+            'has_payment': payments['entitlements'].has_payment(obj.student_id, self.get_lesson_course_id(obj))
+        }
+
+class LessonSerializer(LessonPaymentStatusMixin, serializers.ModelSerializer):
     group_title = serializers.CharField(source='group.title', read_only=True, allow_null=True)
     student_name = serializers.CharField(source='student.get_full_name', read_only=True, allow_null=True)
     teacher_name = serializers.CharField(source='teacher.get_full_name', read_only=True)
@@ -42,41 +115,15 @@ class LessonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at', 'duration_minutes']
+        read_only_fields = ['created_at', 'updated_at', 'duration_minutes', 'series', 'series_date']
     
     def get_payment_status(self, obj):
         """Проверить статус оплаты для группы"""
-        if obj.lesson_type == 'group' and obj.group:
-            payment_status = []
-            for student in obj.group.students.all():
-                # Проверить оплату студента за курс группы
-                has_payment = Payment.objects.filter(
-                    student=student,
-                    course=obj.group.course,
-                    status='paid'
-                ).exists()
-                payment_status.append({
-                    'student_id': student.id,
-                    'student_name': student.get_full_name(),
-                    'has_payment': has_payment
-                })
-            return payment_status
-        return []
+        return self.get_group_payment_status(obj)
     
     def get_student_payment_status(self, obj):
         """Проверить статус оплаты для индивидуального занятия"""
-        if obj.lesson_type == 'individual' and obj.student:
-            has_payment = Payment.objects.filter(
-                student=obj.student,
-                course=obj.group.course if obj.group else None,
-                status='paid'
-            ).exists()
-            return {
-                'student_id': obj.student.id,
-                'student_name': obj.student.get_full_name(),
-                'has_payment': has_payment
-            }
-        return {}
+        return self.get_individual_payment_status(obj) or {}
     
     def validate(self, attrs):
         lesson_type = attrs.get('lesson_type', 'group')
@@ -99,6 +146,69 @@ class LessonSerializer(serializers.ModelSerializer):
                 'end_time': 'Время окончания должно быть больше времени начала'
             })
         
+        if start_time and end_time and end_time - start_time > max_lesson_duration():
+            raise serializers.ValidationError({
+                'end_time': f'Занятие не может быть длиннее {int(max_lesson_duration().total_seconds() // 3600)} ч'
+            })
+        
+        # Массовый импорт проверяет пересечения всего набора сам
+        if not self.context.get('skip_conflict_check'):
+            conflicts = ConflictEngine.validate([self.build_lesson(attrs)]).get(0)
+            if conflicts:
+                raise serializers.ValidationError({
+                    'start_time': [f"{conflict['error']} (занятие #{conflict['lesson_id']})" for conflict in conflicts]
+                })
+        
+        return attrs
+    
+    def build_lesson(self, attrs):
+        """Занятие с проверяемыми значениями (при частичном изменении - поверх текущих)"""
+        lesson = Lesson()
+        if self.instance is not None:
+            for field in ('id', 'lesson_type', 'group_id', 'student_id', 'teacher_id', 'start_time', 'end_time'):
+                setattr(lesson, field, getattr(self.instance, field))
+        for field, value in attrs.items():
+            if field in ('lesson_type', 'group', 'student', 'teacher', 'start_time', 'end_time'):
+                setattr(lesson, field, value)
+        return lesson
+
+class LessonSeriesSerializer(serializers.ModelSerializer):
+    group_title = serializers.CharField(source='group.title', read_only=True)
+    teacher_name = serializers.CharField(source='teacher.get_full_name', read_only=True)
+    weekdays_display = serializers.CharField(read_only=True)
+    
+    class Meta:
+        model = LessonSeries
+        fields = '__all__'
+        read_only_fields = ['materialized_until', 'parent', 'created_at', 'updated_at']
+    
+    def validate_weekdays(self, value):
+        if not isinstance(value, list) or not value or not all(
+            isinstance(day, int) and 0 <= day <= 6 for day in value
+        ):
+            raise serializers.ValidationError('Укажите дни недели числами от 0 (понедельник) до 6 (воскресенье)')
+        return sorted(set(value))
+    
+    def validate_interval_weeks(self, value):
+        if value < 1:
+            raise serializers.ValidationError('Периодичность - не меньше одной недели')
+        return value
+    
+    def validate(self, attrs):
+        duration_minutes = attrs.get('duration_minutes', getattr(self.instance, 'duration_minutes', None))
+        if duration_minutes is not None and (
+            duration_minutes <= 0 or duration_minutes * 60 > max_lesson_duration().total_seconds()
+        ):
+            raise serializers.ValidationError({
+                'duration_minutes': f'Длительность - от 1 минуты до {int(max_lesson_duration().total_seconds() // 3600)} ч'
+            })
+        
+        starts_on = attrs.get('starts_on', getattr(self.instance, 'starts_on', None))
+        ends_on = attrs.get('ends_on', getattr(self.instance, 'ends_on', None))
+        if starts_on and ends_on and ends_on < starts_on:
+            raise serializers.ValidationError({
+                'ends_on': 'Дата окончания не может быть раньше даты начала'
+            })
         return attrs
 
 class AttendanceSerializer(serializers.ModelSerializer):
@@ -123,7 +233,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
         
         return attrs
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(LessonPaymentStatusMixin, serializers.ModelSerializer):
     """Сериализатор для расписания"""
     course_title = serializers.CharField(source='group.course.title', read_only=True, allow_null=True)
     group_title = serializers.CharField(source='group.title', read_only=True, allow_null=True)
@@ -140,34 +250,10 @@ class ScheduleSerializer(serializers.ModelSerializer):
         ]
     
     def get_payment_status(self, obj):
-        if obj.lesson_type == 'group' and obj.group:
-            # Проверить оплату студентов группы
-            students = obj.group.students.all()
-            payment_status = []
-            for student in students:
-                has_payment = Payment.objects.filter(
-                    student=student,
-                    course=obj.group.course,
-                    status='paid'
-                ).exists()
-                payment_status.append({
-                    'student_id': student.id,
-                    'student_name': student.get_full_name(),
-                    'has_payment': has_payment
-                })
-            return payment_status
-        elif obj.lesson_type == 'individual' and obj.student:
-            has_payment = Payment.objects.filter(
-                student=obj.student,
-                course=obj.group.course if obj.group else None,
-                status='paid'
-            ).exists()
-            return [{
-                'student_id': obj.student.id,
-                'student_name': obj.student.get_full_name(),
-                'has_payment': has_payment
-            }]
-        return []
+        if obj.lesson_type == 'individual':
+            status = self.get_individual_payment_status(obj)
+            return [status] if status else []
+        return self.get_group_payment_status(obj)
 
 # === НОВЫЕ СЕРИАЛИЗАТОРЫ ДЛЯ ПРЕПОДАВАТЕЛЯ ===
 
@@ -2,9 +2,19 @@
 import requests
 import jwt
 import time
+from collections import defaultdict
+from datetime import datetime, timedelta
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
 from django.utils import timezone
-from .models import Lesson, VideoLesson, MeetingParticipant
+from accounts.models import User
+from .feeds import ScheduleFeed
+from .models import (
+    Attendance, Group, HomeworkSubmission, Lesson, LessonSeries, MeetingParticipant, ScheduleEntry,
+    StudentAchievement, StudentBadge, StudentDashboardSnapshot, VideoLesson
+)
+from .scheduling import ConflictEngine
 
 class ZoomService:
     """Сервис для работы с Zoom API"""
@@ -175,4 +185,514 @@ class VideoLessonService:
                 message=f'Занятие "{lesson.title}" начинается. Присоединяйтесь по ссылке.',
                 notification_type='lesson',
                 channels=['email', 'in_app', 'push']
-            )
\ No newline at end of file
+            )
+
+class AttendanceService:
+    """Массовая отметка посещений: проверка состава, upsert и уведомления пачками"""
+    
+    STATUSES = {value for value, label in Attendance.ATTENDANCE_STATUS_CHOICES}
+    
+    @staticmethod
+    def roster_ids(lesson):
+        """ID студентов, которых можно отметить на занятии (один запрос)"""
+        if lesson.lesson_type == 'group' and lesson.group_id:
+            return set(Group.students.through.objects.filter(group_id=lesson.group_id).values_list('user_id', flat=True))
+        if lesson.lesson_type == 'individual' and lesson.student_id:
+            return {lesson.student_id}
+        return set()
+    
+    @staticmethod
+    def normalize(lesson, entries, comment_field='comment'):
+        """Проверка списка отметок: (отметки по студентам, ошибки)"""
+        roster = AttendanceService.roster_ids(lesson)
+        marks, errors = {}, []
+        for data in entries:
+            try:
+                student_id = int(data.get('student_id'))
+            except (TypeError, ValueError):
+                errors.append({'student_id': data.get('student_id'), 'error': 'Некорректный ID студента'})
+                continue
+            status_value = data.get('status', 'present')
+            if student_id not in roster:
+                errors.append({'student_id': student_id, 'error': 'Студент не записан на это занятие'})
+            elif status_value not in AttendanceService.STATUSES:
+                errors.append({'student_id': student_id, 'error': f'Некорректный статус: {status_value}'})
+            else:
+                # Повторная отметка того же студента в запросе заменяет предыдущую
+                marks[student_id] = {'status': status_value, 'comment': data.get(comment_field) or ''}
+        return marks, errors
+    
+    @staticmethod
+    def mark(lesson, marks, notify_comments=False):
+        """Запись отметок одним INSERT ... ON CONFLICT и постановка уведомлений в очередь"""
+        from notifications.services import EmailQueueService, NotificationService
+        
+        if not marks:
+            return []
+        
+        with transaction.atomic():
+            Attendance.objects.bulk_create(
+                [
+                    Attendance(lesson=lesson, student_id=student_id, **values)
+                    for student_id, values in marks.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['lesson', 'student'],
+                update_fields=['status', 'comment', 'updated_at']
+            )
+            # bulk_create не возвращает ID обновленных строк - перечитываем одним запросом
+            attendances = list(
+                Attendance.objects.filter(lesson=lesson, student_id__in=marks.keys())
+                .select_related('student', 'lesson')
+                .order_by('student_id')
+            )
+            StudentDashboardService.refresh(marks.keys(), ['completed_lessons'])
+            
+            # bulk_create не вызывает post_save - письма ставим в очередь одной пачкой
+            EmailQueueService.queue_mass(
+                [AttendanceService.email_for(attendance) for attendance in attendances if attendance.student.email],
+                source='courses.attendance_marked'
+            )
+            if notify_comments:
+                NotificationService.send_notifications(
+                    [
+                        (
+                            attendance.student_id,
+                            f'Комментарий к занятию: {lesson.title}',
+                            f'Преподаватель оставил комментарий: {attendance.comment}'
+                        )
+                        for attendance in attendances if attendance.comment
+                    ],
+                    notification_type='info',
+                    channels=['email', 'in_app']
+                )
+        return attendances
+    
+    @staticmethod
+    def email_for(attendance):
+        """Письмо студенту об отметке посещаемости (формат send_mass_mail)"""
+        student = attendance.student
+        lesson = attendance.lesson
+        subject = f'Отметка посещаемости: {lesson.title}'
+        message = f'''
+            Здравствуйте, {student.get_full_name() or student.username}!
+            
+            По вашему занятию "{lesson.title}" выставлена отметка:
+            Статус: {attendance.get_status_display()}
+            Комментарий: {attendance.comment or 'Нет комментария'}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+        return subject, message, settings.DEFAULT_FROM_EMAIL, [student.email]
+
+class ScheduleService:
+    """Материализованное расписание пользователей: строки пересчитываются по затронутым занятиям"""
+    
+    @staticmethod
+    def desired_entries(lesson_ids):
+        """Ожидаемые строки расписания занятий: {(user_id, lesson_id, role): start_time}"""
+        lessons = list(Lesson.objects.filter(id__in=lesson_ids).values(
+            'id', 'lesson_type', 'group_id', 'student_id', 'teacher_id', 'start_time'
+        ))
+        group_students = defaultdict(list)
+        for group_id, user_id in Group.students.through.objects.filter(
+            group_id__in={lesson['group_id'] for lesson in lessons if lesson['group_id']}
+        ).values_list('group_id', 'user_id'):
+            group_students[group_id].append(user_id)
+        
+        lesson_students = {}
+        for lesson in lessons:
+            if lesson['lesson_type'] == 'group':
+                lesson_students[lesson['id']] = group_students.get(lesson['group_id'], [])
+            elif lesson['student_id']:
+                lesson_students[lesson['id']] = [lesson['student_id']]
+            else:
+                lesson_students[lesson['id']] = []
+        
+        student_ids = {user_id for user_ids in lesson_students.values() for user_id in user_ids}
+        parents = dict(User.objects.filter(
+            id__in=student_ids,
+            parent__isnull=False
+        ).values_list('id', 'parent_id'))
+        
+        entries = {}
+        for lesson in lessons:
+            start_time = lesson['start_time']
+            entries[(lesson['teacher_id'], lesson['id'], 'teacher')] = start_time
+            for student_id in lesson_students[lesson['id']]:
+                entries[(student_id, lesson['id'], 'student')] = start_time
+                if student_id in parents:
+                    entries[(parents[student_id], lesson['id'], 'parent')] = start_time
+        return entries
+    
+    @staticmethod
+    def sync_lessons(lesson_ids):
+        """Приведение строк расписания занятий к ожидаемым (постоянное число запросов на пачку)"""
+        lesson_ids = list(lesson_ids)
+        if not lesson_ids:
+            return
+        desired = ScheduleService.desired_entries(lesson_ids)
+        
+        stale_ids = []
+        moved = defaultdict(set)
+        changed_user_ids = set()
+        counted_student_ids = set()
+        for entry_id, user_id, lesson_id, role, start_time in ScheduleEntry.objects.filter(
+            lesson_id__in=lesson_ids
+        ).values_list('id', 'user_id', 'lesson_id', 'role', 'start_time'):
+            key = (user_id, lesson_id, role)
+            if key not in desired:
+                stale_ids.append(entry_id)
+                changed_user_ids.add(user_id)
+                if role == 'student':
+                    counted_student_ids.add(user_id)
+                continue
+            if desired.pop(key) != start_time:
+                moved[lesson_id].add(entry_id)
+                changed_user_ids.add(user_id)
+        changed_user_ids.update(user_id for user_id, lesson_id, role in desired)
+        counted_student_ids.update(user_id for user_id, lesson_id, role in desired if role == 'student')
+        
+        with transaction.atomic():
+            if stale_ids:
+                ScheduleEntry.objects.filter(id__in=stale_ids).delete()
+            if desired:
+                ScheduleEntry.objects.bulk_create(
+                    [
+                        ScheduleEntry(user_id=user_id, lesson_id=lesson_id, role=role, start_time=start_time)
+                        for (user_id, lesson_id, role), start_time in desired.items()
+                    ],
+                    ignore_conflicts=True
+                )
+            # Перенос занятия - одно обновление на занятие
+            if moved:
+                start_times = dict(Lesson.objects.filter(id__in=moved.keys()).values_list('id', 'start_time'))
+                for lesson_id, entry_ids in moved.items():
+                    ScheduleEntry.objects.filter(id__in=entry_ids).update(start_time=start_times[lesson_id])
+        
+        # Ленты расписания затронутых пользователей перестраиваются при следующем запросе
+        ScheduleFeed.bump(changed_user_ids)
+        # Число занятий на дашборде студента считается по его строкам расписания
+        StudentDashboardService.refresh(counted_student_ids, ['total_lessons'])
+    
+    @staticmethod
+    def touch_lessons(lesson_ids):
+        """Смена версии расписания участников занятий (изменились тема, ссылка или описание)"""
+        ScheduleFeed.bump(ScheduleEntry.objects.filter(
+            lesson_id__in=lesson_ids
+        ).values_list('user_id', flat=True))
+    
+    @staticmethod
+    def sync_groups(group_ids):
+        """Пересчет расписания групповых занятий групп после изменения состава"""
+        ScheduleService.sync_lessons(Lesson.objects.filter(
+            group_id__in=group_ids,
+            lesson_type='group'
+        ).values_list('id', flat=True))
+    
+    @staticmethod
+    def sync_student(user_id):
+        """Пересчет занятий студента (например, после смены родителя)"""
+        ScheduleService.sync_lessons(ScheduleEntry.objects.filter(
+            user_id=user_id,
+            role='student'
+        ).values_list('lesson_id', flat=True))
+    
+    @staticmethod
+    def lessons_for(user, role, since=None):
+        """Занятия из расписания пользователя в указанной роли (диапазон индекса user, role, start_time)"""
+        filters = {'schedule_entries__user': user, 'schedule_entries__role': role}
+        if since is not None:
+            filters['schedule_entries__start_time__gte'] = since
+        # Условия в одном filter() относятся к одной строке расписания
+        return Lesson.objects.filter(**filters)
+
+class LessonSeriesService:
+    """Регулярные занятия: создаются пачкой на скользящий горизонт, изменяются «это и следующие»"""
+    
+    # Поля серии, которые копируются в ее занятия
+    LESSON_FIELDS = ('title', 'description', 'teacher_id')
+    # Изменение этих полей меняет набор дат - будущие занятия создаются заново
+    PATTERN_FIELDS = {'weekdays', 'interval_weeks'}
+    EDITABLE_FIELDS = {'title', 'description', 'teacher', 'start_time', 'duration_minutes', 'ends_on'} | PATTERN_FIELDS
+    
+    @staticmethod
+    def horizon():
+        """Последний день, по который создаются занятия"""
+        return timezone.localdate() + timedelta(days=getattr(settings, 'LESSON_SERIES_HORIZON_DAYS', 56))
+    
+    @staticmethod
+    def occurrences(series, date_from, date_to):
+        """Даты занятий серии с date_from по date_to включительно"""
+        date_from = max(date_from, series.starts_on)
+        if series.ends_on:
+            date_to = min(date_to, series.ends_on)
+        weekdays = set(series.weekdays)
+        # Недели отсчитываются от понедельника недели начала серии
+        anchor = series.starts_on - timedelta(days=series.starts_on.weekday())
+        day = date_from
+        while day <= date_to:
+            if day.weekday() in weekdays and ((day - anchor).days // 7) % series.interval_weeks == 0:
+                yield day
+            day += timedelta(days=1)
+    
+    @staticmethod
+    def lesson_times(series, day):
+        start_time = timezone.make_aware(datetime.combine(day, series.start_time))
+        return start_time, start_time + timedelta(minutes=series.duration_minutes)
+    
+    @staticmethod
+    def apply(series, lesson):
+        """Перенос полей и времени серии в занятие (duration_minutes - для bulk-операций без save())"""
+        lesson.series = series
+        for field in LessonSeriesService.LESSON_FIELDS:
+            setattr(lesson, field, getattr(series, field))
+        lesson.start_time, lesson.end_time = LessonSeriesService.lesson_times(series, lesson.series_date)
+        lesson.duration_minutes = series.duration_minutes
+        return lesson
+    
+    @staticmethod
+    def materialize(series, until=None):
+        """Создание недостающих занятий серии по until одной вставкой: {'created', 'skipped'}"""
+        until = until or LessonSeriesService.horizon()
+        result = {'created': 0, 'skipped': []}
+        if not series.is_active or (series.materialized_until and series.materialized_until >= until):
+            return result
+        
+        date_from = max(
+            series.materialized_until + timedelta(days=1) if series.materialized_until else series.starts_on,
+            timezone.localdate()
+        )
+        dates = list(LessonSeriesService.occurrences(series, date_from, until))
+        existing = set(Lesson.objects.filter(
+            series=series,
+            series_date__in=dates
+        ).values_list('series_date', flat=True))
+        lessons = [
+            LessonSeriesService.apply(series, Lesson(
+                group_id=series.group_id,
+                lesson_type='group',
+                series_date=day
+            ))
+            for day in dates if day not in existing
+        ]
+        
+        # Занятия, пересекающиеся с расписанием, пропускаются и возвращаются в ответе
+        conflicts = ConflictEngine.validate(lessons)
+        result['skipped'] = [
+            {'date': lessons[position].series_date, 'conflicts': position_conflicts}
+            for position, position_conflicts in conflicts.items()
+        ]
+        lessons = [lesson for position, lesson in enumerate(lessons) if position not in conflicts]
+        
+        with transaction.atomic():
+            # bulk_create не вызывает сигналы занятия: расписание и чаты обновляются здесь пачкой,
+            # а уведомления отправляются один раз на серию (сигнал создания LessonSeries)
+            Lesson.objects.bulk_create(lessons, ignore_conflicts=True)
+            created = dict(Lesson.objects.filter(
+                series=series,
+                series_date__in=[lesson.series_date for lesson in lessons]
+            ).values_list('series_date', 'id'))
+            lesson_ids = list(created.values())
+            ScheduleService.sync_lessons(lesson_ids)
+            from chat.services import LessonChatService
+            LessonChatService.create_rooms(Lesson.objects.filter(id__in=lesson_ids))
+            
+            # Пропущенные даты (пересечения и строки, отброшенные вставкой) остаются за границей
+            # материализации и проверяются снова при следующем продлении
+            missing = [day for day in dates if day not in existing and day not in created]
+            series.materialized_until = missing[0] - timedelta(days=1) if missing else until
+            series.save(update_fields=['materialized_until', 'updated_at'])
+        result['created'] = len(lesson_ids)
+        return result
+    
+    @staticmethod
+    def extend_all():
+        """Продление активных серий до горизонта (периодическая задача)"""
+        until = LessonSeriesService.horizon()
+        created = 0
+        for series in LessonSeries.objects.filter(
+            is_active=True
+        ).filter(
+            Q(materialized_until__isnull=True) | Q(materialized_until__lt=until)
+        ).exclude(ends_on__lt=timezone.localdate()).iterator():
+            created += LessonSeriesService.materialize(series, until)['created']
+        return created
+    
+    @staticmethod
+    def update_following(series, from_date, changes):
+        """Изменение занятий серии начиная с from_date: (серия, результат) или (None, пересечения)"""
+        changes = {field: value for field, value in changes.items() if field in LessonSeriesService.EDITABLE_FIELDS}
+        # Прошедшие занятия не меняются
+        from_date = max(from_date, series.starts_on, timezone.localdate())
+        pattern_changed = any(
+            field in changes and changes[field] != getattr(series, field)
+            for field in LessonSeriesService.PATTERN_FIELDS
+        )
+        
+        # Прошедшая часть остается в старой серии, будущая переходит в новую
+        if from_date > series.starts_on:
+            target = LessonSeries(
+                group_id=series.group_id,
+                teacher_id=series.teacher_id,
+                title=series.title,
+                description=series.description,
+                weekdays=series.weekdays,
+                interval_weeks=series.interval_weeks,
+                start_time=series.start_time,
+                duration_minutes=series.duration_minutes,
+                starts_on=from_date,
+                ends_on=series.ends_on,
+                materialized_until=series.materialized_until,
+                parent=series
+            )
+        else:
+            target = series
+        for field, value in changes.items():
+            setattr(target, field, value)
+        
+        future = Lesson.objects.filter(series=series, series_date__gte=from_date, is_completed=False)
+        if pattern_changed:
+            lessons = []
+        else:
+            lessons = list(future.exclude(series_date__gt=target.ends_on) if target.ends_on else future)
+            from chat.services import LessonChatService
+            previous_rosters = {lesson.id: LessonChatService.roster_key(lesson) for lesson in lessons}
+            for lesson in lessons:
+                LessonSeriesService.apply(target, lesson)
+            # Переносимые занятия проверяются вместе, с БД - без их старых интервалов
+            conflicts = ConflictEngine.validate(lessons)
+            if conflicts:
+                return None, [
+                    {'date': lessons[position].series_date, 'conflicts': position_conflicts}
+                    for position, position_conflicts in conflicts.items()
+                ]
+        
+        with transaction.atomic():
+            if target is not series:
+                series.ends_on = from_date - timedelta(days=1)
+                if series.materialized_until:
+                    series.materialized_until = min(series.materialized_until, series.ends_on)
+                series.save()
+            if pattern_changed:
+                target.materialized_until = None
+            target.save()
+            
+            # Занятия, не попадающие в новое расписание, удаляются
+            future.exclude(id__in=[lesson.id for lesson in lessons]).delete()
+            
+            if lessons:
+                Lesson.objects.bulk_update(
+                    lessons,
+                    ['series', 'title', 'description', 'teacher', 'start_time', 'end_time', 'duration_minutes']
+                )
+                lesson_ids = [lesson.id for lesson in lessons]
+                ScheduleService.sync_lessons(lesson_ids)
+                ScheduleService.touch_lessons(lesson_ids)
+                if 'teacher' in changes or 'title' in changes:
+                    # Прежний преподаватель покидает чаты занятий, новый добавляется, название следует за темой
+                    LessonChatService.sync_lessons(lessons, previous_rosters)
+            result = LessonSeriesService.materialize(target)
+        result['updated'] = len(lessons)
+        return target, result
+
+class StudentDashboardService:
+    """Снимок дашборда студента: счетчики меняются точечно при изменении данных и сверяются задачей"""
+    
+    COUNTERS = (
+        'total_courses',
+        'total_lessons',
+        'completed_lessons',
+        'total_homework',
+        'submitted_homework',
+        'total_badges',
+        'total_achievements',
+    )
+    
+    @staticmethod
+    def counter_queries(student_ids):
+        """Запросы счетчиков: (student_id, значение) для каждого студента с ненулевым счетчиком"""
+        return {
+            'total_courses': Group.students.through.objects.filter(
+                user_id__in=student_ids
+            ).values_list('user_id').annotate(value=Count('group__course', distinct=True)),
+            'total_lessons': ScheduleEntry.objects.filter(
+                user_id__in=student_ids,
+                role='student'
+            ).values_list('user_id').annotate(value=Count('id')),
+            'completed_lessons': Attendance.objects.filter(
+                student_id__in=student_ids,
+                status='present'
+            ).values_list('student_id').annotate(value=Count('id')),
+            'total_homework': HomeworkSubmission.objects.filter(
+                student_id__in=student_ids
+            ).values_list('student_id').annotate(value=Count('id')),
+            'submitted_homework': HomeworkSubmission.objects.filter(
+                student_id__in=student_ids,
+                grade__isnull=False
+            ).values_list('student_id').annotate(value=Count('id')),
+            'total_badges': StudentBadge.objects.filter(
+                student_id__in=student_ids
+            ).values_list('student_id').annotate(value=Count('id')),
+            'total_achievements': StudentAchievement.objects.filter(
+                student_id__in=student_ids
+            ).values_list('student_id').annotate(value=Count('id')),
+        }
+    
+    @staticmethod
+    def refresh(student_ids, fields=None):
+        """Пересчет счетчиков пачкой: по запросу на счетчик и одна вставка-обновление снимков
+        
+        Без fields пересчитываются все счетчики и недостающие снимки создаются;
+        с fields обновляются только существующие снимки (остальные посчитаются при первом чтении)
+        """
+        student_ids = set(student_ids)
+        if fields is not None:
+            student_ids = set(StudentDashboardSnapshot.objects.filter(
+                student_id__in=student_ids
+            ).values_list('student_id', flat=True))
+        if not student_ids:
+            return
+        
+        queries = StudentDashboardService.counter_queries(student_ids)
+        fields = list(fields or StudentDashboardService.COUNTERS)
+        values = {field: dict(queries[field].order_by()) for field in fields}
+        StudentDashboardSnapshot.objects.bulk_create(
+            [
+                StudentDashboardSnapshot(
+                    student_id=student_id,
+                    **{field: values[field].get(student_id, 0) for field in fields}
+                )
+                for student_id in student_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=fields + ['updated_at']
+        )
+    
+    @staticmethod
+    def increment(student_id, field, delta=1):
+        """Изменение одного счетчика без пересчета (нет снимка - нечего менять)"""
+        queryset = StudentDashboardSnapshot.objects.filter(student_id=student_id)
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        queryset.update(**{field: F(field) + delta, 'updated_at': timezone.now()})
+    
+    @staticmethod
+    def get(student_id):
+        """Счетчики дашборда одним чтением по первичному ключу"""
+        fields = StudentDashboardService.COUNTERS
+        snapshot = StudentDashboardSnapshot.objects.filter(pk=student_id).values(*fields, 'updated_at').first()
+        if snapshot is None:
+            StudentDashboardService.refresh([student_id])
+            snapshot = StudentDashboardSnapshot.objects.filter(pk=student_id).values(*fields, 'updated_at').first()
+        return snapshot
+    
+    @staticmethod
+    def reconcile(chunk_size=500):
+        """Сверка всех снимков с данными (исправляет пропущенные обновления, например массовые операции)"""
+        student_ids = list(StudentDashboardSnapshot.objects.values_list('student_id', flat=True).order_by('student_id'))
+        for start in range(0, len(student_ids), chunk_size):
+            StudentDashboardService.refresh(student_ids[start:start + chunk_size])
+        return len(student_ids)
\ No newline at end of file
@@ -1,10 +1,15 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from notifications.services import EmailQueueService
 from django.utils import timezone
-from .models import Lesson, Group, Attendance, VideoLesson, MeetingParticipant, HomeworkSubmission, SupportTicket
+from .models import Lesson, LessonSeries, Group, ScheduleEntry, Attendance, VideoLesson, MeetingParticipant, HomeworkSubmission, SupportTicket, StudentBadge, StudentAchievement
 from accounts.models import User
+from .services import AttendanceService, ScheduleService, StudentDashboardService
+
+# Поля занятия, от которых зависит расписание участников
+SCHEDULE_LESSON_FIELDS = {'lesson_type', 'group', 'student', 'teacher', 'start_time'}
 
 @receiver(post_save, sender=Lesson)
 def notify_lesson_created(sender, instance, created, **kwargs):
@@ -24,97 +29,211 @@ def notify_lesson_created(sender, instance, created, **kwargs):
         if instance.teacher not in recipients:
             recipients.append(instance.teacher)
         
-        # Отправляем уведомления
+        # Ставим письма в очередь одной пачкой
+        datatuple = []
         for recipient in recipients:
             if recipient.email:
-                try:
-                    subject = f'Новое занятие: {instance.title}'
-                    message = f'''
-                    Здравствуйте, {recipient.get_full_name() or recipient.username}!
-                    
-                    Запланировано новое занятие:
-                    Тема: {instance.title}
-                    Тип: {instance.get_lesson_type_display()}
-                    Дата и время: {instance.start_time.strftime('%d.%m.%Y %H:%M')}
-                    Преподаватель: {instance.teacher.get_full_name()}
-                    Ссылка на Zoom: {instance.zoom_link or 'Не указана'}
-                    
-                    С уважением,
-                    Онлайн-школа
-                    '''
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [recipient.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки email: {e}")
+                subject = f'Новое занятие: {instance.title}'
+                message = f'''
+                Здравствуйте, {recipient.get_full_name() or recipient.username}!
+                
+                Запланировано новое занятие:
+                Тема: {instance.title}
+                Тип: {instance.get_lesson_type_display()}
+                Дата и время: {instance.start_time.strftime('%d.%m.%Y %H:%M')}
+                Преподаватель: {instance.teacher.get_full_name()}
+                Ссылка на Zoom: {instance.zoom_link or 'Не указана'}
+                
+                С уважением,
+                Онлайн-школа
+                '''
+                datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [recipient.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='courses.lesson_created')
+
+@receiver(post_save, sender=LessonSeries)
+def notify_lesson_series_created(sender, instance, created, **kwargs):
+    """Одно письмо участникам на всю серию (занятия серии создаются без сигналов)"""
+    if created:
+        recipients = list(instance.group.students.exclude(email=''))
+        if instance.teacher.email and instance.teacher not in recipients:
+            recipients.append(instance.teacher)
+        
+        # Серия, отделенная изменением «это и следующие», продолжает прежнюю - это изменение расписания
+        changed = instance.parent_id is not None
+        if changed:
+            subject = f'Изменение расписания: {instance.title}'
+            intro = f'С {instance.starts_on.strftime("%d.%m.%Y")} регулярные занятия группы "{instance.group.title}" проходят по новому расписанию:'
+        else:
+            subject = f'Новое расписание: {instance.title}'
+            intro = f'Для группы "{instance.group.title}" запланированы регулярные занятия:'
+        
+        datatuple = []
+        for recipient in recipients:
+            message = f'''
+            Здравствуйте, {recipient.get_full_name() or recipient.username}!
+            
+            {intro}
+            Тема: {instance.title}
+            Дни недели: {instance.weekdays_display}
+            Время: {instance.start_time.strftime('%H:%M')}, {instance.duration_minutes} мин.
+            Период: с {instance.starts_on.strftime('%d.%m.%Y')}{f" по {instance.ends_on.strftime('%d.%m.%Y')}" if instance.ends_on else ''}
+            Преподаватель: {instance.teacher.get_full_name()}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [recipient.email]))
+        
+        EmailQueueService.queue_mass(
+            datatuple,
+            source='courses.lesson_series_changed' if changed else 'courses.lesson_series_created'
+        )
 
 @receiver(m2m_changed, sender=Group.students.through)
 def notify_student_added_to_group(sender, instance, action, pk_set, **kwargs):
     """Уведомление о добавлении студента в группу"""
     if action == 'post_add':
         group = instance
-        students = User.objects.filter(pk__in=pk_set)
+        students = User.objects.filter(pk__in=pk_set).exclude(email='')
         
+        # Одна пачка писем вместо отдельного SMTP соединения на каждого студента
+        datatuple = []
         for student in students:
-            if student.email:
-                try:
-                    subject = f'Вы добавлены в группу: {group.title}'
-                    message = f'''
-                    Здравствуйте, {student.get_full_name() or student.username}!
-                    
-                    Вы были добавлены в группу "{group.title}" курса "{group.course.title}".
-                    Преподаватель: {group.teacher.get_full_name()}
-                    Период обучения: с {group.start_date} по {group.end_date}
-                    
-                    С уважением,
-                    Онлайн-школа
-                    '''
-                    
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [student.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки email: {e}")
+            subject = f'Вы добавлены в группу: {group.title}'
+            message = f'''
+            Здравствуйте, {student.get_full_name() or student.username}!
+            
+            Вы были добавлены в группу "{group.title}" курса "{group.course.title}".
+            Преподаватель: {group.teacher.get_full_name()}
+            Период обучения: с {group.start_date} по {group.end_date}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [student.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='courses.student_added_to_group')
+
+@receiver(post_save, sender=Lesson)
+def sync_lesson_schedule(sender, instance, created, update_fields=None, **kwargs):
+    """Обновление строк расписания занятия"""
+    if created or update_fields is None or SCHEDULE_LESSON_FIELDS & set(update_fields):
+        ScheduleService.sync_lessons([instance.id])
+    # Любое изменение занятия меняет ленты расписания его участников
+    ScheduleService.touch_lessons([instance.id])
+
+@receiver(pre_delete, sender=Lesson)
+def touch_deleted_lesson_schedule(sender, instance, **kwargs):
+    """Строки расписания удаляются каскадно - меняем версии лент до удаления"""
+    ScheduleService.touch_lessons([instance.id])
+    # Каскадное удаление строк расписания идет без сигналов: студентов занятия запоминаем до удаления,
+    # а счетчик занятий на дашборде пересчитываем после коммита
+    student_ids = list(ScheduleEntry.objects.filter(lesson=instance, role='student').values_list('user_id', flat=True))
+    if student_ids:
+        transaction.on_commit(lambda: StudentDashboardService.refresh(student_ids, ['total_lessons']))
+
+@receiver(pre_delete, sender=Group)
+def refresh_deleted_group_dashboards(sender, instance, **kwargs):
+    """Состав группы удаляется каскадно без m2m_changed - пересчитываем курсы и занятия студентов после коммита"""
+    student_ids = list(instance.students.values_list('id', flat=True))
+    if student_ids:
+        transaction.on_commit(lambda: StudentDashboardService.refresh(student_ids, ['total_courses', 'total_lessons']))
+
+@receiver(m2m_changed, sender=Group.students.through)
+def sync_group_schedule(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновление расписания групповых занятий при изменении состава группы"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ScheduleService.sync_groups([instance.id])
+    elif action == 'post_clear':
+        # Студент исключен из всех групп - пересчитываем его занятия
+        ScheduleService.sync_student(instance.id)
+    else:
+        ScheduleService.sync_groups(pk_set)
+
+@receiver(pre_save, sender=User)
+def remember_previous_parent(sender, instance, update_fields=None, **kwargs):
+    """Прежний родитель до сохранения: расписание переносится, только если он сменился"""
+    if instance.pk and (update_fields is None or 'parent' in update_fields):
+        instance._previous_parent_id = User.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+
+@receiver(post_save, sender=User)
+def sync_children_schedule(sender, instance, created, **kwargs):
+    """Перенос занятий ребенка в расписание нового родителя"""
+    if created or not hasattr(instance, '_previous_parent_id'):
+        return
+    previous_parent_id = instance._previous_parent_id
+    del instance._previous_parent_id
+    if previous_parent_id != instance.parent_id:
+        ScheduleService.sync_student(instance.id)
+
+@receiver(m2m_changed, sender=Group.students.through)
+def refresh_dashboard_courses(sender, instance, action, reverse, pk_set, **kwargs):
+    """Число курсов на дашборде студентов после изменения состава группы"""
+    if action not in ('pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        student_ids = [instance.id]
+    elif action == 'pre_clear':
+        # После очистки состав группы уже не узнать
+        instance._cleared_student_ids = list(instance.students.values_list('id', flat=True))
+        return
+    elif action == 'post_clear':
+        student_ids = getattr(instance, '_cleared_student_ids', [])
+    else:
+        student_ids = pk_set or []
+    StudentDashboardService.refresh(student_ids, ['total_courses'])
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def refresh_dashboard_attendance(sender, instance, **kwargs):
+    """Число посещенных занятий на дашборде студента (статус мог смениться в обе стороны)"""
+    StudentDashboardService.refresh([instance.student_id], ['completed_lessons'])
+
+@receiver(post_save, sender=HomeworkSubmission)
+def refresh_dashboard_homework(sender, instance, created, **kwargs):
+    """Счетчики домашних заданий на дашборде студента"""
+    if created:
+        StudentDashboardService.increment(instance.student_id, 'total_homework')
+        if instance.grade is not None:
+            StudentDashboardService.increment(instance.student_id, 'submitted_homework')
+    else:
+        StudentDashboardService.refresh([instance.student_id], ['submitted_homework'])
+
+@receiver(post_delete, sender=HomeworkSubmission)
+def refresh_dashboard_homework_deleted(sender, instance, **kwargs):
+    StudentDashboardService.refresh([instance.student_id], ['total_homework', 'submitted_homework'])
+
+@receiver(post_save, sender=StudentBadge)
+@receiver(post_save, sender=StudentAchievement)
+def increment_dashboard_awards(sender, instance, created, **kwargs):
+    """Бейджи и достижения на дашборде студента"""
+    if created:
+        field = 'total_badges' if sender is StudentBadge else 'total_achievements'
+        StudentDashboardService.increment(instance.student_id, field)
+
+@receiver(post_delete, sender=StudentBadge)
+@receiver(post_delete, sender=StudentAchievement)
+def decrement_dashboard_awards(sender, instance, **kwargs):
+    field = 'total_badges' if sender is StudentBadge else 'total_achievements'
+    StudentDashboardService.increment(instance.student_id, field, -1)
 
 @receiver(post_save, sender=Attendance)
 def notify_attendance_marked(sender, instance, created, **kwargs):
     """Уведомление о выставленной посещаемости"""
+    # Массовая отметка (AttendanceService.mark) ставит письма в очередь сама
     if created or kwargs.get('update_fields'):
-        student = instance.student
-        lesson = instance.lesson
-        
-        if student.email:
-            try:
-                status_text = instance.get_status_display()
-                subject = f'Отметка посещаемости: {lesson.title}'
-                message = f'''
-                Здравствуйте, {student.get_full_name() or student.username}!
-                
-                По вашему занятию "{lesson.title}" выставлена отметка:
-                Статус: {status_text}
-                Комментарий: {instance.comment or 'Нет комментария'}
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
+        if instance.student.email:
+            subject, message, from_email, recipient_list = AttendanceService.email_for(instance)
+            EmailQueueService.queue(
+                subject,
+                message,
+                from_email,
+                recipient_list,
+                source='courses.attendance_marked'
+            )
 
 @receiver(post_save, sender=VideoLesson)
 def create_zoom_meeting_for_lesson(sender, instance, created, **kwargs):
@@ -124,29 +243,26 @@ def create_zoom_meeting_for_lesson(sender, instance, created, **kwargs):
         # Здесь просто уведомляем преподавателя
         teacher = instance.lesson.teacher
         if teacher.email:
-            try:
-                subject = f'Видеоурок создан: {instance.lesson.title}'
-                message = f'''
-                Здравствуйте, {teacher.get_full_name() or teacher.username}!
-                
-                Для занятия "{instance.lesson.title}" создана Zoom встреча:
-                ID встречи: {instance.zoom_meeting_id}
-                Ссылка для присоединения: {instance.zoom_join_url}
-                Пароль: {instance.meeting_password}
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [teacher.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
+            subject = f'Видеоурок создан: {instance.lesson.title}'
+            message = f'''
+            Здравствуйте, {teacher.get_full_name() or teacher.username}!
+            
+            Для занятия "{instance.lesson.title}" создана Zoom встреча:
+            ID встречи: {instance.zoom_meeting_id}
+            Ссылка для присоединения: {instance.zoom_join_url}
+            Пароль: {instance.meeting_password}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [teacher.email],
+                source='courses.create_zoom_meeting_for_lesson'
+            )
 
 @receiver(post_save, sender=MeetingParticipant)
 def notify_meeting_participation(sender, instance, created, **kwargs):
@@ -156,28 +272,25 @@ def notify_meeting_participation(sender, instance, created, **kwargs):
         lesson = instance.lesson
         
         if user.email:
-            try:
-                subject = f'Участие в занятии: {lesson.title}'
-                message = f'''
-                Здравствуйте, {user.get_full_name() or user.username}!
-                
-                Вы были добавлены в список участников занятия "{lesson.title}".
-                Роль: {instance.get_role_display()}
-                Время присоединения: {instance.joined_at.strftime('%d.%m.%Y %H:%M')}
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
+            subject = f'Участие в занятии: {lesson.title}'
+            message = f'''
+            Здравствуйте, {user.get_full_name() or user.username}!
+            
+            Вы были добавлены в список участников занятия "{lesson.title}".
+            Роль: {instance.get_role_display()}
+            Время присоединения: {instance.joined_at.strftime('%d.%m.%Y %H:%M')}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [user.email],
+                source='courses.meeting_participation'
+            )
 
 @receiver(post_save, sender=HomeworkSubmission)
 def notify_homework_graded(sender, instance, created, **kwargs):
@@ -187,27 +300,24 @@ def notify_homework_graded(sender, instance, created, **kwargs):
         homework = instance.homework
         
         if student.email:
-            try:
-                subject = f'Оценка за задание: {homework.title}'
-                message = f'''
-                Здравствуйте, {student.get_full_name() or student.username}!
-                
-                За ваше задание "{homework.title}" выставлена оценка: {instance.grade}
-                Комментарий преподавателя: {instance.feedback or 'Нет комментария'}
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
+            subject = f'Оценка за задание: {homework.title}'
+            message = f'''
+            Здравствуйте, {student.get_full_name() or student.username}!
+            
+            За ваше задание "{homework.title}" выставлена оценка: {instance.grade}
+            Комментарий преподавателя: {instance.feedback or 'Нет комментария'}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [student.email],
+                source='courses.homework_graded'
+            )
 
 @receiver(post_save, sender=SupportTicket)
 def notify_support_ticket_created(sender, instance, created, **kwargs):
@@ -216,26 +326,23 @@ def notify_support_ticket_created(sender, instance, created, **kwargs):
         user = instance.user
         
         if user.email:
-            try:
-                subject = f'Тикет поддержки создан: {instance.title}'
-                message = f'''
-                Здравствуйте, {user.get_full_name() or user.username}!
-                
-                Создан тикет поддержки:
-                Тема: {instance.title}
-                Статус: {instance.get_status_display()}
-                Приоритет: {instance.get_priority_display()}
-                
-                С уважением,
-                Служба поддержки
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
\ No newline at end of file
+            subject = f'Тикет поддержки создан: {instance.title}'
+            message = f'''
+            Здравствуйте, {user.get_full_name() or user.username}!
+            
+            Создан тикет поддержки:
+            Тема: {instance.title}
+            Статус: {instance.get_status_display()}
+            Приоритет: {instance.get_priority_display()}
+            
+            С уважением,
+            Служба поддержки
+            '''
+            
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [user.email],
+                source='courses.support_ticket_created'
+            )
\ No newline at end of file
@@ -0,0 +1,24 @@
+from celery import shared_task
+from django.db import DatabaseError
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3
+)
+def extend_lesson_series():
+    """Создание занятий регулярных серий до горизонта LESSON_SERIES_HORIZON_DAYS"""
+    from .services import LessonSeriesService
+    
+    return LessonSeriesService.extend_all()
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3
+)
+def reconcile_student_dashboards(chunk_size=500):
+    """Сверка снимков дашбордов студентов с данными"""
+    from .services import StudentDashboardService
+    
+    return StudentDashboardService.reconcile(chunk_size)
\ No newline at end of file
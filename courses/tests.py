@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from .models import Course, Group, Lesson, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant
+from .services import LessonSeriesService
 
 User = get_user_model()
 
@@ -92,6 +93,537 @@ class CoursesTestCase(APITestCase):
         response = self.client.post('/api/courses/lessons/', data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Lesson.objects.filter(title='Урок 1').exists())
+    
+    def test_mark_attendance_bulk(self):
+        """Тест массовой отметки посещений: число запросов не зависит от размера группы"""
+        import datetime
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from notifications.models import OutgoingEmail
+        
+        lesson = Lesson.objects.create(
+            group=self.group,
+            teacher=self.teacher_user,
+            title='Урок посещаемости',
+            lesson_type='group',
+            start_time=datetime.datetime.now(),
+            end_time=datetime.datetime.now() + datetime.timedelta(hours=1)
+        )
+        for i in range(6):
+            self.group.students.add(User.objects.create_user(
+                username=f'roster{i}',
+                email=f'roster{i}@test.com',
+                password='testpass123',
+                role='student'
+            ))
+        students = list(self.group.students.order_by('id'))
+        self.client.force_authenticate(user=self.teacher_user)
+        
+        def mark(roster, status_value):
+            data = {
+                'lesson_id': lesson.id,
+                'attendance': [
+                    {'student_id': student.id, 'status': status_value, 'comment': 'Молодец'}
+                    for student in roster
+                ]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/courses/attendance/mark-with-comment/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+        
+        small = mark(students[:2], 'present')
+        large = mark(students, 'late')
+        self.assertEqual(small, large)
+        
+        # Повторная отметка обновляет записи, а не создает новые
+        self.assertEqual(Attendance.objects.filter(lesson=lesson).count(), len(students))
+        self.assertEqual(Attendance.objects.filter(lesson=lesson, status='late').count(), len(students))
+        self.assertEqual(OutgoingEmail.objects.filter(source='courses.attendance_marked').count(), 2 + len(students))
+        
+        # Студент не из группы занятия
+        outsider = User.objects.create_user(username='outsider', password='testpass123', role='student')
+        response = self.client.post(
+            '/api/courses/attendance/mark-with-comment/',
+            {'lesson_id': lesson.id, 'attendance': [{'student_id': outsider.id}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Attendance.objects.filter(student=outsider).exists())
+    
+    def test_lesson_payment_status(self):
+        """Тест статуса оплаты в списке занятий: оплаты загружаются одним запросом на страницу"""
+        import datetime
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from payments.models import Payment
+        
+        Payment.objects.create(
+            student=self.student_user,
+            course=self.course,
+            amount=1000,
+            status='paid',
+            transaction_id='txn_lesson_status'
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        
+        def list_lessons(count):
+            start = datetime.datetime.now() + datetime.timedelta(days=1)
+            for i in range(count):
+                Lesson.objects.create(
+                    group=self.group,
+                    teacher=self.teacher_user,
+                    title=f'Урок {i}',
+                    lesson_type='group',
+                    start_time=start,
+                    end_time=start + datetime.timedelta(hours=1)
+                )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/courses/lessons/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response.data['results'], len(queries)
+        
+        results, few = list_lessons(2)
+        self.assertEqual(results[0]['payment_status'], [{
+            'student_id': self.student_user.id,
+            'student_name': self.student_user.get_full_name(),
+            'has_payment': True
+        }])
+        
+        unpaid = User.objects.create_user(username='unpaid', password='testpass123', role='student')
+        self.group.students.add(unpaid)
+        results, many = list_lessons(6)
+        self.assertEqual(few, many)
+        statuses = {item['student_id']: item['has_payment'] for item in results[-1]['payment_status']}
+        self.assertEqual(statuses, {self.student_user.id: True, unpaid.id: False})
+        
+        # Индивидуальное занятие без группы проверяется по оплате без курса
+        start = datetime.datetime.now() + datetime.timedelta(days=2)
+        individual = Lesson.objects.create(
+            student=unpaid,
+            teacher=self.teacher_user,
+            title='Индивидуальное',
+            lesson_type='individual',
+            start_time=start,
+            end_time=start + datetime.timedelta(hours=1)
+        )
+        response = self.client.get(f'/api/courses/lessons/{individual.id}/')
+        self.assertFalse(response.data['student_payment_status']['has_payment'])
+        Payment.objects.create(
+            student=unpaid,
+            amount=500,
+            status='paid',
+            transaction_id='txn_individual_status'
+        )
+        response = self.client.get(f'/api/courses/lessons/{individual.id}/')
+        self.assertTrue(response.data['student_payment_status']['has_payment'])
+    
+    def test_materialized_schedule(self):
+        """Тест материализованного расписания: строки следуют за занятиями, группами и родителями"""
+        import datetime
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import ScheduleEntry
+        
+        parent = User.objects.create_user(username='parent', password='testpass123', role='parent')
+        start = timezone.now() + datetime.timedelta(days=1)
+        group_lesson = Lesson.objects.create(
+            group=self.group,
+            teacher=self.teacher_user,
+            title='Групповое',
+            lesson_type='group',
+            start_time=start,
+            end_time=start + datetime.timedelta(hours=1)
+        )
+        individual_lesson = Lesson.objects.create(
+            student=self.student_user,
+            teacher=self.teacher_user,
+            title='Индивидуальное',
+            lesson_type='individual',
+            start_time=start + datetime.timedelta(days=1),
+            end_time=start + datetime.timedelta(days=1, hours=1)
+        )
+        self.student_user.parent = parent
+        self.student_user.save()
+        
+        def schedule(user, url='/api/courses/schedule/'):
+            self.client.force_authenticate(user=user)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [item['id'] for item in response.data['results']]
+        
+        both = [group_lesson.id, individual_lesson.id]
+        self.assertEqual(schedule(self.student_user), both)
+        self.assertEqual(schedule(parent), both)
+        self.assertEqual(schedule(self.teacher_user, f'/api/courses/schedule/teacher/{self.teacher_user.id}/'), both)
+        
+        # Сохранение без смены родителя не пересобирает расписание ребенка
+        ScheduleEntry.objects.filter(user=parent).delete()
+        self.student_user.first_name = 'Студент'
+        self.student_user.save()
+        self.assertFalse(ScheduleEntry.objects.filter(user=parent).exists())
+        self.student_user.parent = None
+        self.student_user.save(update_fields=['parent'])
+        self.student_user.parent = parent
+        self.student_user.save()
+        self.assertEqual(schedule(parent), both)
+        
+        # Перенос занятия обновляет время в строках расписания
+        group_lesson.start_time = start + datetime.timedelta(days=2)
+        group_lesson.end_time = group_lesson.start_time + datetime.timedelta(hours=1)
+        group_lesson.save()
+        self.assertEqual(schedule(self.student_user), [individual_lesson.id, group_lesson.id])
+        
+        # Исключение из группы убирает групповые занятия студента и родителя
+        self.group.students.remove(self.student_user)
+        self.assertEqual(schedule(self.student_user, f'/api/courses/schedule/student/{self.student_user.id}/'), [individual_lesson.id])
+        self.assertEqual(schedule(parent), [individual_lesson.id])
+        
+        entries = set(ScheduleEntry.objects.values_list('user_id', 'lesson_id', 'role', 'start_time'))
+        ScheduleEntry.objects.all().delete()
+        call_command('rebuild_schedule', stdout=StringIO())
+        self.assertEqual(set(ScheduleEntry.objects.values_list('user_id', 'lesson_id', 'role', 'start_time')), entries)
+    
+    def test_schedule_feed(self):
+        """Тест ленты расписания: ETag, ответ 304 без запросов к БД и смена версии при изменении занятия"""
+        import datetime
+        import json
+        from django.utils import timezone
+        
+        start = timezone.now() + datetime.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(
+                group=self.group,
+                teacher=self.teacher_user,
+                title='Урок; с запятой, и точкой с запятой',
+                lesson_type='group',
+                start_time=start,
+                end_time=start + datetime.timedelta(hours=1)
+            )
+        self.client.force_authenticate(user=self.student_user)
+        
+        response = self.client.get('/api/courses/schedule/feed.ics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn(f'UID:lesson-{lesson.id}@online-school', body)
+        self.assertIn('SUMMARY:Урок\\; с запятой\\, и точкой с запятой', body)
+        etag = response['ETag']
+        
+        # Неизмененная лента: 304 без запросов к БД, повторная выдача - из кеша
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/courses/schedule/feed.ics', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/courses/schedule/feed.ics')
+        self.assertEqual(response.content.decode(), body)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.title = 'Новая тема'
+            lesson.save(update_fields=['title'])
+        response = self.client.get('/api/courses/schedule/feed.json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['title'] for item in data['lessons']], ['Новая тема'])
+    
+    def test_lesson_conflicts(self):
+        """Тест проверки пересечений занятий и поиска свободных окон преподавателя"""
+        import datetime
+        from django.utils import timezone
+        
+        day = timezone.localdate() + datetime.timedelta(days=1)
+        
+        def at(hour, minute=0):
+            return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour, minute))).isoformat()
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.post('/api/courses/lessons/', {
+            'group': self.group.id,
+            'teacher': self.teacher_user.id,
+            'title': 'Групповое',
+            'lesson_type': 'group',
+            'start_time': at(10),
+            'end_time': at(11)
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        # Студент группы занят, хотя преподаватель индивидуального занятия другой
+        other_teacher = User.objects.create_user(username='other_teacher', password='testpass123', role='teacher')
+        response = self.client.post('/api/courses/lessons/', {
+            'student': self.student_user.id,
+            'teacher': other_teacher.id,
+            'title': 'Индивидуальное',
+            'lesson_type': 'individual',
+            'start_time': at(10, 30),
+            'end_time': at(11, 30)
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('start_time', response.data)
+        
+        # Пересечения внутри импортируемого набора
+        lessons = [
+            {'group': self.group.id, 'teacher': self.teacher_user.id, 'title': 'А', 'lesson_type': 'group',
+             'start_time': at(12), 'end_time': at(13)},
+            {'student': self.student_user.id, 'teacher': other_teacher.id, 'title': 'Б', 'lesson_type': 'individual',
+             'start_time': at(12, 30), 'end_time': at(13, 30)},
+        ]
+        response = self.client.post('/api/courses/lessons/import/', {'lessons': lessons}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['conflicts'][1][0]['position'], 0)
+        
+        lessons[1].update(start_time=at(13), end_time=at(14))
+        response = self.client.post('/api/courses/lessons/import/', {'lessons': lessons}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['lesson_ids']), 2)
+        
+        response = self.client.get(
+            f'/api/courses/schedule/teacher/{self.teacher_user.id}/free-slots/',
+            {'date_from': day.isoformat(), 'date_to': day.isoformat(), 'duration': 60}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot['start'].isoformat(), slot['end'].isoformat()) for slot in response.data['slots']],
+            [(at(9), at(10)), (at(11), at(12)), (at(13), at(21))]
+        )
+        
+        # Пересечения, созданные в обход проверки (старые данные), находит проверка перед миграцией
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        
+        call_command('check_lesson_overlaps', stdout=StringIO())
+        overlapping = Lesson.objects.create(
+            student=self.student_user,
+            teacher=other_teacher,
+            title='Старое занятие',
+            lesson_type='individual',
+            start_time=timezone.make_aware(datetime.datetime.combine(day, datetime.time(13, 30))),
+            end_time=timezone.make_aware(datetime.datetime.combine(day, datetime.time(14, 30)))
+        )
+        output = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_lesson_overlaps', stdout=output)
+        self.assertIn(f'#{overlapping.id}', output.getvalue())
+    
+    def test_lesson_series(self):
+        """Тест создания регулярных занятий и изменения «это и следующие»"""
+        import datetime
+        from django.utils import timezone
+        from chat.models import ChatRoom
+        from .models import LessonSeries, ScheduleEntry
+        
+        first_day = timezone.localdate() + datetime.timedelta(days=1)
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.post('/api/courses/lesson-series/', {
+            'group': self.group.id,
+            'teacher': self.teacher_user.id,
+            'title': 'Разговорная практика',
+            'weekdays': [first_day.weekday()],
+            'start_time': '18:00',
+            'duration_minutes': 90,
+            'starts_on': first_day.isoformat(),
+            'ends_on': (first_day + datetime.timedelta(days=27)).isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['lessons_created'], 4)
+        series = LessonSeries.objects.get(id=response.data['id'])
+        
+        lessons = list(Lesson.objects.filter(series=series).order_by('series_date'))
+        self.assertEqual([lesson.series_date for lesson in lessons], [first_day + datetime.timedelta(weeks=week) for week in range(4)])
+        self.assertEqual(lessons[0].duration_minutes, 90)
+        self.assertEqual(ScheduleEntry.objects.filter(user=self.student_user, lesson__series=series).count(), 4)
+        self.assertEqual(ChatRoom.objects.filter(lesson__series=series, participants=self.student_user).count(), 4)
+        
+        # Повторный запуск не создает дубликатов
+        self.assertEqual(LessonSeriesService.materialize(series, first_day + datetime.timedelta(days=60))['created'], 0)
+        
+        # Дата, пропущенная из-за пересечения, создается при следующем продлении
+        blocked_day = first_day + datetime.timedelta(weeks=5)
+        blocked_start = timezone.make_aware(datetime.datetime.combine(blocked_day, datetime.time(18, 30)))
+        blocker = Lesson.objects.create(
+            lesson_type='individual',
+            student=self.student_user,
+            teacher=self.teacher_user,
+            title='Индивидуальное',
+            start_time=blocked_start,
+            end_time=blocked_start + datetime.timedelta(hours=1)
+        )
+        extended = LessonSeries.objects.create(
+            group=self.group,
+            teacher=self.teacher_user,
+            title='Продленная серия',
+            weekdays=[first_day.weekday()],
+            start_time=datetime.time(18, 0),
+            duration_minutes=90,
+            starts_on=first_day + datetime.timedelta(weeks=4),
+            ends_on=first_day + datetime.timedelta(weeks=6)
+        )
+        result = LessonSeriesService.materialize(extended, first_day + datetime.timedelta(weeks=6))
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([item['date'] for item in result['skipped']], [blocked_day])
+        self.assertEqual(extended.materialized_until, blocked_day - datetime.timedelta(days=1))
+        blocker.delete()
+        LessonSeriesService.materialize(extended, first_day + datetime.timedelta(weeks=6))
+        self.assertTrue(Lesson.objects.filter(series=extended, series_date=blocked_day).exists())
+        self.assertEqual(extended.materialized_until, first_day + datetime.timedelta(weeks=6))
+        
+        # Перенос времени с третьего занятия: прошлая часть остается в старой серии
+        from notifications.models import OutgoingEmail
+        created_emails = OutgoingEmail.objects.filter(source='courses.lesson_series_created').count()
+        third_day = lessons[2].series_date
+        response = self.client.post(f'/api/courses/lesson-series/{series.id}/update-following/', {
+            'from_date': third_day.isoformat(),
+            'start_time': '19:00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['lessons_updated'], 2)
+        series.refresh_from_db()
+        self.assertEqual(series.ends_on, third_day - datetime.timedelta(days=1))
+        self.assertEqual(LessonSeries.objects.get(id=response.data['id']).parent_id, series.id)
+        # Отделенная серия рассылает изменение расписания, а не новое расписание
+        self.assertEqual(OutgoingEmail.objects.filter(source='courses.lesson_series_created').count(), created_emails)
+        self.assertTrue(OutgoingEmail.objects.filter(source='courses.lesson_series_changed').exists())
+        
+        moved = Lesson.objects.get(id=lessons[2].id)
+        self.assertEqual(moved.series_id, response.data['id'])
+        self.assertEqual(timezone.localtime(moved.start_time).hour, 19)
+        self.assertEqual(ScheduleEntry.objects.get(user=self.student_user, lesson=moved).start_time, moved.start_time)
+        
+        # Новый преподаватель занимает чаты перенесенных занятий, прежний их покидает
+        other_teacher = User.objects.create_user(username='series_teacher', password='testpass123', role='teacher')
+        response = self.client.post(f'/api/courses/lesson-series/{moved.series_id}/update-following/', {
+            'from_date': third_day.isoformat(),
+            'teacher': other_teacher.id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        room = ChatRoom.objects.get(lesson_id=moved.id)
+        self.assertTrue(room.participants.filter(id=other_teacher.id).exists())
+        self.assertFalse(room.participants.filter(id=self.teacher_user.id).exists())
+        moved = Lesson.objects.get(id=moved.id)
+        self.client.force_authenticate(user=other_teacher)
+        
+        # Смена дня недели пересоздает будущие занятия новой серии
+        new_weekday = (first_day.weekday() + 1) % 7
+        response = self.client.post(f'/api/courses/lesson-series/{moved.series_id}/update-following/', {
+            'from_date': third_day.isoformat(),
+            'weekdays': [new_weekday]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['lessons_created'], 2)
+        self.assertFalse(Lesson.objects.filter(id=moved.id).exists())
+        self.assertEqual(
+            {lesson.series_date.weekday() for lesson in Lesson.objects.filter(series_id=response.data['id'])},
+            {new_weekday}
+        )
+
+    def test_student_dashboard_snapshot(self):
+        """Тест счетчиков дашборда студента из снимка"""
+        import datetime
+        from django.utils import timezone
+        from .models import StudentDashboardSnapshot
+        from .services import AttendanceService, StudentDashboardService
+        
+        start_time = timezone.now() - datetime.timedelta(days=1)
+        lesson = Lesson.objects.create(
+            group=self.group,
+            teacher=self.teacher_user,
+            title='Занятие',
+            lesson_type='group',
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=1)
+        )
+        
+        self.client.force_authenticate(user=self.student_user)
+        response = self.client.get('/api/courses/dashboard/progress/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_courses'], 1)
+        self.assertEqual(response.data['total_lessons'], 1)
+        self.assertEqual(response.data['completed_lessons'], 0)
+        
+        # Счетчики обновляются при изменении данных, в том числе при массовой отметке
+        AttendanceService.mark(lesson, {self.student_user.id: {'status': 'present', 'comment': ''}})
+        badge = Badge.objects.create(name='Активист', description='Активность', badge_type='participation')
+        StudentBadge.objects.create(student=self.student_user, badge=badge, awarded_by=self.teacher_user)
+        Lesson.objects.create(
+            lesson_type='individual',
+            student=self.student_user,
+            teacher=self.teacher_user,
+            title='Индивидуальное',
+            start_time=start_time + datetime.timedelta(hours=2),
+            end_time=start_time + datetime.timedelta(hours=3)
+        )
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/courses/dashboard/progress/')
+        self.assertEqual(response.data['completed_lessons'], 1)
+        self.assertEqual(response.data['total_badges'], 1)
+        self.assertEqual(response.data['total_lessons'], 2)
+        
+        # Удаление занятия и группы уменьшает счетчики после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+        self.assertEqual(StudentDashboardSnapshot.objects.get(pk=self.student_user.id).total_lessons, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertEqual(StudentDashboardSnapshot.objects.get(pk=self.student_user.id).total_courses, 0)
+        
+        # Сверка исправляет расхождения, пропущенные без сигналов
+        StudentDashboardSnapshot.objects.filter(pk=self.student_user.id).update(total_badges=5)
+        StudentDashboardService.reconcile()
+        self.assertEqual(StudentDashboardSnapshot.objects.get(pk=self.student_user.id).total_badges, 1)
+
+    def test_teacher_dashboard_distinct_students(self):
+        """Тест статистики преподавателя: студент нескольких групп считается один раз"""
+        from crm.analytics import TeacherAnalytics
+        
+        second_group = Group.objects.create(
+            title='Группа 2',
+            course=self.course,
+            teacher=self.teacher_user,
+            start_date='2024-01-01',
+            end_date='2024-06-01'
+        )
+        second_group.students.add(self.student_user)
+        other_student = User.objects.create_user(username='student2', password='testpass123', role='student')
+        second_group.students.add(other_student)
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get('/api/courses/dashboard/progress/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_groups'], 2)
+        self.assertEqual(response.data['total_students'], 2)
+        
+        # Пакетный режим: все преподаватели одним запросом
+        User.objects.create_user(username='teacher2', password='testpass123', role='teacher')
+        with self.assertNumQueries(1):
+            stats = {item['teacher_id']: item for item in TeacherAnalytics.for_all()}
+        self.assertEqual(stats[self.teacher_user.id]['total_students'], 2)
+        self.assertEqual(len(stats), 2)
+
+    def test_student_detailed_info(self):
+        """Тест профиля студента: число запросов не зависит от числа записей, разделы выбираются"""
+        for number in range(3):
+            badge = Badge.objects.create(name=f'Бейдж {number}', description='Описание', badge_type='participation')
+            StudentBadge.objects.create(student=self.student_user, badge=badge, awarded_by=self.teacher_user)
+            TestResult.objects.create(student=self.student_user, course=self.course, test_name=f'Тест {number}', score=80)
+        StudentProgress.objects.create(student=self.student_user, course=self.course)
+        
+        self.client.force_authenticate(user=self.teacher_user)
+        url = f'/api/courses/students/{self.student_user.id}/detailed-info/'
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['badges']), 3)
+        self.assertEqual(len(response.data['test_results']), 3)
+        self.assertEqual(response.data['progress'][0]['course']['title'], self.course.title)
+        
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'badges'})
+        self.assertEqual(set(response.data), {'student', 'badges'})
+        
+        response = self.client.get(url, {'fields': 'grades'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 class BadgesTestCase(APITestCase):
     def setUp(self):
@@ -11,6 +11,11 @@ from .views import (
     ScheduleView,
     StudentScheduleView,
     TeacherScheduleView,
+    schedule_feed,
+    import_lessons,
+    get_teacher_free_slots,
+    LessonSeriesListCreateView,
+    update_lesson_series_following,
     mark_attendance,
     get_group_students,
     # === НОВЫЕ URL ДЛЯ ПРЕПОДАВАТЕЛЯ ===
@@ -74,6 +79,9 @@ urlpatterns = [
     # Занятия
     path('lessons/', LessonListCreateView.as_view(), name='lesson-list'),
     path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
+    path('lessons/import/', import_lessons, name='lesson-import'),
+    path('lesson-series/', LessonSeriesListCreateView.as_view(), name='lesson-series-list'),
+    path('lesson-series/<int:series_id>/update-following/', update_lesson_series_following, name='lesson-series-update-following'),
     
     # Посещения
     path('attendance/', AttendanceListCreateView.as_view(), name='attendance-list'),
@@ -85,6 +93,8 @@ urlpatterns = [
     path('schedule/', ScheduleView.as_view(), name='schedule'),
     path('schedule/student/<int:student_id>/', StudentScheduleView.as_view(), name='student-schedule'),
     path('schedule/teacher/<int:teacher_id>/', TeacherScheduleView.as_view(), name='teacher-schedule'),
+    path('schedule/feed.<str:fmt>', schedule_feed, name='schedule-feed'),
+    path('schedule/teacher/<int:teacher_id>/free-slots/', get_teacher_free_slots, name='teacher-free-slots'),
     
     # === НОВЫЕ URL ДЛЯ ПРЕПОДАВАТЕЛЯ ===
     # Бейджи
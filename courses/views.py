@@ -2,19 +2,25 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.db import models
-from .models import Course, Group, Lesson, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage
+from django.db import IntegrityError, models, transaction
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+from .models import Course, Group, Lesson, LessonSeries, Attendance, Badge, StudentBadge, StudentProgress, TestResult, VideoLesson, LessonRecording, MeetingParticipant, Homework, HomeworkSubmission, LessonMaterial, Achievement, StudentAchievement, SupportTicket, TicketMessage
 from accounts.models import User
 from payments.models import Payment
+from crm.analytics import TeacherAnalytics
 from .serializers import (
     CourseSerializer, 
     GroupSerializer, 
     LessonSerializer, 
+    LessonSeriesSerializer,
     AttendanceSerializer,
     ScheduleSerializer,
     BadgeSerializer,
@@ -44,6 +50,10 @@ from .permissions import (
     CanManageSupportTicket
 )
 from notifications.services import NotificationService
+from .feeds import FEED_CONTENT_TYPES, ScheduleFeed
+from .profiles import StudentProfileLoader
+from .scheduling import ConflictEngine
+from .services import AttendanceService, LessonSeriesService, ScheduleService, StudentDashboardService
 import requests
 import jwt
 import time
@@ -68,7 +78,7 @@ class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 class GroupListCreateView(generics.ListCreateAPIView):
     """Список групп и создание новой группы"""
-    queryset = Group.objects.filter(is_active=True)
+    queryset = Group.objects.filter(is_active=True).select_related('course', 'teacher').prefetch_related('students')
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -81,9 +91,18 @@ class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated, IsGroupTeacherOrAdmin]
 
+def save_lesson(serializer):
+    """Сохранение занятия; пересечение, пропущенное параллельным запросом, отклоняет ограничение БД"""
+    try:
+        with transaction.atomic():
+            serializer.save()
+    except IntegrityError:
+        raise ValidationError({'start_time': ['Время занятия пересекается с другим занятием']})
+
 class LessonListCreateView(generics.ListCreateAPIView):
     """Список занятий и создание нового занятия"""
-    queryset = Lesson.objects.all()
+    # Составы групп и оплаты LessonSerializer загружает один раз на страницу
+    queryset = Lesson.objects.select_related('group', 'student', 'teacher')
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -91,12 +110,18 @@ class LessonListCreateView(generics.ListCreateAPIView):
     search_fields = ['title', 'description']
     ordering_fields = ['start_time', 'end_time']
     ordering = ['start_time']
+    
+    def perform_create(self, serializer):
+        save_lesson(serializer)
 
 class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Детали занятия"""
-    queryset = Lesson.objects.all()
+    queryset = Lesson.objects.select_related('group', 'student', 'teacher')
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated, IsLessonOwnerOrAdmin]
+    
+    def perform_update(self, serializer):
+        save_lesson(serializer)
 
 class AttendanceListCreateView(generics.ListCreateAPIView):
     """Список посещений и отметка посещения"""
@@ -123,37 +148,22 @@ class ScheduleView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Lesson.objects.filter(start_time__gte=timezone.now())
+        now = timezone.now()
         
         if user.is_admin:
-            return queryset
+            queryset = Lesson.objects.filter(start_time__gte=now)
         elif user.is_teacher:
-            return queryset.filter(teacher=user)
+            queryset = ScheduleService.lessons_for(user, 'teacher', since=now)
         elif user.is_student:
-            # Студент видит свои групповые и индивидуальные занятия
-            group_lessons = queryset.filter(
-                lesson_type='group',
-                group__students=user
-            )
-            individual_lessons = queryset.filter(
-                lesson_type='individual',
-                student=user
-            )
-            return group_lessons.union(individual_lessons)
+            # Групповые и индивидуальные занятия студента из материализованного расписания
+            queryset = ScheduleService.lessons_for(user, 'student', since=now)
         elif user.is_parent:
-            # Родитель видит занятия своих детей
-            children = user.children.all()
-            group_lessons = queryset.filter(
-                lesson_type='group',
-                group__students__in=children
-            )
-            individual_lessons = queryset.filter(
-                lesson_type='individual',
-                student__in=children
-            )
-            return group_lessons.union(individual_lessons)
+            # Занятия детей родителя (одна строка на занятие, даже если в нем несколько детей)
+            queryset = ScheduleService.lessons_for(user, 'parent', since=now)
+        else:
+            return Lesson.objects.none()
         
-        return Lesson.objects.none()
+        return queryset.select_related('group', 'group__course', 'student', 'teacher')
 
 class StudentScheduleView(generics.ListAPIView):
     """Расписание для конкретного студента"""
@@ -178,19 +188,12 @@ class StudentScheduleView(generics.ListAPIView):
         else:
             return Lesson.objects.none()
         
-        # Получаем занятия студента
-        group_lessons = Lesson.objects.filter(
-            lesson_type='group',
-            group__students=student,
-            start_time__gte=timezone.now()
-        )
-        individual_lessons = Lesson.objects.filter(
-            lesson_type='individual',
-            student=student,
-            start_time__gte=timezone.now()
-        )
-        
-        return group_lessons.union(individual_lessons).order_by('start_time')
+        # Групповые и индивидуальные занятия студента из материализованного расписания
+        return ScheduleService.lessons_for(
+            student,
+            'student',
+            since=timezone.now()
+        ).select_related('group', 'group__course', 'student', 'teacher').order_by('start_time')
 
 class TeacherScheduleView(generics.ListAPIView):
     """Расписание для преподавателя с детальной информацией"""
@@ -203,15 +206,186 @@ class TeacherScheduleView(generics.ListAPIView):
         
         # Проверка прав доступа
         if user.is_admin or (user.is_teacher and user.id == teacher_id):
-            return Lesson.objects.filter(
-                teacher_id=teacher_id,
-                start_time__gte=timezone.now()
-            ).select_related('group', 'group__course').prefetch_related(
-                'group__students'
-            ).order_by('start_time')
+            return ScheduleService.lessons_for(
+                teacher_id,
+                'teacher',
+                since=timezone.now()
+            ).select_related('group', 'group__course', 'student', 'teacher').order_by('start_time')
         
         return Lesson.objects.none()
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def schedule_feed(request, fmt):
+    """Лента расписания пользователя в формате iCalendar или JSON с поддержкой If-None-Match"""
+    if fmt not in FEED_CONTENT_TYPES:
+        return Response({'error': 'Неизвестный формат ленты'}, status=status.HTTP_404_NOT_FOUND)
+    
+    user = request.user
+    if user.is_teacher:
+        role = 'teacher'
+    elif user.is_student:
+        role = 'student'
+    elif user.is_parent:
+        role = 'parent'
+    else:
+        return Response(
+            {'error': 'Лента расписания доступна участникам занятий'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    # Версия расписания хранится в кеше - неизмененная лента отдается без запросов к занятиям
+    since = ScheduleFeed.window_start()
+    version = ScheduleFeed.version(user.id)
+    etag = ScheduleFeed.etag(user.id, role, fmt, since, version)
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+    else:
+        body = cache.get(ScheduleFeed.cache_key(user.id, role, fmt, since, version))
+        if body is not None:
+            response = HttpResponse(body, content_type=FEED_CONTENT_TYPES[fmt])
+        else:
+            response = StreamingHttpResponse(
+                ScheduleFeed.stream(user.id, role, fmt, since, version),
+                content_type=FEED_CONTENT_TYPES[fmt]
+            )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsTeacherOrAdmin])
+def import_lessons(request):
+    """Массовое создание занятий с проверкой пересечений всего набора"""
+    serializer = LessonSerializer(
+        data=request.data.get('lessons', []),
+        many=True,
+        context={'request': request, 'skip_conflict_check': True}
+    )
+    serializer.is_valid(raise_exception=True)
+    
+    # Набор проверяется одной выборкой из БД и индексом интервалов в памяти
+    conflicts = ConflictEngine.validate([Lesson(**item) for item in serializer.validated_data])
+    if conflicts:
+        return Response(
+            {'error': 'Занятия пересекаются с расписанием', 'conflicts': conflicts},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        with transaction.atomic():
+            lessons = serializer.save()
+    except IntegrityError:
+        return Response(
+            {'error': 'Время занятия пересекается с другим занятием'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response({
+        'message': f'Создано занятий: {len(lessons)}',
+        'lesson_ids': [lesson.id for lesson in lessons]
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_teacher_free_slots(request, teacher_id):
+    """Свободные окна преподавателя за период (?date_from=&date_to=&duration=минуты)"""
+    user = request.user
+    if not (user.is_admin or (user.is_teacher and user.id == teacher_id)):
+        return Response(
+            {'error': 'Нет прав для просмотра расписания преподавателя'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    try:
+        date_from = datetime.strptime(request.query_params['date_from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.query_params['date_to'], '%Y-%m-%d').date()
+        duration = int(request.query_params.get('duration', 60))
+    except (KeyError, ValueError):
+        return Response(
+            {'error': 'Укажите date_from и date_to в формате ГГГГ-ММ-ДД и длительность в минутах'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if date_to < date_from or (date_to - date_from).days > 31 or duration <= 0:
+        return Response(
+            {'error': 'Период - не больше 31 дня, длительность - положительное число минут'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    slots = ConflictEngine.free_slots(teacher_id, date_from, date_to, timedelta(minutes=duration))
+    return Response({
+        'teacher_id': teacher_id,
+        'duration': duration,
+        'slots': slots
+    })
+
+class LessonSeriesListCreateView(generics.ListCreateAPIView):
+    """Регулярные занятия групп; при создании занятия создаются на горизонт планирования"""
+    serializer_class = LessonSeriesSerializer
+    permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['group', 'teacher', 'is_active']
+    
+    def get_queryset(self):
+        queryset = LessonSeries.objects.select_related('group', 'teacher')
+        if self.request.user.is_admin:
+            return queryset
+        return queryset.filter(teacher=self.request.user)
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        group = serializer.validated_data['group']
+        if not request.user.is_admin and group.teacher_id != request.user.id:
+            return Response(
+                {'error': 'Можно планировать занятия только своих групп'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        with transaction.atomic():
+            series = serializer.save()
+            result = LessonSeriesService.materialize(series)
+        return Response({
+            **self.get_serializer(series).data,
+            'lessons_created': result['created'],
+            'skipped': result['skipped']
+        }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsTeacherOrAdmin])
+def update_lesson_series_following(request, series_id):
+    """Изменение занятий серии «это и следующие» начиная с from_date"""
+    series = get_object_or_404(LessonSeries, id=series_id)
+    if not request.user.is_admin and series.teacher_id != request.user.id:
+        return Response(
+            {'error': 'Нет прав для изменения серии'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    try:
+        from_date = datetime.strptime(request.data['from_date'], '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {'error': 'Укажите from_date в формате ГГГГ-ММ-ДД'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    serializer = LessonSeriesSerializer(series, data=request.data, partial=True)
+    serializer.is_valid(raise_exception=True)
+    with transaction.atomic():
+        target, result = LessonSeriesService.update_following(series, from_date, serializer.validated_data)
+    if target is None:
+        return Response(
+            {'error': 'Занятия пересекаются с расписанием', 'conflicts': result},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({
+        **LessonSeriesSerializer(target).data,
+        'lessons_created': result['created'],
+        'lessons_updated': result['updated'],
+        'skipped': result['skipped']
+    })
+
 # === НОВЫЕ ВЬЮХИ ДЛЯ ПРЕПОДАВАТЕЛЯ ===
 
 # 1. API для бейджей
@@ -289,40 +463,20 @@ def mark_attendance_with_comment(request):
         lesson = Lesson.objects.get(id=lesson_id)
         
         # Проверка прав доступа
-        if not (request.user.is_admin or lesson.teacher == request.user):
+        if not (request.user.is_admin or lesson.teacher_id == request.user.id):
             return Response(
                 {'error': 'Нет прав для отметки посещений'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        created_attendances = []
-        for data in attendance_data:
-            student_id = data.get('student_id')
-            status_value = data.get('status', 'present')
-            comment = data.get('comment', '')
-            
-            # Создаем или обновляем запись посещения
-            attendance, created = Attendance.objects.update_or_create(
-                lesson=lesson,
-                student_id=student_id,
-                defaults={
-                    'status': status_value,
-                    'comment': comment
-                }
+        # Состав проверяется одним запросом, отметки записываются одним upsert
+        marks, errors = AttendanceService.normalize(lesson, attendance_data, comment_field='comment')
+        if errors:
+            return Response(
+                {'error': 'Некорректные отметки посещений', 'details': errors},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Отправляем уведомление студенту
-            student = User.objects.get(id=student_id)
-            if comment:
-                NotificationService.send_notification(
-                    user=student,
-                    title=f'Комментарий к занятию: {lesson.title}',
-                    message=f'Преподаватель оставил комментарий: {comment}',
-                    notification_type='info',
-                    channels=['email', 'in_app']
-                )
-            
-            created_attendances.append(attendance)
+        created_attendances = AttendanceService.mark(lesson, marks, notify_comments=True)
         
         serializer = AttendanceSerializer(created_attendances, many=True)
         return Response({
@@ -344,82 +498,30 @@ def mark_attendance_with_comment(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_student_detailed_info(request, student_id):
-    """Детальная информация о студенте (для преподавателя)"""
+    """Детальная информация о студенте (для преподавателя); ?fields=progress,badges,test_results"""
     try:
-        student = User.objects.get(id=student_id, role='student')
+        loader = StudentProfileLoader.from_param(request.query_params.get('fields'))
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        # Студент и выбранные разделы - фиксированное число запросов
+        student = loader.load(student_id)
         user = request.user
         
         # Проверка прав доступа
         if not (user.is_admin or 
                 user.is_teacher or 
-                (user.is_parent and student.parent == user)):
+                (user.is_parent and student.parent_id == user.id)):
             return Response(
                 {'error': 'Нет прав для просмотра информации о студенте'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Получаем информацию о студенте
-        student_data = {
-            'id': student.id,
-            'username': student.username,
-            'full_name': student.get_full_name(),
-            'email': student.email,
-            'birth_date': student.birth_date,
-            'phone': student.phone,
-            'avatar': student.avatar.url if student.avatar else None,
-        }
-        
-        # Прогресс по курсам
-        progress_data = []
-        for progress in StudentProgress.objects.filter(student=student):
-            progress_data.append({
-                'course': {
-                    'id': progress.course.id,
-                    'title': progress.course.title,
-                },
-                'completed_topics': progress.completed_topics,
-                'current_level': progress.current_level,
-                'overall_progress': progress.overall_progress,
-                'last_activity': progress.last_activity,
-            })
-        
-        # Бейджи
-        badges_data = []
-        for badge in StudentBadge.objects.filter(student=student):
-            badges_data.append({
-                'id': badge.id,
-                'badge': {
-                    'id': badge.badge.id,
-                    'name': badge.badge.name,
-                    'description': badge.badge.description,
-                    'badge_type': badge.badge.badge_type,
-                    'icon': badge.badge.icon.url if badge.badge.icon else None,
-                },
-                'awarded_at': badge.awarded_at,
-                'awarded_by': badge.awarded_by.get_full_name(),
-                'comment': badge.comment,
-            })
-        
-        # Результаты тестов
-        test_results_data = []
-        for test_result in TestResult.objects.filter(student=student):
-            test_results_data.append({
-                'test_name': test_result.test_name,
-                'score': test_result.score,
-                'max_score': test_result.max_score,
-                'date_taken': test_result.date_taken,
-                'course': {
-                    'id': test_result.course.id,
-                    'title': test_result.course.title,
-                },
-            })
-        
-        return Response({
-            'student': student_data,
-            'progress': progress_data,
-            'badges': badges_data,
-            'test_results': test_results_data,
-        })
+        return Response(loader.serialize(student))
         
     except User.DoesNotExist:
         return Response(
@@ -848,7 +950,7 @@ def get_lesson_chat_messages(request, lesson_id):
         user = request.user
         if not (user.is_admin or 
                 lesson.teacher == user or
-                (lesson.lesson_type == 'group' and user in lesson.group.students.all()) or
+                (lesson.lesson_type == 'group' and lesson.group.students.filter(id=user.id).exists()) or
                 (lesson.lesson_type == 'individual' and lesson.student == user)):
             return Response(
                 {'error': 'Нет прав для доступа к чату'},
@@ -857,22 +959,22 @@ def get_lesson_chat_messages(request, lesson_id):
         
         # Получаем сообщения из чата урока
         # В реальности - это будет через WebSocket
-        # Здесь возвращаем последние 50 сообщений из чата группы
-        from chat.models import ChatRoom, Message
+        # Здесь возвращаем последние сообщения из чата группы
+        from chat.models import Message
+        from chat.pagination import MessageKeysetPagination
+        from chat.services import LessonChatService
         
         if lesson.lesson_type == 'group' and lesson.group:
-            # Ищем чат группы
-            chat_room, created = ChatRoom.objects.get_or_create(
-                name=f"Урок: {lesson.title}",
-                chat_type='group',
-                created_by=lesson.teacher
-            )
-            # Добавляем участников
-            for student in lesson.group.students.all():
-                chat_room.participants.add(student)
-            chat_room.participants.add(lesson.teacher)
+            # Чат создается вместе с занятием, участники синхронизируются с группой сигналами
+            chat_room = LessonChatService.get_room(lesson)
             
-            messages = Message.objects.filter(room=chat_room).order_by('-created_at')[:50]
+            # Страница по ключу (created_at, id): ?before=<id> листает историю без OFFSET
+            paginator = MessageKeysetPagination()
+            messages = paginator.paginate_queryset(
+                Message.objects.filter(room=chat_room).select_related('sender'),
+                request
+            )
+            # Новые сообщения первыми, как и раньше
             message_data = [
                 {
                     'id': msg.id,
@@ -881,13 +983,15 @@ def get_lesson_chat_messages(request, lesson_id):
                     'created_at': msg.created_at,
                     'message_type': msg.message_type
                 }
-                for msg in messages
+                for msg in reversed(messages)
             ]
             
             return Response({
                 'lesson_id': lesson.id,
                 'chat_room_id': chat_room.id,
-                'messages': message_data
+                'messages': message_data,
+                'has_older': paginator.has_older,
+                'has_newer': paginator.has_newer
             })
         else:
             return Response({
@@ -917,7 +1021,7 @@ def send_lesson_chat_message(request, lesson_id):
         user = request.user
         if not (user.is_admin or 
                 lesson.teacher == user or
-                (lesson.lesson_type == 'group' and user in lesson.group.students.all()) or
+                (lesson.lesson_type == 'group' and lesson.group.students.filter(id=user.id).exists()) or
                 (lesson.lesson_type == 'individual' and lesson.student == user)):
             return Response(
                 {'error': 'Нет прав для отправки сообщений'},
@@ -931,23 +1035,12 @@ def send_lesson_chat_message(request, lesson_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Создаем чат комнату для урока
-        from chat.models import ChatRoom, Message
+        # Чат урока (создается вместе с занятием, участники синхронизируются с группой)
+        from chat.events import message_event, publish_room_event
+        from chat.models import Message
+        from chat.services import LessonChatService
         
-        chat_room, created = ChatRoom.objects.get_or_create(
-            name=f"Урок: {lesson.title}",
-            chat_type='group',
-            created_by=lesson.teacher
-        )
-        
-        # Добавляем участников
-        if lesson.lesson_type == 'group' and lesson.group:
-            for student in lesson.group.students.all():
-                chat_room.participants.add(student)
-        elif lesson.lesson_type == 'individual' and lesson.student:
-            chat_room.participants.add(lesson.student)
-        
-        chat_room.participants.add(lesson.teacher)
+        chat_room = LessonChatService.get_room(lesson)
         
         # Создаем сообщение
         message = Message.objects.create(
@@ -957,8 +1050,8 @@ def send_lesson_chat_message(request, lesson_id):
             message_type='text'
         )
         
-        # В реальности - отправка через WebSocket
-        # Здесь просто возвращаем сообщение
+        # Участники чата получают сообщение через WebSocket, как отправленное из чата
+        publish_room_event(chat_room.id, 'message', message_event(message))
         
         return Response({
             'message': 'Сообщение отправлено',
@@ -1392,40 +1485,25 @@ def get_student_progress_dashboard(request):
     user = request.user
     
     if user.is_student:
-        # Прогресс для студента
+        # Прогресс для студента: счетчики читаются из снимка по первичному ключу
         progress_data = {
             'student_id': user.id,
             'student_name': user.get_full_name(),
-            'total_courses': user.learning_groups.values('course').distinct().count(),
-            'total_lessons': Lesson.objects.filter(
-                models.Q(group__students=user) | models.Q(student=user)
-            ).count(),
-            'completed_lessons': Attendance.objects.filter(
-                student=user,
-                status='present'
-            ).count(),
-            'total_homework': HomeworkSubmission.objects.filter(student=user).count(),
-            'submitted_homework': HomeworkSubmission.objects.filter(
-                student=user,
-                grade__isnull=False
-            ).count(),
-            'total_badges': StudentBadge.objects.filter(student=user).count(),
-            'total_achievements': StudentAchievement.objects.filter(student=user).count(),
+            **StudentDashboardService.get(user.id),
         }
         
         return Response(progress_data)
     elif user.is_teacher:
         # Статистика для преподавателя
+        # Все показатели одним запросом, студенты нескольких групп считаются один раз
+        stats = TeacherAnalytics.for_teacher(user)
         teacher_stats = {
             'teacher_id': user.id,
             'teacher_name': user.get_full_name(),
-            'total_groups': Group.objects.filter(teacher=user).count(),
-            'total_students': Group.objects.filter(teacher=user).values('students').count(),
-            'total_lessons': Lesson.objects.filter(teacher=user).count(),
-            'graded_homework': HomeworkSubmission.objects.filter(
-                homework__lesson__teacher=user,
-                grade__isnull=False
-            ).count(),
+            'total_groups': stats['total_groups'],
+            'total_students': stats['total_students'],
+            'total_lessons': stats['lessons_conducted'],
+            'graded_homework': stats['graded_homework'],
         }
         
         return Response(teacher_stats)
@@ -1448,28 +1526,20 @@ def mark_attendance(request):
         lesson = Lesson.objects.get(id=lesson_id)
         
         # Проверка прав доступа
-        if not (request.user.is_admin or lesson.teacher == request.user):
+        if not (request.user.is_admin or lesson.teacher_id == request.user.id):
             return Response(
                 {'error': 'Нет прав для отметки посещений'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        created_attendances = []
-        for data in attendance_data:
-            student_id = data.get('student_id')
-            status_value = data.get('status', 'present')
-            notes = data.get('notes', '')
-            
-            # Создаем или обновляем запись посещения
-            attendance, created = Attendance.objects.update_or_create(
-                lesson=lesson,
-                student_id=student_id,
-                defaults={
-                    'status': status_value,
-                    'comment': notes  # Обновлено: теперь используется поле comment
-                }
+        # Заметки старой версии API сохраняются в поле comment
+        marks, errors = AttendanceService.normalize(lesson, attendance_data, comment_field='notes')
+        if errors:
+            return Response(
+                {'error': 'Некорректные отметки посещений', 'details': errors},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            created_attendances.append(attendance)
+        created_attendances = AttendanceService.mark(lesson, marks)
         
         serializer = AttendanceSerializer(created_attendances, many=True)
         return Response({
@@ -0,0 +1,96 @@
+from decimal import Decimal
+from django.db.models import Avg, Count, DecimalField, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from accounts.models import User
+from courses.models import Group, HomeworkSubmission, Lesson
+from feedback.models import Feedback
+from payments.models import Payment
+
+def teacher_aggregate(queryset, teacher_field, aggregate, output_field, default=0):
+    """Агрегат по преподавателю подзапросом: соединения разных таблиц не размножают строки друг друга"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{teacher_field: OuterRef('pk')})
+            .order_by()
+            .values(teacher_field)
+            .annotate(value=aggregate)
+            .values('value')[:1],
+            output_field=output_field
+        ),
+        default,
+        output_field=output_field
+    )
+
+class TeacherAnalytics:
+    """Статистика преподавателей: все показатели одним запросом, для одного или всех преподавателей"""
+    
+    @staticmethod
+    def annotate(queryset, period_start=None, period_end=None):
+        """Показатели преподавателей (период ограничивает проведенные занятия)"""
+        lessons = Lesson.objects.all()
+        if period_start:
+            lessons = lessons.filter(start_time__gte=period_start)
+        if period_end:
+            lessons = lessons.filter(start_time__lte=period_end)
+        
+        # Оплаты курсов, по которым у преподавателя есть группы; каждая оплата учитывается
+        # один раз, даже если групп курса у преподавателя несколько
+        teacher_payments = Payment.objects.filter(
+            status='paid',
+            course__in=Group.objects.filter(teacher=OuterRef(OuterRef('pk'))).values('course')
+        ).order_by().values('status').annotate(value=Sum('amount')).values('value')[:1]
+        
+        return queryset.annotate(
+            total_groups=teacher_aggregate(Group.objects.all(), 'teacher', Count('id'), IntegerField()),
+            # Студент нескольких групп преподавателя считается один раз
+            total_students=teacher_aggregate(
+                Group.students.through.objects.all(), 'group__teacher', Count('user', distinct=True), IntegerField()
+            ),
+            lessons_conducted=teacher_aggregate(lessons, 'teacher', Count('id'), IntegerField()),
+            graded_homework=teacher_aggregate(
+                HomeworkSubmission.objects.filter(grade__isnull=False), 'homework__lesson__teacher', Count('id'), IntegerField()
+            ),
+            average_rating=teacher_aggregate(
+                Feedback.objects.filter(rating__isnull=False), 'teacher', Avg('rating'), FloatField(), default=0.0
+            ),
+            total_earnings=Coalesce(
+                Subquery(teacher_payments, output_field=DecimalField(max_digits=12, decimal_places=2)),
+                Decimal('0'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        )
+    
+    @staticmethod
+    def to_dict(teacher):
+        return {
+            'teacher_id': teacher.id,
+            'teacher_name': teacher.get_full_name(),
+            'total_groups': teacher.total_groups,
+            'total_students': teacher.total_students,
+            'average_rating': round(float(teacher.average_rating), 2),
+            'lessons_conducted': teacher.lessons_conducted,
+            'graded_homework': teacher.graded_homework,
+            'total_earnings': teacher.total_earnings,
+        }
+    
+    @staticmethod
+    def for_teacher(teacher, period_start=None, period_end=None):
+        """Показатели одного преподавателя"""
+        teacher = TeacherAnalytics.annotate(
+            User.objects.filter(pk=teacher.pk),
+            period_start,
+            period_end
+        ).get()
+        return TeacherAnalytics.to_dict(teacher)
+    
+    @staticmethod
+    def for_all(period_start=None, period_end=None):
+        """Показатели всех преподавателей одним запросом (дашборды администратора)"""
+        return [
+            TeacherAnalytics.to_dict(teacher)
+            for teacher in TeacherAnalytics.annotate(
+                User.objects.filter(role='teacher').order_by('last_name', 'first_name', 'id'),
+                period_start,
+                period_end
+            )
+        ]
\ No newline at end of file
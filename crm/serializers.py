@@ -68,7 +68,8 @@ class TeacherPerformanceSerializer(serializers.Serializer):
     total_students = serializers.IntegerField()
     average_rating = serializers.FloatField()
     lessons_conducted = serializers.IntegerField()
-    total_earnings = serializers.DecimalField(max_digits=10, decimal_places=2)
+    graded_homework = serializers.IntegerField()
+    total_earnings = serializers.DecimalField(max_digits=12, decimal_places=2)
 
 class FinancialReportSerializer(serializers.Serializer):
     """Сериализатор для финансового отчета"""
@@ -2,6 +2,7 @@ from django.utils import timezone
 from django.db.models import Count, Avg, Sum, Q
 from django.db import models
 from datetime import datetime, timedelta
+from .analytics import TeacherAnalytics
 from .models import StudentProfile, TeacherProfile, Lead, StudentActivity, AnalyticsReport
 from accounts.models import User
 from courses.models import Course, Group, Lesson, Attendance
@@ -136,41 +137,32 @@ class CRMService:
         if not period_end:
             period_end = timezone.now()
         
-        # Группы преподавателя
-        groups = Group.objects.filter(teacher=teacher)
-        total_groups = groups.count()
-        
-        # Общее количество студентов
-        total_students = groups.aggregate(
-            total=Count('students')
-        )['total'] or 0
-        
-        # Средняя оценка преподавателя
-        avg_rating = Feedback.objects.filter(
-            teacher=teacher,
-            rating__isnull=False
-        ).aggregate(avg=Avg('rating'))['avg'] or 0
-        
-        # Проведенные занятия
-        lessons_conducted = Lesson.objects.filter(
-            teacher=teacher,
-            start_time__range=[period_start, period_end]
-        ).count()
+        # Все показатели - одним запросом, студенты нескольких групп считаются один раз
+        return TeacherAnalytics.for_teacher(teacher, period_start, period_end)
+    
+    @staticmethod
+    def get_teachers_performance(period_start=None, period_end=None):
+        """Эффективность всех преподавателей одним запросом"""
+        if not period_start:
+            period_start = timezone.now() - timedelta(days=365)
+        if not period_end:
+            period_end = timezone.now()
         
-        # Общий доход
-        total_earnings = Payment.objects.filter(
-            course__groups__teacher=teacher,
-            status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        return TeacherAnalytics.for_all(period_start, period_end)
+    
+    @staticmethod
+    def generate_teacher_performance_report(period_start, period_end):
+        """Генерация отчета по эффективности преподавателей"""
+        teachers = TeacherAnalytics.for_all(period_start, period_end)
         
         return {
-            'teacher_id': teacher.id,
-            'teacher_name': teacher.get_full_name(),
-            'total_groups': total_groups,
-            'total_students': total_students,
-            'average_rating': round(float(avg_rating), 2),
-            'lessons_conducted': lessons_conducted,
-            'total_earnings': float(total_earnings)
+            'period_start': period_start,
+            'period_end': period_end,
+            'total_teachers': len(teachers),
+            'teachers': [
+                dict(teacher, total_earnings=float(teacher['total_earnings']))
+                for teacher in teachers
+            ]
         }
     
     @staticmethod
@@ -1,7 +1,7 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
+from notifications.services import EmailQueueService
 from django.utils import timezone
 from accounts.models import User, StudentProfile, TeacherProfile  # ← Исправлено: импортируем из accounts
 from courses.models import Course, Group, Lesson, Attendance
@@ -14,35 +14,29 @@ def notify_lead_created(sender, instance, created, **kwargs):
     if created:
         # Отправляем уведомление администраторам
         admin_users = User.objects.filter(role='admin')
+        datatuple = []
         for admin in admin_users:
             if admin.email:
-                try:
-                    subject = f'Новый лид: {instance.first_name} {instance.last_name}'
-                    message = f'''
-                    Здравствуйте, {admin.get_full_name() or admin.username}!
-                    
-                    Получен новый лид:
-                    Имя: {instance.first_name} {instance.last_name}
-                    Email: {instance.email}
-                    Телефон: {instance.phone or 'Не указан'}
-                    Интересующий курс: {instance.interested_course.title if instance.interested_course else 'Не указан'}
-                    Статус: {instance.get_status_display()}
-                    Источник: {instance.get_source_display()}
-                    
-                    Пожалуйста, свяжитесь с клиентом в ближайшее время.
-                    
-                    С уважением,
-                    Онлайн-школа
-                    '''
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [admin.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки email: {e}")
+                subject = f'Новый лид: {instance.first_name} {instance.last_name}'
+                message = f'''
+                Здравствуйте, {admin.get_full_name() or admin.username}!
+                
+                Получен новый лид:
+                Имя: {instance.first_name} {instance.last_name}
+                Email: {instance.email}
+                Телефон: {instance.phone or 'Не указан'}
+                Интересующий курс: {instance.interested_course.title if instance.interested_course else 'Не указан'}
+                Статус: {instance.get_status_display()}
+                Источник: {instance.get_source_display()}
+                
+                Пожалуйста, свяжитесь с клиентом в ближайшее время.
+                
+                С уважением,
+                Онлайн-школа
+                '''
+                datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [admin.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='crm.lead_created')
 
 @receiver(post_save, sender=StudentActivity)
 def notify_student_activity(sender, instance, created, **kwargs):
@@ -52,28 +46,25 @@ def notify_student_activity(sender, instance, created, **kwargs):
         
         # Отправляем уведомление родителям
         if student.parent and student.parent.email:
-            try:
-                subject = f'Активность студента: {student.get_full_name()}'
-                message = f'''
-                Здравствуйте, {student.parent.get_full_name() or student.parent.username}!
-                
-                Ваш ребенок {student.get_full_name()} выполнил активность:
-                Тип: {instance.get_activity_type_display()}
-                Описание: {instance.description}
-                Дата: {instance.created_at.strftime('%d.%m.%Y %H:%M')}
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.parent.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email родителю: {e}")
+            subject = f'Активность студента: {student.get_full_name()}'
+            message = f'''
+            Здравствуйте, {student.parent.get_full_name() or student.parent.username}!
+            
+            Ваш ребенок {student.get_full_name()} выполнил активность:
+            Тип: {instance.get_activity_type_display()}
+            Описание: {instance.description}
+            Дата: {instance.created_at.strftime('%d.%m.%Y %H:%M')}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [student.parent.email],
+                source='crm.student_activity'
+            )
 
 @receiver(post_save, sender=SupportTicket)
 def notify_support_ticket_created(sender, instance, created, **kwargs):
@@ -83,35 +74,29 @@ def notify_support_ticket_created(sender, instance, created, **kwargs):
         
         # Отправляем уведомление администраторам
         admin_users = User.objects.filter(role='admin')
+        datatuple = []
         for admin in admin_users:
             if admin.email:
-                try:
-                    subject = f'Новый тикет поддержки: {instance.title}'
-                    message = f'''
-                    Здравствуйте, {admin.get_full_name() or admin.username}!
-                    
-                    Получен новый тикет поддержки:
-                    Пользователь: {user.get_full_name() or user.username}
-                    Тема: {instance.title}
-                    Описание: {instance.description}
-                    Статус: {instance.get_status_display()}
-                    Приоритет: {instance.get_priority_display()}
-                    Дата: {instance.created_at.strftime('%d.%m.%Y %H:%M')}
-                    
-                    Пожалуйста, рассмотрите тикет в ближайшее время.
-                    
-                    С уважением,
-                    Служба поддержки
-                    '''
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [admin.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки email админу: {e}")
+                subject = f'Новый тикет поддержки: {instance.title}'
+                message = f'''
+                Здравствуйте, {admin.get_full_name() or admin.username}!
+                
+                Получен новый тикет поддержки:
+                Пользователь: {user.get_full_name() or user.username}
+                Тема: {instance.title}
+                Описание: {instance.description}
+                Статус: {instance.get_status_display()}
+                Приоритет: {instance.get_priority_display()}
+                Дата: {instance.created_at.strftime('%d.%m.%Y %H:%M')}
+                
+                Пожалуйста, рассмотрите тикет в ближайшее время.
+                
+                С уважением,
+                Служба поддержки
+                '''
+                datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [admin.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='crm.support_ticket_created')
 
 @receiver(post_save, sender=TicketMessage)
 def notify_ticket_message(sender, instance, created, **kwargs):
@@ -132,26 +117,20 @@ def notify_ticket_message(sender, instance, created, **kwargs):
             recipients.append(ticket.assigned_to)
         
         # Отправляем уведомления
+        datatuple = []
         for recipient in recipients:
-            try:
-                subject = f'Новое сообщение в тикете: {ticket.title}'
-                message = f'''
-                Здравствуйте, {recipient.get_full_name() or recipient.username}!
-                
-                {sender_user.get_full_name() or sender_user.username} отправил новое сообщение в тикет "{ticket.title}":
-                "{instance.content[:100]}{'...' if len(instance.content) > 100 else ''}"
-                
-                Перейдите в тикет, чтобы ответить.
-                
-                С уважением,
-                Служба поддержки
-                '''
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [recipient.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
\ No newline at end of file
+            subject = f'Новое сообщение в тикете: {ticket.title}'
+            message = f'''
+            Здравствуйте, {recipient.get_full_name() or recipient.username}!
+            
+            {sender_user.get_full_name() or sender_user.username} отправил новое сообщение в тикет "{ticket.title}":
+            "{instance.content[:100]}{'...' if len(instance.content) > 100 else ''}"
+            
+            Перейдите в тикет, чтобы ответить.
+            
+            С уважением,
+            Служба поддержки
+            '''
+            datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [recipient.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='crm.ticket_message')
\ No newline at end of file
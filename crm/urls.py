@@ -12,6 +12,7 @@ from .views import (
     convert_lead,
     student_performance,
     teacher_performance,
+    teachers_performance,
     financial_report,
     lead_report,
     generate_analytics_report,
@@ -42,6 +43,7 @@ urlpatterns = [
     
     # Специализированные отчеты
     path('reports/student-performance/<int:student_id>/', student_performance, name='student-performance'),
+    path('reports/teacher-performance/', teachers_performance, name='teachers-performance'),
     path('reports/teacher-performance/<int:teacher_id>/', teacher_performance, name='teacher-performance'),
     path('reports/financial/', financial_report, name='financial-report'),
     path('reports/leads/', lead_report, name='lead-report'),
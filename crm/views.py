@@ -190,6 +190,28 @@ def teacher_performance(request, teacher_id):
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminOrManager])
+def teachers_performance(request):
+    """Эффективность всех преподавателей (один запрос на всю выборку)"""
+    try:
+        period_start = request.query_params.get('start_date')
+        period_end = request.query_params.get('end_date')
+        
+        if period_start:
+            period_start = datetime.strptime(period_start, '%Y-%m-%d').date()
+        if period_end:
+            period_end = datetime.strptime(period_end, '%Y-%m-%d').date()
+        
+        performance_data = CRMService.get_teachers_performance(period_start, period_end)
+        
+        serializer = TeacherPerformanceSerializer(performance_data, many=True)
+        return Response(serializer.data)
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def financial_report(request):
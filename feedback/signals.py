@@ -1,7 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
+from notifications.services import EmailQueueService
 from django.utils import timezone
 from .models import Feedback, FeedbackResponse, Survey, SurveyResponse
 
@@ -11,31 +11,28 @@ def notify_feedback_created(sender, instance, created, **kwargs):
     if created:
         # Уведомляем преподавателя, если отзыв о нем
         if instance.teacher and instance.teacher.email:
-            try:
-                subject = f'Новый отзыв о вас: {instance.title}'
-                message = f'''
-                Здравствуйте, {instance.teacher.get_full_name() or instance.teacher.username}!
-                
-                Студент {instance.student.get_full_name() or instance.student.username} оставил отзыв о вас:
-                Тема: {instance.title}
-                Содержание: {instance.content}
-                Оценка: {instance.rating if instance.rating else 'Не указана'}
-                
-                Пожалуйста, ознакомьтесь с отзывом в личном кабинете.
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [instance.teacher.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
+            subject = f'Новый отзыв о вас: {instance.title}'
+            message = f'''
+            Здравствуйте, {instance.teacher.get_full_name() or instance.teacher.username}!
+            
+            Студент {instance.student.get_full_name() or instance.student.username} оставил отзыв о вас:
+            Тема: {instance.title}
+            Содержание: {instance.content}
+            Оценка: {instance.rating if instance.rating else 'Не указана'}
+            
+            Пожалуйста, ознакомьтесь с отзывом в личном кабинете.
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [instance.teacher.email],
+                source='feedback.feedback_created'
+            )
 
 @receiver(post_save, sender=FeedbackResponse)
 def notify_feedback_response(sender, instance, created, **kwargs):
@@ -45,28 +42,25 @@ def notify_feedback_response(sender, instance, created, **kwargs):
         student = feedback.student
         
         if student.email:
-            try:
-                subject = f'Ответ на ваш отзыв: {feedback.title}'
-                message = f'''
-                Здравствуйте, {student.get_full_name() or student.username}!
-                
-                {instance.responder.get_full_name() or instance.responder.username} ответил на ваш отзыв:
-                Тема: {feedback.title}
-                Ответ: {instance.content}
-                
-                С уважением,
-                Онлайн-школа
-                '''
-                
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [student.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Ошибка отправки email: {e}")
+            subject = f'Ответ на ваш отзыв: {feedback.title}'
+            message = f'''
+            Здравствуйте, {student.get_full_name() or student.username}!
+            
+            {instance.responder.get_full_name() or instance.responder.username} ответил на ваш отзыв:
+            Тема: {feedback.title}
+            Ответ: {instance.content}
+            
+            С уважением,
+            Онлайн-школа
+            '''
+            
+            EmailQueueService.queue(
+                subject,
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                [student.email],
+                source='feedback.feedback_response'
+            )
 
 @receiver(post_save, sender=Survey)
 def notify_survey_available(sender, instance, created, **kwargs):
@@ -83,27 +77,20 @@ def notify_survey_response(sender, instance, created, **kwargs):
         from accounts.models import User
         admins = User.objects.filter(role='admin')
         
+        datatuple = []
         for admin in admins:
             if admin.email:
-                try:
-                    subject = f'Новый ответ на опрос: {instance.survey.title}'
-                    message = f'''
-                    Уважаемый администратор!
-                    
-                    Получен новый ответ на опрос "{instance.survey.title}".
-                    Респондент: {instance.respondent.get_full_name() if instance.respondent else 'Аноним'}
-                    Дата: {instance.submitted_at.strftime('%d.%m.%Y %H:%M')}
-                    
-                    С уважением,
-                    Система уведомлений
-                    '''
-                    
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [admin.email],
-                        fail_silently=True,
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки email: {e}")
\ No newline at end of file
+                subject = f'Новый ответ на опрос: {instance.survey.title}'
+                message = f'''
+                Уважаемый администратор!
+                
+                Получен новый ответ на опрос "{instance.survey.title}".
+                Респондент: {instance.respondent.get_full_name() if instance.respondent else 'Аноним'}
+                Дата: {instance.submitted_at.strftime('%d.%m.%Y %H:%M')}
+                
+                С уважением,
+                Система уведомлений
+                '''
+                datatuple.append((subject, message, settings.DEFAULT_FROM_EMAIL, [admin.email]))
+        
+        EmailQueueService.queue_mass(datatuple, source='feedback.survey_response')
\ No newline at end of file
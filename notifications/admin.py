@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog
+from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog, NotificationOutbox, BulkNotificationJob, OutgoingEmail
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['title', 'user', 'notification_type', 'channel', 'is_read', 'is_sent', 'created_at']
-    list_filter = ['notification_type', 'channel', 'is_read', 'is_sent', 'created_at']
-    search_fields = ['title', 'message', 'user__username', 'user__email']
+    list_display = ['title', 'user', 'notification_type', 'channel', 'delivery_status', 'is_read', 'created_at']
+    list_filter = ['notification_type', 'channel', 'delivery_status', 'is_read', 'is_sent', 'created_at']
+    search_fields = ['title', 'message', 'user__username', 'user__email', 'idempotency_key']
     readonly_fields = ['created_at', 'sent_at', 'read_at']
     date_hierarchy = 'created_at'
     
@@ -41,4 +41,26 @@ class NotificationLogAdmin(admin.ModelAdmin):
     list_display = ['notification', 'channel', 'status', 'created_at']
     list_filter = ['channel', 'status', 'created_at']
     search_fields = ['notification__title', 'error_message']
+    readonly_fields = ['created_at', 'sent_at']
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['notification', 'channel', 'status', 'attempts', 'available_at', 'processed_at']
+    list_filter = ['channel', 'status', 'created_at']
+    search_fields = ['notification__title', 'last_error']
+    readonly_fields = ['created_at', 'processed_at']
+    raw_id_fields = ['notification']
+
+@admin.register(BulkNotificationJob)
+class BulkNotificationJobAdmin(admin.ModelAdmin):
+    list_display = ['title', 'status', 'total_recipients', 'created_count', 'queued_count', 'created_at']
+    list_filter = ['status', 'notification_type', 'created_at']
+    search_fields = ['title', 'message']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'source', 'status', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['status', 'source', 'created_at']
+    search_fields = ['subject', 'last_error']
     readonly_fields = ['created_at', 'sent_at']
\ No newline at end of file
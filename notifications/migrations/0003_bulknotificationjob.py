@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0002_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkNotificationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Заголовок')),
+                ('message', models.TextField(verbose_name='Сообщение')),
+                ('notification_type', models.CharField(choices=[('info', 'Информация'), ('warning', 'Предупреждение'), ('error', 'Ошибка'), ('success', 'Успех'), ('lesson', 'Занятие'), ('payment', 'Платеж'), ('message', 'Сообщение'), ('system', 'Система')], default='info', max_length=20, verbose_name='Тип уведомления')),
+                ('channels', models.JSONField(default=list, verbose_name='Каналы отправки')),
+                ('user_ids', models.JSONField(blank=True, default=list, verbose_name='ID пользователей')),
+                ('roles', models.JSONField(blank=True, default=list, verbose_name='Роли')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('completed', 'Завершена'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('total_recipients', models.PositiveIntegerField(default=0, verbose_name='Всего получателей')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Создано уведомлений')),
+                ('queued_count', models.PositiveIntegerField(default=0, verbose_name='Поставлено в очередь доставки')),
+                ('skipped_count', models.PositiveIntegerField(default=0, verbose_name='Пропущено по настройкам')),
+                ('error_message', models.TextField(blank=True, verbose_name='Сообщение об ошибке')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата начала')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_notification_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Инициатор')),
+            ],
+            options={
+                'verbose_name': 'Массовая рассылка',
+                'verbose_name_plural': 'Массовые рассылки',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='bulk_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='notifications.bulknotificationjob', verbose_name='Массовая рассылка'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:19
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def set_existing_delivery_status(apps, schema_editor):
+    # Уведомления, созданные до очереди доставки, уже были обработаны
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.filter(Q(is_sent=True) | Q(channel='in_app')).update(delivery_status='sent')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_bulknotificationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='delivery_status',
+            field=models.CharField(choices=[('queued', 'В очереди'), ('sending', 'Отправляется'), ('sent', 'Доставлено'), ('failed', 'Ошибка доставки')], default='queued', max_length=20, verbose_name='Статус доставки'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='Ключ идемпотентности'),
+        ),
+        migrations.RunPython(set_existing_delivery_status, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
@@ -25,6 +26,13 @@ class Notification(models.Model):
         ('in_app', _('В приложении')),
     ]
     
+    DELIVERY_STATUS_CHOICES = [
+        ('queued', _('В очереди')),
+        ('sending', _('Отправляется')),
+        ('sent', _('Доставлено')),
+        ('failed', _('Ошибка доставки')),
+    ]
+    
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -58,6 +66,27 @@ class Notification(models.Model):
         default=False,
         verbose_name=_('Отправлено')
     )
+    delivery_status = models.CharField(
+        max_length=20,
+        choices=DELIVERY_STATUS_CHOICES,
+        default='queued',
+        verbose_name=_('Статус доставки')
+    )
+    idempotency_key = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name=_('Ключ идемпотентности')
+    )
+    bulk_job = models.ForeignKey(
+        'BulkNotificationJob',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name=_('Массовая рассылка')
+    )
     related_object_id = models.PositiveIntegerField(
         null=True,
         blank=True,
@@ -276,4 +305,231 @@ class NotificationLog(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Лог {self.notification} - {self.channel}"
\ No newline at end of file
+        return f"Лог {self.notification} - {self.channel}"
+
+class NotificationOutbox(models.Model):
+    """Транзакционная очередь доставки уведомлений по каналам"""
+    STATUS_CHOICES = [
+        ('queued', _('В очереди')),
+        ('sending', _('Отправляется')),
+        ('sent', _('Отправлено')),
+        ('failed', _('Ошибка')),
+        ('cancelled', _('Отменено')),
+    ]
+    
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name='outbox_entries',
+        verbose_name=_('Уведомление')
+    )
+    channel = models.CharField(
+        max_length=20,
+        choices=[
+            ('email', _('Email')),
+            ('push', _('Push-уведомление')),
+            ('telegram', _('Telegram')),
+            ('whatsapp', _('WhatsApp')),
+            ('sms', _('SMS')),
+        ],
+        verbose_name=_('Канал')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name=_('Статус')
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Количество попыток')
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Доступно для отправки с')
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_('Последняя ошибка')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата обработки')
+    )
+    
+    class Meta:
+        verbose_name = _('Очередь уведомлений')
+        verbose_name_plural = _('Очередь уведомлений')
+        ordering = ['available_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.notification} - {self.channel} ({self.get_status_display()})"
+
+
+class BulkNotificationJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', _('Ожидает')),
+        ('running', _('Выполняется')),
+        ('completed', _('Завершена')),
+        ('failed', _('Ошибка')),
+    ]
+    
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bulk_notification_jobs',
+        verbose_name=_('Инициатор')
+    )
+    title = models.CharField(
+        max_length=255,
+        verbose_name=_('Заголовок')
+    )
+    message = models.TextField(
+        verbose_name=_('Сообщение')
+    )
+    notification_type = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_TYPE_CHOICES,
+        default='info',
+        verbose_name=_('Тип уведомления')
+    )
+    channels = models.JSONField(
+        default=list,
+        verbose_name=_('Каналы отправки')
+    )
+    user_ids = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_('ID пользователей')
+    )
+    roles = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_('Роли')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_('Статус')
+    )
+    total_recipients = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Всего получателей')
+    )
+    created_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Создано уведомлений')
+    )
+    queued_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Поставлено в очередь доставки')
+    )
+    skipped_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Пропущено по настройкам')
+    )
+    error_message = models.TextField(
+        blank=True,
+        verbose_name=_('Сообщение об ошибке')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата начала')
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата завершения')
+    )
+    
+    class Meta:
+        verbose_name = _('Массовая рассылка')
+        verbose_name_plural = _('Массовые рассылки')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.title} ({self.get_status_display()})"
+
+class OutgoingEmail(models.Model):
+    STATUS_CHOICES = [
+        ('queued', _('В очереди')),
+        ('sending', _('Отправляется')),
+        ('sent', _('Отправлено')),
+        ('failed', _('Ошибка')),
+    ]
+    
+    subject = models.CharField(
+        max_length=255,
+        verbose_name=_('Тема')
+    )
+    body = models.TextField(
+        verbose_name=_('Текст письма')
+    )
+    from_email = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_('Отправитель')
+    )
+    recipients = models.JSONField(
+        default=list,
+        verbose_name=_('Получатели')
+    )
+    source = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_('Источник')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name=_('Статус')
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Количество попыток')
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Доступно для отправки с')
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_('Последняя ошибка')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Дата отправки')
+    )
+    
+    class Meta:
+        verbose_name = _('Исходящее письмо')
+        verbose_name_plural = _('Исходящие письма')
+        ordering = ['available_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
\ No newline at end of file
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog
+from django.db.models import Count, Q
+from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog, BulkNotificationJob, NotificationOutbox
 from accounts.models import User
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -8,7 +9,7 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
-        read_only_fields = ['created_at', 'sent_at', 'read_at', 'user']
+        read_only_fields = ['created_at', 'sent_at', 'read_at', 'user', 'delivery_status', 'idempotency_key']
 
 class NotificationCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -75,4 +76,26 @@ class BulkNotificationSerializer(serializers.Serializer):
         if not user_ids and not roles:
             raise serializers.ValidationError('Необходимо указать пользователей или роли')
         
-        return attrs
\ No newline at end of file
+        return attrs
+
+class BulkNotificationJobSerializer(serializers.ModelSerializer):
+    """Сериализатор задания массовой рассылки с прогрессом доставки"""
+    delivery = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BulkNotificationJob
+        fields = [
+            'id', 'title', 'notification_type', 'channels', 'status',
+            'total_recipients', 'created_count', 'queued_count', 'skipped_count',
+            'delivery', 'error_message', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_delivery(self, obj):
+        # Состояние очереди доставки по заданию одним агрегирующим запросом
+        return NotificationOutbox.objects.filter(notification__bulk_job=obj).aggregate(
+            sent=Count('id', filter=Q(status='sent')),
+            failed=Count('id', filter=Q(status='failed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            pending=Count('id', filter=Q(status__in=['queued', 'sending']))
+        )
\ No newline at end of file
@@ -1,147 +1,547 @@
 import logging
-from django.core.mail import send_mail
+from collections import defaultdict
+from itertools import islice
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
 from django.utils import timezone
-from .models import Notification, NotificationLog, UserNotificationSettings
+from .models import (
+    BulkNotificationJob, Notification, NotificationLog, NotificationOutbox, OutgoingEmail,
+    UserNotificationSettings
+)
 from accounts.models import User
 
 logger = logging.getLogger(__name__)
 
+# Каналы, которые доставляются воркером через очередь (in_app уже доставлен записью в БД)
+OUTBOX_CHANNELS = ('email', 'push', 'telegram', 'whatsapp', 'sms')
+
+# Маркер записи очереди, пропущенной из-за настроек пользователя
+SKIPPED = object()
+
+# Поля настроек с адресом получателя для каналов, которым он нужен
+CHANNEL_ADDRESS_FIELDS = {
+    'telegram': 'telegram_chat_id',
+    'whatsapp': 'whatsapp_phone',
+    'sms': 'sms_phone',
+}
+
 class NotificationService:
     """Сервис для отправки уведомлений"""
     
     @staticmethod
-    def send_notification(user, title, message, notification_type='info', channels=None):
-        """Отправка уведомления пользователю"""
+    def send_notification(user, title, message, notification_type='info', channels=None,
+                          idempotency_key=None):
+        """Отправка уведомления пользователю (единая точка постановки в доставку)"""
         if channels is None:
             channels = ['in_app']
         
-        # Создаем уведомление в БД
-        notification = Notification.objects.create(
+        # Повторный вызов с тем же ключом возвращает уже созданное уведомление
+        if idempotency_key:
+            existing = Notification.objects.filter(idempotency_key=idempotency_key).first()
+            if existing:
+                return existing
+        
+        outbox_channels = [channel for channel in channels if channel in OUTBOX_CHANNELS]
+        notification = Notification(
             user=user,
             title=title,
             message=message,
             notification_type=notification_type,
-            channel=channels[0] if channels else 'in_app'
+            channel=channels[0] if channels else 'in_app',
+            idempotency_key=idempotency_key
         )
+        if not outbox_channels:
+            NotificationService._mark_delivered(notification)
         
-        # Отправляем через указанные каналы
-        for channel in channels:
+        try:
+            with transaction.atomic():
+                notification.save()
+                # Доставка по внешним каналам выполняется воркером после коммита
+                NotificationService.enqueue_delivery([notification], outbox_channels)
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            # Параллельный вызов успел создать уведомление с тем же ключом
+            return Notification.objects.get(idempotency_key=idempotency_key)
+        return notification
+    
+    @staticmethod
+    def send_notifications(messages, notification_type='info', channels=None):
+        """Отправка пачки уведомлений с разным текстом: messages - список (user_id, title, message)"""
+        if channels is None:
+            channels = ['in_app']
+        outbox_channels = [channel for channel in channels if channel in OUTBOX_CHANNELS]
+        
+        notifications = []
+        for user_id, title, message in messages:
+            notification = Notification(
+                user_id=user_id,
+                title=title,
+                message=message,
+                notification_type=notification_type,
+                channel=channels[0] if channels else 'in_app'
+            )
+            if not outbox_channels:
+                NotificationService._mark_delivered(notification)
+            notifications.append(notification)
+        if not notifications:
+            return []
+        
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(notifications)
+            NotificationService.enqueue_delivery(notifications, outbox_channels)
+        return notifications
+    
+    @staticmethod
+    def _mark_delivered(notification):
+        """Уведомление только в приложении доставлено самой записью в БД"""
+        notification.delivery_status = 'sent'
+        notification.is_sent = True
+        notification.sent_at = timezone.now()
+    
+    @staticmethod
+    def enqueue_delivery(notifications, channels):
+        """Постановка уведомлений в очередь доставки по каналам"""
+        entries = [
+            NotificationOutbox(notification=notification, channel=channel)
+            for notification in notifications
+            for channel in channels
+            if channel in OUTBOX_CHANNELS
+        ]
+        if entries:
+            NotificationOutbox.objects.bulk_create(entries)
+            NotificationService.schedule_outbox_drain()
+        return entries
+    
+    @staticmethod
+    def schedule_outbox_drain():
+        """Запуск обработки очереди после коммита текущей транзакции"""
+        # Не ставим задачу повторно, пока предыдущая еще не забрала очередь
+        if not cache.add('notifications:outbox:drain-scheduled', True, timeout=10):
+            return
+        
+        def _enqueue():
+            from .tasks import drain_notification_outbox
+            drain_notification_outbox.delay()
+        
+        transaction.on_commit(_enqueue)
+    
+    @staticmethod
+    def process_outbox(batch_size=None):
+        """Обработка пачки очереди доставки, возвращает количество записей"""
+        batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 200)
+        lease = getattr(settings, 'NOTIFICATION_OUTBOX_LEASE_SECONDS', 300)
+        now = timezone.now()
+        
+        # Забираем пачку записей; записи в статусе sending с истекшей арендой
+        # (воркер упал) забираются повторно
+        with transaction.atomic():
+            entry_ids = list(
+                NotificationOutbox.objects.select_for_update(skip_locked=True).filter(
+                    status__in=['queued', 'sending'],
+                    available_at__lte=now
+                ).order_by('available_at').values_list('id', flat=True)[:batch_size]
+            )
+            if not entry_ids:
+                return 0
+            NotificationOutbox.objects.filter(id__in=entry_ids).update(
+                status='sending',
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=lease)
+            )
+            Notification.objects.filter(
+                outbox_entries__id__in=entry_ids,
+                delivery_status='queued'
+            ).update(delivery_status='sending')
+        
+        entries = list(
+            NotificationOutbox.objects.filter(id__in=entry_ids).select_related('notification__user')
+        )
+        user_ids = {entry.notification.user_id for entry in entries}
+        settings_map = {
+            item.user_id: item
+            for item in UserNotificationSettings.objects.filter(user_id__in=user_ids)
+        }
+        
+        # Группируем работу по каналам
+        by_channel = defaultdict(list)
+        for entry in entries:
+            by_channel[entry.channel].append(entry)
+        
+        results = {}
+        for channel, channel_entries in by_channel.items():
+            sender = getattr(NotificationService, f'_send_{channel}')
             try:
-                if channel == 'email':
-                    NotificationService._send_email(user, title, message, notification)
-                elif channel == 'telegram':
-                    NotificationService._send_telegram(user, title, message, notification)
-                elif channel == 'whatsapp':
-                    NotificationService._send_whatsapp(user, title, message, notification)
-                elif channel == 'sms':
-                    NotificationService._send_sms(user, title, message, notification)
-                elif channel == 'in_app':
-                    # In-app уведомление уже создано
-                    pass
-                
-                # Логируем успешную отправку
-                NotificationLog.objects.create(
-                    notification=notification,
-                    channel=channel,
+                results.update(sender(channel_entries, settings_map))
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомлений через {channel}: {str(e)}")
+                results.update({entry.id: str(e) for entry in channel_entries})
+        
+        NotificationService._store_results(entries, results)
+        return len(entries)
+    
+    @staticmethod
+    def _store_results(entries, results):
+        """Сохранение результатов доставки: логи, статусы очереди и уведомлений"""
+        now = timezone.now()
+        max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+        retry_delay = getattr(settings, 'NOTIFICATION_OUTBOX_RETRY_DELAY', 60)
+        
+        logs = []
+        sent_ids, cancelled_ids = [], []
+        retry_entries, failed_entries = [], []
+        for entry in entries:
+            result = results.get(entry.id)
+            if result is SKIPPED:
+                cancelled_ids.append(entry.id)
+                continue
+            if result is None:
+                sent_ids.append(entry.id)
+                logs.append(NotificationLog(
+                    notification_id=entry.notification_id,
+                    channel=entry.channel,
                     status='sent',
-                    sent_at=timezone.now()
+                    sent_at=now
+                ))
+                continue
+            logs.append(NotificationLog(
+                notification_id=entry.notification_id,
+                channel=entry.channel,
+                status='failed',
+                error_message=result
+            ))
+            entry.last_error = result
+            if entry.attempts >= max_attempts:
+                entry.status = 'failed'
+                entry.processed_at = now
+                failed_entries.append(entry)
+            else:
+                # Экспоненциальная задержка перед следующей попыткой
+                entry.status = 'queued'
+                entry.available_at = now + timedelta(seconds=retry_delay * 2 ** (entry.attempts - 1))
+                retry_entries.append(entry)
+        
+        with transaction.atomic():
+            NotificationLog.objects.bulk_create(logs)
+            if sent_ids:
+                NotificationOutbox.objects.filter(id__in=sent_ids).update(
+                    status='sent', processed_at=now, last_error=''
                 )
-                
-            except Exception as e:
-                logger.error(f"Ошибка отправки уведомления через {channel}: {str(e)}")
-                # Логируем ошибку
-                NotificationLog.objects.create(
-                    notification=notification,
-                    channel=channel,
-                    status='failed',
-                    error_message=str(e)
+            if cancelled_ids:
+                NotificationOutbox.objects.filter(id__in=cancelled_ids).update(
+                    status='cancelled', processed_at=now
                 )
-        
-        return notification
+            if retry_entries or failed_entries:
+                NotificationOutbox.objects.bulk_update(
+                    retry_entries + failed_entries,
+                    ['status', 'available_at', 'last_error', 'processed_at']
+                )
+            NotificationService._refresh_delivery_status({entry.notification_id for entry in entries})
     
     @staticmethod
-    def _send_email(user, title, message, notification):
-        """Отправка email уведомления"""
-        # Проверяем настройки пользователя
-        settings, created = UserNotificationSettings.objects.get_or_create(user=user)
-        if not settings.email_notifications:
-            return
+    def _refresh_delivery_status(notification_ids):
+        """Пересчет статуса доставки уведомлений по состоянию каналов в очереди"""
+        now = timezone.now()
+        stats = NotificationOutbox.objects.filter(notification_id__in=notification_ids).values(
+            'notification_id'
+        ).annotate(
+            pending=Count('id', filter=Q(status__in=['queued', 'sending'])),
+            sent=Count('id', filter=Q(status='sent')),
+            failed=Count('id', filter=Q(status='failed'))
+        )
         
-        if user.email:
-            try:
-                send_mail(
-                    subject=title,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user.email],
-                    fail_silently=False,
+        by_status = defaultdict(list)
+        for row in stats:
+            if row['pending']:
+                # Часть каналов ждет повторной попытки
+                by_status['queued'].append(row['notification_id'])
+            elif row['failed'] and not row['sent']:
+                by_status['failed'].append(row['notification_id'])
+            else:
+                by_status['sent'].append(row['notification_id'])
+        
+        if by_status['sent']:
+            Notification.objects.filter(id__in=by_status['sent']).update(
+                delivery_status='sent', is_sent=True, sent_at=now
+            )
+        for delivery_status in ('queued', 'failed'):
+            if by_status[delivery_status]:
+                Notification.objects.filter(id__in=by_status[delivery_status]).update(
+                    delivery_status=delivery_status
                 )
-            except Exception as e:
-                raise Exception(f"Ошибка отправки email: {str(e)}")
     
     @staticmethod
-    def _send_telegram(user, title, message, notification):
-        """Отправка Telegram уведомления"""
-        # Проверяем настройки пользователя
-        settings, created = UserNotificationSettings.objects.get_or_create(user=user)
-        if not settings.telegram_notifications or not settings.telegram_chat_id:
-            return
+    def _get_settings(settings_map, user):
+        """Настройки пользователя из заранее загруженной карты (или по умолчанию)"""
+        return settings_map.get(user.id) or UserNotificationSettings(user=user)
+    
+    @staticmethod
+    def _send_email(entries, settings_map):
+        """Отправка email уведомлений через одно SMTP соединение"""
+        results = {}
+        messages = []
+        for entry in entries:
+            user = entry.notification.user
+            user_settings = NotificationService._get_settings(settings_map, user)
+            if not user_settings.email_notifications or not user.email:
+                results[entry.id] = SKIPPED
+                continue
+            messages.append((entry, EmailMessage(
+                subject=entry.notification.title,
+                body=entry.notification.message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[user.email],
+            )))
+        
+        if not messages:
+            return results
         
-        # Здесь будет интеграция с Telegram Bot API
+        errors = EmailQueueService.deliver([email for entry, email in messages])
+        for (entry, email), error in zip(messages, errors):
+            results[entry.id] = f"Ошибка отправки email: {error}" if error else None
+        return results
+    
+    @staticmethod
+    def _send_push(entries, settings_map):
+        """Отправка push уведомлений"""
+        # Здесь будет интеграция с push-провайдером
         # Пока заглушка
-        logger.info(f"Telegram уведомление для {user.username}: {title}")
+        results = {}
+        for entry in entries:
+            user = entry.notification.user
+            if not NotificationService._get_settings(settings_map, user).push_notifications:
+                results[entry.id] = SKIPPED
+                continue
+            results[entry.id] = None
+        return results
     
     @staticmethod
-    def _send_whatsapp(user, title, message, notification):
-        """Отправка WhatsApp уведомления"""
-        # Проверяем настройки пользователя
-        settings, created = UserNotificationSettings.objects.get_or_create(user=user)
-        if not settings.whatsapp_notifications or not settings.whatsapp_phone:
-            return
+    def _send_telegram(entries, settings_map):
+        """Отправка Telegram уведомлений"""
+        results = {}
+        for entry in entries:
+            user = entry.notification.user
+            user_settings = NotificationService._get_settings(settings_map, user)
+            if not user_settings.telegram_notifications or not user_settings.telegram_chat_id:
+                results[entry.id] = SKIPPED
+                continue
+            
+            # Здесь будет интеграция с Telegram Bot API
+            # Пока заглушка
+            logger.info(f"Telegram уведомление для {user.username}: {entry.notification.title}")
+            results[entry.id] = None
+        return results
+    
+    @staticmethod
+    def _send_whatsapp(entries, settings_map):
+        """Отправка WhatsApp уведомлений"""
+        results = {}
+        for entry in entries:
+            user = entry.notification.user
+            user_settings = NotificationService._get_settings(settings_map, user)
+            if not user_settings.whatsapp_notifications or not user_settings.whatsapp_phone:
+                results[entry.id] = SKIPPED
+                continue
+            
+            # Здесь будет интеграция с WhatsApp Business API
+            # Пока заглушка
+            logger.info(f"WhatsApp уведомление для {user.username}: {entry.notification.title}")
+            results[entry.id] = None
+        return results
+    
+    @staticmethod
+    def _send_sms(entries, settings_map):
+        """Отправка SMS уведомлений"""
+        results = {}
+        for entry in entries:
+            user = entry.notification.user
+            user_settings = NotificationService._get_settings(settings_map, user)
+            if not user_settings.sms_notifications or not user_settings.sms_phone:
+                results[entry.id] = SKIPPED
+                continue
+            
+            # Здесь будет интеграция с SMS провайдером
+            # Пока заглушка
+            logger.info(f"SMS уведомление для {user.username}: {entry.notification.title}")
+            results[entry.id] = None
+        return results
+    
+    @staticmethod
+    def create_bulk_job(created_by, title, message, notification_type='info', channels=None,
+                        user_ids=None, roles=None):
+        """Создание задания массовой рассылки, выполняемого воркером"""
+        job = BulkNotificationJob.objects.create(
+            created_by=created_by,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            channels=channels or ['in_app'],
+            user_ids=user_ids or [],
+            roles=roles or []
+        )
         
-        # Здесь будет интеграция с WhatsApp Business API
-        # Пока заглушка
-        logger.info(f"WhatsApp уведомление для {user.username}: {title}")
+        def _enqueue():
+            from .tasks import run_bulk_notification_job
+            run_bulk_notification_job.delay(job.id)
+        
+        transaction.on_commit(_enqueue)
+        return job
     
     @staticmethod
-    def _send_sms(user, title, message, notification):
-        """Отправка SMS уведомления"""
-        # Проверяем настройки пользователя
-        settings, created = UserNotificationSettings.objects.get_or_create(user=user)
-        if not settings.sms_notifications or not settings.sms_phone:
-            return
+    def run_bulk_job(job_id):
+        """Выполнение задания массовой рассылки с обновлением счетчиков прогресса"""
+        # Задание забирается только один раз, повторный запуск задачи ничего не делает
+        updated = BulkNotificationJob.objects.filter(id=job_id, status='pending').update(
+            status='running',
+            started_at=timezone.now()
+        )
+        if not updated:
+            return None
+        job = BulkNotificationJob.objects.get(id=job_id)
         
-        # Здесь будет интеграция с SMS провайдером
-        # Пока заглушка
-        logger.info(f"SMS уведомление для {user.username}: {title}")
+        users = User.objects.all()
+        if job.user_ids:
+            users = users.filter(id__in=job.user_ids)
+        if job.roles:
+            users = users.filter(role__in=job.roles)
+        BulkNotificationJob.objects.filter(id=job.id).update(total_recipients=users.count())
+        
+        def _progress(created, queued, skipped):
+            BulkNotificationJob.objects.filter(id=job.id).update(
+                created_count=F('created_count') + created,
+                queued_count=F('queued_count') + queued,
+                skipped_count=F('skipped_count') + skipped
+            )
+        
+        try:
+            NotificationService.create_notifications(
+                users,
+                title=job.title,
+                message=job.message,
+                notification_type=job.notification_type,
+                channels=job.channels,
+                bulk_job=job,
+                progress=_progress
+            )
+        except Exception as e:
+            logger.error(f"Ошибка массовой рассылки {job.id}: {str(e)}")
+            BulkNotificationJob.objects.filter(id=job.id).update(
+                status='failed',
+                error_message=str(e),
+                finished_at=timezone.now()
+            )
+            raise
+        
+        BulkNotificationJob.objects.filter(id=job.id).update(
+            status='completed',
+            finished_at=timezone.now()
+        )
+        job.refresh_from_db()
+        return job
     
     @staticmethod
-    def send_bulk_notification(user_ids=None, roles=None, title=None, message=None, 
-                             notification_type='info', channels=None):
-        """Массовая отправка уведомлений"""
+    def create_notifications(users, title, message, notification_type='info', channels=None,
+                             bulk_job=None, progress=None, chunk_size=None, idempotency_key=None):
+        """Создание уведомлений для набора пользователей пачками через bulk_create"""
         if channels is None:
             channels = ['in_app']
+        chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_BULK_CHUNK_SIZE', 1000)
+        outbox_channels = [channel for channel in channels if channel in OUTBOX_CHANNELS]
         
-        # Получаем пользователей
-        users = User.objects.all()
-        if user_ids:
-            users = users.filter(id__in=user_ids)
-        if roles:
-            users = users.filter(role__in=roles)
+        # Получатели и их настройки одним запросом (LEFT JOIN на настройки)
+        fields = ['id', 'email'] + [
+            f'notification_settings__{field}'
+            for field in NotificationService._settings_fields(outbox_channels)
+        ]
+        rows = users.order_by('id').values(*fields).iterator(chunk_size=chunk_size)
         
-        notifications = []
-        for user in users:
-            notification = NotificationService.send_notification(
-                user=user,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                channels=channels
-            )
-            notifications.append(notification)
+        totals = {'created': 0, 'queued': 0, 'skipped': 0}
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            
+            # Пропускаем получателей, которым уведомление с этим ключом уже создано
+            keys = {}
+            if idempotency_key:
+                keys = {row['id']: idempotency_key(row['id']) for row in chunk}
+                existing = set(
+                    Notification.objects.filter(idempotency_key__in=keys.values()).values_list(
+                        'idempotency_key', flat=True
+                    )
+                )
+                chunk = [row for row in chunk if keys[row['id']] not in existing]
+            
+            notifications, row_channels = [], []
+            skipped = 0
+            for row in chunk:
+                enabled = [
+                    channel for channel in outbox_channels
+                    if NotificationService._channel_enabled(row, channel)
+                ]
+                skipped += len(outbox_channels) - len(enabled)
+                notification = Notification(
+                    user_id=row['id'],
+                    title=title,
+                    message=message,
+                    notification_type=notification_type,
+                    channel=channels[0] if channels else 'in_app',
+                    idempotency_key=keys.get(row['id']),
+                    bulk_job=bulk_job
+                )
+                if not enabled:
+                    NotificationService._mark_delivered(notification)
+                notifications.append(notification)
+                row_channels.append(enabled)
+            
+            with transaction.atomic():
+                notifications = Notification.objects.bulk_create(notifications)
+                entries = [
+                    NotificationOutbox(notification=notification, channel=channel)
+                    for notification, enabled in zip(notifications, row_channels)
+                    for channel in enabled
+                ]
+                NotificationOutbox.objects.bulk_create(entries)
+                
+                if progress:
+                    progress(len(notifications), len(entries), skipped)
+            
+            if entries:
+                NotificationService.schedule_outbox_drain()
+            totals['created'] += len(notifications)
+            totals['queued'] += len(entries)
+            totals['skipped'] += skipped
         
-        return notifications
+        return totals
+    
+    @staticmethod
+    def _settings_fields(channels):
+        """Поля настроек пользователя, нужные для проверки каналов"""
+        fields = []
+        for channel in channels:
+            fields.append(f'{channel}_notifications')
+            if channel in CHANNEL_ADDRESS_FIELDS:
+                fields.append(CHANNEL_ADDRESS_FIELDS[channel])
+        return fields
+    
+    @staticmethod
+    def _channel_enabled(row, channel):
+        """Проверка, что канал включен у получателя (строка из values())"""
+        flag = row[f'notification_settings__{channel}_notifications']
+        if flag is None:
+            # У пользователя нет настроек - используем значения по умолчанию
+            flag = UserNotificationSettings._meta.get_field(f'{channel}_notifications').default
+        if not flag:
+            return False
+        if channel == 'email':
+            return bool(row['email'])
+        if channel in CHANNEL_ADDRESS_FIELDS:
+            return bool(row[f'notification_settings__{CHANNEL_ADDRESS_FIELDS[channel]}'])
+        return True
     
     @staticmethod
     def mark_as_read(notification_id, user):
@@ -159,4 +559,133 @@ class NotificationService:
     @staticmethod
     def get_unread_count(user):
         """Получить количество непрочитанных уведомлений"""
-        return Notification.objects.filter(user=user, is_read=False).count()
\ No newline at end of file
+        return Notification.objects.filter(user=user, is_read=False).count()
+
+
+class EmailQueueService:
+    """Очередь исходящих писем: запись в транзакции, отправка воркером после коммита"""
+    
+    @staticmethod
+    def queue(subject, message, from_email, recipient_list, source=''):
+        """Постановка письма в очередь (аргументы как у send_mail)"""
+        return EmailQueueService.queue_mass([(subject, message, from_email, recipient_list)], source=source)
+    
+    @staticmethod
+    def queue_mass(datatuple, source=''):
+        """Постановка набора писем в очередь (формат как у send_mass_mail)"""
+        emails = []
+        for subject, message, from_email, recipient_list in datatuple:
+            recipient_list = [email for email in recipient_list if email]
+            if not recipient_list:
+                continue
+            emails.append(OutgoingEmail(
+                subject=subject[:255],
+                body=message,
+                from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                recipients=recipient_list,
+                source=source
+            ))
+        if emails:
+            OutgoingEmail.objects.bulk_create(emails)
+            EmailQueueService.schedule_send()
+        return emails
+    
+    @staticmethod
+    def schedule_send():
+        """Запуск отправки очереди писем после коммита текущей транзакции"""
+        if not cache.add('notifications:email:send-scheduled', True, timeout=10):
+            return
+        
+        def _enqueue():
+            from .tasks import send_queued_emails
+            send_queued_emails.delay()
+        
+        transaction.on_commit(_enqueue)
+    
+    @staticmethod
+    def deliver(messages):
+        """Отправка писем через одно SMTP соединение, возвращает ошибку (или None) по каждому письму"""
+        errors = []
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for email in messages:
+                try:
+                    connection.send_messages([email])
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(str(e))
+        finally:
+            connection.close()
+        return errors
+    
+    @staticmethod
+    def send_queued(batch_size=None):
+        """Отправка пачки писем из очереди, возвращает количество писем"""
+        batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 200)
+        lease = getattr(settings, 'NOTIFICATION_OUTBOX_LEASE_SECONDS', 300)
+        now = timezone.now()
+        
+        with transaction.atomic():
+            email_ids = list(
+                OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+                    status__in=['queued', 'sending'],
+                    available_at__lte=now
+                ).order_by('available_at').values_list('id', flat=True)[:batch_size]
+            )
+            if not email_ids:
+                return 0
+            OutgoingEmail.objects.filter(id__in=email_ids).update(
+                status='sending',
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=lease)
+            )
+        
+        emails = list(OutgoingEmail.objects.filter(id__in=email_ids))
+        messages = [
+            EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=email.recipients,
+            )
+            for email in emails
+        ]
+        try:
+            errors = EmailQueueService.deliver(messages)
+        except Exception as e:
+            # Не удалось подключиться к SMTP серверу - повторим всю пачку
+            logger.error(f"Ошибка подключения к почтовому серверу: {str(e)}")
+            errors = [str(e)] * len(emails)
+        
+        EmailQueueService._store_results(emails, errors)
+        return len(emails)
+    
+    @staticmethod
+    def _store_results(emails, errors):
+        """Сохранение результатов отправки писем"""
+        now = timezone.now()
+        max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+        retry_delay = getattr(settings, 'NOTIFICATION_OUTBOX_RETRY_DELAY', 60)
+        
+        sent_ids, failed_emails = [], []
+        for email, error in zip(emails, errors):
+            if error is None:
+                sent_ids.append(email.id)
+                continue
+            email.last_error = error
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+            else:
+                # Экспоненциальная задержка перед следующей попыткой
+                email.status = 'queued'
+                email.available_at = now + timedelta(seconds=retry_delay * 2 ** (email.attempts - 1))
+            failed_emails.append(email)
+        
+        with transaction.atomic():
+            if sent_ids:
+                OutgoingEmail.objects.filter(id__in=sent_ids).update(
+                    status='sent', sent_at=now, last_error=''
+                )
+            if failed_emails:
+                OutgoingEmail.objects.bulk_update(failed_emails, ['status', 'available_at', 'last_error'])
\ No newline at end of file
@@ -1,59 +1,31 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.utils import timezone  
 from django.conf import settings
-from .models import Notification, UserNotificationSettings
+from django.db import transaction
+from .models import UserNotificationSettings
 from accounts.models import User
-from courses.models import Lesson
+from courses.models import Lesson, LessonSeries
 from payments.models import Payment
 
-@receiver(post_save, sender=Notification)
-def send_notification_via_channels(sender, instance, created, **kwargs):
-    """Отправка уведомления через различные каналы"""
-    if created and not instance.is_sent:
-        from .services import NotificationService
-        
-        # Отправляем уведомление через сервис
-        try:
-            NotificationService.send_notification(
-                user=instance.user,
-                title=instance.title,
-                message=instance.message,
-                notification_type=instance.notification_type,
-                channels=[instance.channel]
-            )
-            instance.is_sent = True
-            instance.sent_at = timezone.now()
-            instance.save()
-        except Exception as e:
-            print(f"Ошибка отправки уведомления: {e}")
-
 @receiver(post_save, sender=Lesson)
 def notify_lesson_scheduled(sender, instance, created, **kwargs):
     """Уведомление о запланированном занятии"""
     if created:
-        # Уведомляем студентов
-        recipients = []
-        
-        if instance.lesson_type == 'group' and instance.group:
-            recipients = list(instance.group.students.all())
-        elif instance.lesson_type == 'individual' and instance.student:
-            recipients = [instance.student]
+        from .tasks import notify_lesson_scheduled_task
         
-        # Добавляем преподавателя
-        if instance.teacher not in recipients:
-            recipients.append(instance.teacher)
+        # Рассылка участникам выполняется воркером после коммита
+        lesson_id = instance.id
+        transaction.on_commit(lambda: notify_lesson_scheduled_task.delay(lesson_id))
+
+@receiver(post_save, sender=LessonSeries)
+def notify_lesson_series_scheduled(sender, instance, created, **kwargs):
+    """Одно уведомление участникам на серию занятий"""
+    if created:
+        from .tasks import notify_lesson_series_scheduled_task
         
-        for recipient in recipients:
-            # Создаем уведомление
-            Notification.objects.create(
-                user=recipient,
-                title='Новое занятие',
-                message=f'Запланировано новое занятие "{instance.title}" на {instance.start_time.strftime("%d.%m.%Y %H:%M")}',
-                notification_type='lesson',
-                channel='in_app'
-            )
+        series_id = instance.id
+        transaction.on_commit(lambda: notify_lesson_series_scheduled_task.delay(series_id))
 
 @receiver(post_save, sender=Payment)
 def notify_payment_status(sender, instance, created, **kwargs):
@@ -73,12 +45,16 @@ def notify_payment_status(sender, instance, created, **kwargs):
             message = f'Средства в размере {instance.amount} {instance.currency} были возвращены на ваш счет.'
             notification_type = 'payment'
         
-        Notification.objects.create(
+        from .services import NotificationService
+        
+        # Повторное сохранение платежа в том же статусе не создает дубликат
+        NotificationService.send_notification(
             user=instance.student,
             title=title,
             message=message,
             notification_type=notification_type,
-            channel='in_app'
+            channels=['in_app'],
+            idempotency_key=f'payment:{instance.id}:{instance.status}'
         )
 
 @receiver(post_save, sender=User)
@@ -0,0 +1,120 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=5
+)
+def drain_notification_outbox(batch_size=None):
+    """Обработка очереди доставки уведомлений пачками"""
+    from .services import NotificationService
+    
+    # Новые уведомления могут снова запланировать обработку очереди
+    cache.delete('notifications:outbox:drain-scheduled')
+    
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 200)
+    processed = NotificationService.process_outbox(batch_size)
+    
+    # Очередь не пуста - продолжаем в следующей задаче
+    if processed >= batch_size:
+        drain_notification_outbox.delay(batch_size)
+    
+    return processed
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=5
+)
+def send_queued_emails(batch_size=None):
+    """Отправка очереди исходящих писем пачками"""
+    from .services import EmailQueueService
+    
+    cache.delete('notifications:email:send-scheduled')
+    
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 200)
+    sent = EmailQueueService.send_queued(batch_size)
+    
+    if sent >= batch_size:
+        send_queued_emails.delay(batch_size)
+    
+    return sent
+
+@shared_task
+def run_bulk_notification_job(job_id):
+    """Выполнение задания массовой рассылки"""
+    from .services import NotificationService
+    
+    job = NotificationService.run_bulk_job(job_id)
+    return job.created_count if job else 0
+
+@shared_task
+def notify_lesson_scheduled_task(lesson_id):
+    """Уведомление участников о запланированном занятии"""
+    from accounts.models import User
+    from courses.models import Lesson
+    from .services import NotificationService
+    
+    try:
+        lesson = Lesson.objects.select_related('group').get(id=lesson_id)
+    except Lesson.DoesNotExist:
+        return 0
+    
+    recipient_ids = {lesson.teacher_id}
+    if lesson.lesson_type == 'group' and lesson.group:
+        recipient_ids.update(lesson.group.students.values_list('id', flat=True))
+    elif lesson.lesson_type == 'individual' and lesson.student_id:
+        recipient_ids.add(lesson.student_id)
+    
+    totals = NotificationService.create_notifications(
+        User.objects.filter(id__in=recipient_ids),
+        title='Новое занятие',
+        message=f'Запланировано новое занятие "{lesson.title}" на {lesson.start_time.strftime("%d.%m.%Y %H:%M")}',
+        notification_type='lesson',
+        channels=['in_app'],
+        idempotency_key=lambda user_id: f'lesson:{lesson.id}:scheduled:{user_id}'
+    )
+    return totals['created']
+
+@shared_task
+def notify_lesson_series_scheduled_task(series_id):
+    """Уведомление участников о регулярных занятиях (одно на серию, а не на каждое занятие)"""
+    from accounts.models import User
+    from courses.models import LessonSeries
+    from .services import NotificationService
+    
+    try:
+        series = LessonSeries.objects.select_related('group').get(id=series_id)
+    except LessonSeries.DoesNotExist:
+        return 0
+    
+    recipient_ids = {series.teacher_id}
+    recipient_ids.update(series.group.students.values_list('id', flat=True))
+    
+    schedule = (
+        f'{series.weekdays_display} в {series.start_time.strftime("%H:%M")} '
+        f'с {series.starts_on.strftime("%d.%m.%Y")}'
+    )
+    # Серия, отделенная изменением «это и следующие», сообщает об изменении, а не о новом расписании
+    if series.parent_id:
+        title, message, event = 'Изменение расписания', f'Регулярные занятия "{series.title}" переносятся: {schedule}', 'changed'
+    else:
+        title, message, event = 'Новое расписание', f'Запланированы регулярные занятия "{series.title}": {schedule}', 'scheduled'
+    
+    totals = NotificationService.create_notifications(
+        User.objects.filter(id__in=recipient_ids),
+        title=title,
+        message=message,
+        notification_type='lesson',
+        channels=['in_app'],
+        idempotency_key=lambda user_id: f'lesson-series:{series.id}:{event}:{user_id}'
+    )
+    return totals['created']
\ No newline at end of file
@@ -0,0 +1,188 @@
+from django.core import mail
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from .models import (
+    BulkNotificationJob, Notification, NotificationLog, NotificationOutbox, OutgoingEmail,
+    UserNotificationSettings
+)
+from .services import EmailQueueService, NotificationService
+
+User = get_user_model()
+
+class NotificationOutboxTestCase(APITestCase):
+    def setUp(self):
+        self.student_user = User.objects.create_user(
+            username='student',
+            email='student@test.com',
+            password='testpass123',
+            role='student'
+        )
+    
+    def test_send_notification_enqueues_delivery(self):
+        """Тест постановки внешних каналов в очередь без отправки в запросе"""
+        notification = NotificationService.send_notification(
+            user=self.student_user,
+            title='Тест',
+            message='Тестовое сообщение',
+            channels=['email', 'in_app']
+        )
+        
+        self.assertEqual(len(mail.outbox), 0)
+        entries = NotificationOutbox.objects.filter(notification=notification)
+        self.assertEqual(list(entries.values_list('channel', flat=True)), ['email'])
+        self.assertEqual(entries.get().status, 'queued')
+    
+    def test_process_outbox(self):
+        """Тест обработки очереди: отправка email и запись логов"""
+        notification = NotificationService.send_notification(
+            user=self.student_user,
+            title='Тест',
+            message='Тестовое сообщение',
+            channels=['email', 'telegram']
+        )
+        
+        processed = NotificationService.process_outbox()
+        
+        self.assertEqual(processed, 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            NotificationOutbox.objects.get(notification=notification, channel='email').status, 'sent'
+        )
+        # Telegram не настроен у пользователя - запись отменяется
+        self.assertEqual(
+            NotificationOutbox.objects.get(notification=notification, channel='telegram').status, 'cancelled'
+        )
+        self.assertEqual(NotificationLog.objects.filter(notification=notification, status='sent').count(), 1)
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_sent)
+        self.assertEqual(notification.delivery_status, 'sent')
+    
+    def test_idempotency_key(self):
+        """Тест однократного создания уведомления по ключу идемпотентности"""
+        first = NotificationService.send_notification(
+            user=self.student_user,
+            title='Тест',
+            message='Тестовое сообщение',
+            channels=['email'],
+            idempotency_key='test:1'
+        )
+        second = NotificationService.send_notification(
+            user=self.student_user,
+            title='Тест',
+            message='Тестовое сообщение',
+            channels=['email'],
+            idempotency_key='test:1'
+        )
+        
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Notification.objects.filter(user=self.student_user).count(), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+    
+    def test_in_app_notification_is_delivered(self):
+        """Тест: уведомление только в приложении не попадает в очередь и не дублируется"""
+        notification = NotificationService.send_notification(
+            user=self.student_user,
+            title='Тест',
+            message='Тестовое сообщение'
+        )
+        
+        self.assertEqual(notification.delivery_status, 'sent')
+        self.assertEqual(Notification.objects.filter(user=self.student_user).count(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+    
+    def test_process_outbox_skips_disabled_channel(self):
+        """Тест учета настроек пользователя при обработке очереди"""
+        UserNotificationSettings.objects.update_or_create(
+            user=self.student_user,
+            defaults={'email_notifications': False}
+        )
+        notification = NotificationService.send_notification(
+            user=self.student_user,
+            title='Тест',
+            message='Тестовое сообщение',
+            channels=['email']
+        )
+        
+        NotificationService.process_outbox()
+        
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(NotificationOutbox.objects.get(notification=notification).status, 'cancelled')
+
+
+class BulkNotificationTestCase(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin',
+            is_staff=True
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'student{i}',
+                email=f'student{i}@test.com',
+                password='testpass123',
+                role='student'
+            )
+            for i in range(3)
+        ]
+        # У одного студента email уведомления отключены
+        UserNotificationSettings.objects.update_or_create(
+            user=self.students[0],
+            defaults={'email_notifications': False}
+        )
+    
+    def test_bulk_send_creates_job(self):
+        """Тест массовой рассылки через задание с прогрессом"""
+        self.client.force_authenticate(user=self.admin_user)
+        
+        data = {
+            'roles': ['student'],
+            'title': 'Объявление',
+            'message': 'Занятия переносятся',
+            'notification_type': 'info',
+            'channels': ['in_app', 'email']
+        }
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/bulk-send/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        
+        job = BulkNotificationJob.objects.get(id=response.data['job']['id'])
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.total_recipients, 3)
+        self.assertEqual(job.created_count, 3)
+        self.assertEqual(job.queued_count, 2)
+        self.assertEqual(job.skipped_count, 1)
+        self.assertEqual(Notification.objects.filter(bulk_job=job).count(), 3)
+        
+        response = self.client.get(f'/api/notifications/bulk-send/{job.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created_count'], 3)
+
+class EmailQueueTestCase(APITestCase):
+    def setUp(self):
+        # Сбрасываем отметку о запланированной отправке из других тестов
+        cache.clear()
+    
+    def test_queue_and_send(self):
+        """Тест отправки писем из очереди после коммита"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            EmailQueueService.queue_mass([
+                ('Тема 1', 'Текст', None, ['first@test.com']),
+                ('Тема 2', 'Текст', None, ['second@test.com']),
+                ('Без адреса', 'Текст', None, ['']),
+            ], source='tests')
+        
+        # До коммита письма только записаны в очередь
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.filter(status='queued').count(), 2)
+        
+        for callback in callbacks:
+            callback()
+        
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(OutgoingEmail.objects.filter(status='sent').count(), 2)
\ No newline at end of file
@@ -9,6 +9,7 @@ from .views import (
     mark_all_as_read,
     get_unread_count,
     send_bulk_notification,
+    bulk_notification_job_status,
     send_test_notification,
     notification_statistics,
     clear_notifications
@@ -32,6 +33,7 @@ urlpatterns = [
     
     # Админские функции
     path('bulk-send/', send_bulk_notification, name='send-bulk-notification'),
+    path('bulk-send/<int:job_id>/', bulk_notification_job_status, name='bulk-notification-job-status'),
     path('test/', send_test_notification, name='send-test-notification'),
     path('statistics/', notification_statistics, name='notification-statistics'),
 ]
\ No newline at end of file
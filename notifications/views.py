@@ -7,7 +7,7 @@ from rest_framework import filters
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.db import models  # Добавили этот импорт
-from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog
+from .models import Notification, NotificationTemplate, UserNotificationSettings, NotificationLog, BulkNotificationJob
 from accounts.models import User
 from .serializers import (
     NotificationSerializer, 
@@ -15,7 +15,8 @@ from .serializers import (
     NotificationTemplateSerializer, 
     UserNotificationSettingsSerializer,
     NotificationLogSerializer,
-    BulkNotificationSerializer
+    BulkNotificationSerializer,
+    BulkNotificationJobSerializer
 )
 from .services import NotificationService
 from .permissions import IsNotificationOwner
@@ -138,7 +139,9 @@ def send_bulk_notification(request):
     serializer = BulkNotificationSerializer(data=request.data)
     if serializer.is_valid():
         try:
-            notifications = NotificationService.send_bulk_notification(
+            # Рассылка выполняется воркером, запрос не зависит от числа получателей
+            job = NotificationService.create_bulk_job(
+                created_by=request.user,
                 user_ids=serializer.validated_data.get('user_ids'),
                 roles=serializer.validated_data.get('roles'),
                 title=serializer.validated_data['title'],
@@ -148,9 +151,9 @@ def send_bulk_notification(request):
             )
             
             return Response({
-                'message': f'Отправлено {len(notifications)} уведомлений',
-                'notifications_count': len(notifications)
-            })
+                'message': 'Массовая рассылка поставлена в очередь',
+                'job': BulkNotificationJobSerializer(job).data
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response({
                 'error': str(e)
@@ -158,6 +161,13 @@ def send_bulk_notification(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def bulk_notification_job_status(request, job_id):
+    """Прогресс массовой рассылки (только для админов)"""
+    job = get_object_or_404(BulkNotificationJob, id=job_id)
+    return Response(BulkNotificationJobSerializer(job).data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def send_test_notification(request):
@@ -0,0 +1,33 @@
+from django.db.models import Q
+from .models import Payment
+
+class PaymentEntitlements:
+    """Оплаченные курсы студентов: все пары (студент, курс) для выдачи загружаются одним запросом"""
+    
+    def __init__(self, pairs=()):
+        self.pairs = set(pairs)
+    
+    @classmethod
+    def load(cls, student_ids, course_ids):
+        """Оплаты указанных студентов за указанные курсы (None - оплаты без курса, пара (студент, None))"""
+        student_ids = {student_id for student_id in student_ids if student_id is not None}
+        course_ids = set(course_ids)
+        if not student_ids or not course_ids:
+            return cls()
+        courses = Q(course_id__in=course_ids - {None})
+        if None in course_ids:
+            # Индивидуальные занятия без группы проверяются по оплатам без курса
+            courses |= Q(course__isnull=True)
+        return cls(
+            Payment.objects.filter(
+                courses,
+                student_id__in=student_ids,
+                status='paid'
+            ).order_by().values_list('student_id', 'course_id').distinct()
+        )
+    
+    def update(self, other):
+        self.pairs |= other.pairs
+    
+    def has_payment(self, student_id, course_id):
+        return (student_id, course_id) in self.pairs
\ No newline at end of file